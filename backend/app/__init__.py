@@ -4,19 +4,61 @@ from dotenv import load_dotenv
 # load enviornment vars from .env file
 load_dotenv()
 
-def create_app():
+def create_app(connect=True):
+    """
+    Build the app. With connect=False nothing touches the database at
+        startup (no pool warm-up, no reference data load), for offline
+        tools such as the benchmarks.
+    """
     # Create a new Flask app instance
     app = Flask(__name__)
     
     app.secret_key = 'pikapika'
 
+    # Structured, queued logging with per-request ids (before anything logs)
+    from .log import init_logging
+    init_logging(app)
+
     # Import and register the Pokedex blueprints
-    from . import pokedex, auth, main, teams, battle, gym
+    from . import pokedex, auth, main, teams, battle, gym, leaderboard, debug, metrics
     app.register_blueprint(pokedex.bp)
     app.register_blueprint(auth.bp)
     app.register_blueprint(main.bp)    
     app.register_blueprint(teams.bp)
     app.register_blueprint(battle.bp)
     app.register_blueprint(gym.bp)
+    app.register_blueprint(leaderboard.bp)
+    # Sampled per-request SQL tracing and /debug/sql
+    app.register_blueprint(debug.bp)
+    # Request metrics and /metrics
+    app.register_blueprint(metrics.bp)
+
+    # flask CLI maintenance commands
+    from .commands import register_commands
+    register_commands(app)
+
+    if not connect:
+        return app
+
+    # Open the minimum number of pooled DB connections up front so the
+    # first requests don't pay for the Cloud SQL handshake
+    from .db import get_pool
+    try:
+        get_pool().fill()
+    except Exception as e:
+        app.logger.warning(f"Could not warm the database pool: {e}")
+
+    # Load the reference tables (Pokedex, moves, learnsets, type chart,
+    # gym leaders) once and keep them fresh in the background
+    from .refdata import refdata
+    try:
+        refdata.warm()
+    except Exception as e:
+        app.logger.warning(f"Could not warm the reference data cache: {e}")
+    refdata.start_background_refresh()
+
+    # Build the leaderboard from the rollup tables off the request path
+    from .leaderboard import start_background_refresh
+    start_background_refresh()
 
     return app
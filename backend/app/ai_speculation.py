@@ -0,0 +1,168 @@
+"""
+Speculative gym leader replies.
+
+The search-based gym AI (app/battle_ai.py) may spend up to
+GYM_AI_BUDGET_MS per decision. Most of that can happen while the player
+is still choosing: as soon as the player's half of a turn is resolved
+(/battle/api/turn), a background thread searches the gym leader's reply
+to exactly that position, and after a whole round (/battle/api/round) it
+searches the replies to the positions the player's likeliest next
+actions lead to. Replies are kept per battle, keyed by the exact
+position they were searched from, so the AI's turn uses one only if the
+battle really is in that position: it takes a finished reply at once,
+waits for one still being searched, and searches itself otherwise.
+
+Replies live in this worker's memory; a turn served by another worker
+searches as before.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from app.battle_ai import CompactBattle, budget_ms, decide, difficulty_for_gym, likely_positions, position
+from app.type_chart import get_type_chart
+
+logger = logging.getLogger(__name__)
+
+
+speculation_enabled = os.environ.get("AI_SPECULATION", "1") == "1"
+# Background threads searching ahead
+speculation_workers = int(os.environ.get("AI_SPECULATION_WORKERS", "1"))
+# Positions searched ahead after each round
+speculation_positions = int(os.environ.get("AI_SPECULATION_POSITIONS", "4"))
+# Battles whose replies are kept at once
+speculation_max_battles = int(os.environ.get("AI_SPECULATION_MAX_BATTLES", "1000"))
+
+
+class _Replies:
+    __slots__ = ('difficulty', 'chart_version', 'futures')
+
+    def __init__(self, difficulty, chart_version):
+        self.difficulty = difficulty
+        self.chart_version = chart_version
+        # search position -> Future of its AIAction (or None)
+        self.futures = {}
+
+    def cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+
+
+class Speculator:
+    """
+    Searches gym leader replies ahead on a thread pool and keeps the
+        latest guesses of each battle (LRU, at most max_battles).
+    """
+
+    def __init__(self, workers=1, positions=4, max_battles=1000):
+        self.positions = positions
+        self.max_battles = max_battles
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-speculation')
+        self._battles = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'waits': 0, 'misses': 0}
+
+    def _search(self, battle, s, difficulty):
+        try:
+            return decide(battle, s, difficulty)
+        except Exception:
+            logger.exception("Could not search a gym leader reply ahead")
+            return None
+
+    def precompute(self, state, user_member_id, gym_member_id, next_round=False):
+        """
+        Start searching the gym leader's reply from this position (its
+            move is next), or with next_round from the positions the
+            player's likeliest next actions lead to. Replaces the
+            battle's earlier guesses.
+        """
+        difficulty = difficulty_for_gym(state.gym_id)
+        if not speculation_enabled or difficulty.max_depth == 0 or state.ended:
+            return
+
+        chart = get_type_chart()
+        battle = CompactBattle(state, chart)
+        root = battle.initial(user_member_id, gym_member_id)
+        positions = likely_positions(battle, root, self.positions) if next_round else [root]
+
+        replies = _Replies(difficulty.name, chart.version)
+        for s in positions:
+            replies.futures[s] = self._executor.submit(self._search, battle, s, difficulty)
+
+        with self._lock:
+            previous = self._battles.pop(state.battle_id, None)
+            self._battles[state.battle_id] = replies
+            evicted = []
+            while len(self._battles) > self.max_battles:
+                evicted.append(self._battles.popitem(last=False)[1])
+        for old in ([previous] if previous else []) + evicted:
+            old.cancel()
+
+    def lookup(self, state, user_member_id, gym_member_id, difficulty):
+        """
+        The reply searched ahead for exactly this position, or None if
+            there is none (the caller searches itself).
+        """
+        if not speculation_enabled or difficulty.max_depth == 0:
+            return None
+        with self._lock:
+            replies = self._battles.get(state.battle_id)
+        if replies is None or replies.difficulty != difficulty.name \
+                or replies.chart_version != get_type_chart().version:
+            return self._count('misses')
+
+        key = position((state.team('USER'), state.team('GYM')), user_member_id, gym_member_id)
+        future = replies.futures.get(key)
+        # The other guesses were wrong; don't let them compete for the CPU
+        for other in replies.futures.values():
+            if other is not future:
+                other.cancel()
+        # Still queued behind other guesses: cheaper to search right here
+        if future is None or future.cancel():
+            return self._count('misses')
+        if future.done():
+            self._count('hits')
+            return future.result()
+
+        # Being searched right now; it finishes within its own budget
+        try:
+            action = future.result(timeout=budget_ms / 1000 * 2)
+        except TimeoutError:
+            return self._count('misses')
+        self._count('waits')
+        return action
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def forget(self, battle_id):
+        with self._lock:
+            replies = self._battles.pop(battle_id, None)
+        if replies is not None:
+            replies.cancel()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['battles'] = len(self._battles)
+        return snapshot
+
+
+_speculator = None
+_speculator_lock = threading.Lock()
+
+
+def get_speculator():
+    """
+    The speculator for this process, created on first use.
+    """
+    global _speculator
+    if _speculator is None:
+        with _speculator_lock:
+            if _speculator is None:
+                _speculator = Speculator(workers=speculation_workers, positions=speculation_positions,
+                                         max_battles=speculation_max_battles)
+    return _speculator
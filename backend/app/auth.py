@@ -1,6 +1,9 @@
+import logging
 from flask import jsonify, render_template, Blueprint, request, session, redirect, url_for
 from app.db import getconn
 
+logger = logging.getLogger(__name__)
+
 
 # Routes will go here e.g. @bp.route('/auth')
 bp = Blueprint('auth', __name__, url_prefix='/auth', template_folder='templates')
@@ -22,7 +25,8 @@ def login():
         password = request.form.get('pwd')
         email = request.form.get('email')
 
-        print(form_type, username, password, email)
+        # Never log the password (or the email)
+        logger.debug("Auth form submitted", extra={'form_type': form_type, 'user_name': username})
     
         # Setup to connect to GCP
         db_conn = getconn()
@@ -56,7 +60,7 @@ def login():
                     session['user_id'] = user_id
                     session['email'] = email
                     
-                    print("Signup successful! Please log in.") 
+                    logger.info("User signed up", extra={'user_id': user_id})
                     return redirect(url_for('home.load_homepage'))
 
 
@@ -66,7 +70,7 @@ def login():
                     check_user_query = "SELECT * FROM users WHERE user_name LIKE %s AND pwd = %s"
                     sql_cursor.execute(check_user_query, (f"%{username}%", password))
                     existing_user = sql_cursor.fetchone()
-                    print(f"existing_user results = {existing_user}")
+                    logger.debug("Login attempt", extra={'found': existing_user is not None})
 
 
                     # Get user_id
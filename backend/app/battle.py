@@ -1,9 +1,189 @@
-from flask import jsonify, render_template, Blueprint, request, session, redirect, url_for
+import logging
+from flask import jsonify, render_template, Blueprint, Response, request, session, redirect, url_for
 from app.db import getconn
-import traceback
+from app.battle_engine import load_battle_state, save_battle_state, resolve_turn
+from app.battle_ai import choose_action, difficulty_for_gym
+from app.ai_speculation import get_speculator
+from app.battle_events import get_battle_events, stream
+from app.battle_store import get_battle_store
+from app.type_chart import get_type_chart
+from app.stats import record_battle_result
+from app.leaderboard import get_leaderboard, read_player_entry
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('battle', __name__, url_prefix='/battle')
 
+
+# Start a battle with the user's active team (no row if there is none)
+CREATE_BATTLE = """
+    INSERT INTO battles (user_team_id, gym_id, start_time)
+    SELECT user_team_id, %s, NOW()
+    FROM user_teams
+    WHERE user_id = %s AND is_active = TRUE
+    LIMIT 1;
+"""
+
+# Copy both teams into battle_combatants for one battle in one statement,
+# full HP and PP. Max PP comes from a join on moves instead of one
+# correlated subquery per move slot.
+COPY_TEAMS = """
+    INSERT INTO battle_combatants (
+        battle_id, party, member_id, pokedex_id, current_hp,
+        move_1_id, move_2_id, move_3_id, move_4_id,
+        move_1_current_pp, move_2_current_pp, move_3_current_pp, move_4_current_pp
+    )
+    SELECT b.battle_id, 'USER', utm.user_team_member_id, utm.pokedex_id, p.hp,
+        utm.move_1_id, utm.move_2_id, utm.move_3_id, utm.move_4_id,
+        m1.pp, m2.pp, m3.pp, m4.pp
+    FROM battles b
+    JOIN user_poke_team_members utm ON utm.user_team_id = b.user_team_id
+    JOIN pokedex_entries p ON utm.pokedex_id = p.pokedex_id
+    LEFT JOIN moves m1 ON m1.move_id = utm.move_1_id
+    LEFT JOIN moves m2 ON m2.move_id = utm.move_2_id
+    LEFT JOIN moves m3 ON m3.move_id = utm.move_3_id
+    LEFT JOIN moves m4 ON m4.move_id = utm.move_4_id
+    WHERE b.battle_id = %s
+    UNION ALL
+    SELECT b.battle_id, 'GYM', glm.gym_team_member_id, glm.pokedex_id, p.hp,
+        glm.move_1_id, glm.move_2_id, glm.move_3_id, glm.move_4_id,
+        m1.pp, m2.pp, m3.pp, m4.pp
+    FROM battles b
+    JOIN gym_leader_team_members glm ON glm.gym_id = b.gym_id
+    JOIN pokedex_entries p ON glm.pokedex_id = p.pokedex_id
+    LEFT JOIN moves m1 ON m1.move_id = glm.move_1_id
+    LEFT JOIN moves m2 ON m2.move_id = glm.move_2_id
+    LEFT JOIN moves m3 ON m3.move_id = glm.move_3_id
+    LEFT JOIN moves m4 ON m4.move_id = glm.move_4_id
+    WHERE b.battle_id = %s;
+"""
+
+def _load_from_db(battle_id):
+    conn = getconn()
+    try:
+        with conn.cursor() as cursor:
+            return load_battle_state(cursor, battle_id, get_type_chart().matchups)
+    finally:
+        conn.close()
+
+
+def _checkout_battle(battle_id):
+    """
+    Check a battle's state out of the battle store, loading it from the
+        database if this process hasn't seen it yet.
+    """
+    return get_battle_store().checkout(battle_id, lambda: _load_from_db(battle_id))
+
+
+def _owns(state):
+    """
+    True if the battle belongs to the logged in user and is still being played.
+    """
+    return state is not None and state.user_id == session.get('user_id') and not state.ended
+
+
+def _pokemon_view(combatant, team_id):
+    """
+    A combatant in the shape battle.html expects (same columns the
+        get_battle_state stored procedure used to return).
+    """
+    view = {
+        'party_type': combatant.party,
+        'team_id': team_id,
+        'member_id': combatant.member_id,
+        'pokemon_name': combatant.name,
+        'current_hp': combatant.current_hp,
+        'max_hp': combatant.max_hp,
+        'hp': combatant.max_hp,
+        'image_url': combatant.image_url,
+        'moves': [],
+    }
+    for move in combatant.moves:
+        view['moves'].append({
+            'move_name': move.name if move else None,
+            'current_pp': move.current_pp if move else None,
+            'max_pp': move.max_pp if move else None,
+        })
+    return view
+
+
+def _battle_page(state, player, opponent):
+    """
+    Everything battle.html needs, so the page never asks for the teams
+        or moves again: the two Pokemon in play, and both full rosters
+        (HP, sprites, move names and PP) for the team menu and switches.
+    """
+    return {
+        'battle_id': state.battle_id,
+        'state': {
+            'player_pokemon': _pokemon_view(player, state.user_team_id),
+            'opponent_pokemon': _pokemon_view(opponent, state.gym_id),
+        },
+        'roster': {
+            'player_team': [_pokemon_view(member, state.user_team_id) for member in state.team('USER')],
+            'opponent_team': [_pokemon_view(member, state.gym_id) for member in state.team('GYM')],
+        },
+        'opponent_max_hp': opponent.max_hp,
+    }
+
+
+def _move_list(combatant):
+    """
+    A combatant's moves as /api/moves returns them (empty slots left out).
+    """
+    moves = []
+    for move in combatant.moves:
+        if move is None:
+            continue
+
+        moves.append({
+            "move_name": move.name,
+            "current_pp": move.current_pp,
+            "max_pp": move.max_pp
+        })
+    return moves
+
+
+def _move_pps(combatant):
+    pps = {}
+    for i, move in enumerate(combatant.moves, start=1):
+        pps[f'move_{i}_current_pp'] = move.current_pp if move is not None else None
+    return pps
+
+
+def _finish_battle(state, won):
+    """
+    Write the final HP/PP and the outcome of a battle, add it to the
+        user's stats and the leaderboard, then drop it from the battle store.
+    """
+    end_battle = """
+        UPDATE battles
+        SET end_time = NOW(), win_loss_outcome = %s
+        WHERE battle_id = %s AND end_time IS NULL;
+    """
+    standing = None
+    conn = getconn()
+    try:
+        with conn.cursor() as cursor:
+            save_battle_state(cursor, state)
+            cursor.execute(end_battle, (1 if won else 0, state.battle_id))
+            # Only the request that actually ended the battle counts it
+            if cursor.rowcount == 1:
+                record_battle_result(cursor, state.user_id, state.gym_id, state.battle_id, won)
+                standing = read_player_entry(cursor, state.user_id, state.gym_id)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Move the player on this worker's leaderboard straight away
+    if standing is not None and standing[0] is not None:
+        entry, best_clear_seconds = standing
+        get_leaderboard().update(entry, gym_id=state.gym_id, best_clear_seconds=best_clear_seconds)
+    state.ended = True
+    get_battle_store().discard(state.battle_id)
+    get_speculator().forget(state.battle_id)
+
+
 @bp.route('/start/<int:gym_id>')
 def start_battle(gym_id):
     conn = None
@@ -16,483 +196,374 @@ def start_battle(gym_id):
         conn = getconn()
         cursor = conn.cursor()
 
-        # Get user's team id
-        get_team_id = """
-            SELECT user_team_id 
-            FROM user_teams 
-            WHERE user_id = %s AND is_active = TRUE;
-        """
-        cursor.execute(get_team_id, (user_id,))
-        battle_team = cursor.fetchone()
-
-        if not battle_team:
+        # Every battle gets its own id...
+        cursor.execute(CREATE_BATTLE, (gym_id, user_id))
+        if cursor.rowcount == 0:
             return "You do not have an active team selected.", 400
+        battle_id = cursor.lastrowid
 
-        user_team_id = battle_team['user_team_id']
-
-        # Before each battle, reset each pokemon's HP
-        reset_hp = """
-            UPDATE user_poke_team_members utm
-            JOIN pokedex_entries p ON utm.pokedex_id = p.pokedex_id
-            SET utm.current_hp = p.hp
-            WHERE utm.user_team_id = %s;
-        """
-        cursor.execute(reset_hp, (user_team_id,))
-
-        # Before each battle, reset each pokemon's move PP
-        reset_pp = """
-            UPDATE user_poke_team_members utm
-            SET
-                move_1_current_pp = (SELECT pp FROM moves WHERE move_id = utm.move_1_id),
-                move_2_current_pp = (SELECT pp FROM moves WHERE move_id = utm.move_2_id),
-                move_3_current_pp = (SELECT pp FROM moves WHERE move_id = utm.move_3_id),
-                move_4_current_pp = (SELECT pp FROM moves WHERE move_id = utm.move_4_id)
-            WHERE utm.user_team_id = %s;
-        """
-        cursor.execute(reset_pp, (user_team_id,))
-
-        # Reset opponent's HP
-        reset_opponent_hp = """
-            UPDATE gym_leader_team_members glm
-            JOIN pokedex_entries p ON glm.pokedex_id = p.pokedex_id
-            SET glm.current_hp = p.hp
-            WHERE glm.gym_id = %s;
-        """
-        cursor.execute(reset_opponent_hp, (gym_id,))
-
-        # Reset opponent's move PP
-        reset_opponent_pp = """
-            UPDATE gym_leader_team_members glm
-            SET
-                move_1_current_pp = (SELECT pp FROM moves WHERE move_id = glm.move_1_id),
-                move_2_current_pp = (SELECT pp FROM moves WHERE move_id = glm.move_2_id),
-                move_3_current_pp = (SELECT pp FROM moves WHERE move_id = glm.move_3_id),
-                move_4_current_pp = (SELECT pp FROM moves WHERE move_id = glm.move_4_id)
-            WHERE glm.gym_id = %s;
-        """
-        cursor.execute(reset_opponent_pp, (gym_id,))
+        # ...and its own full-HP, full-PP copy of both teams, so other
+        # battles against the same gym never touch these rows
+        cursor.execute(COPY_TEAMS, (battle_id, battle_id))
         conn.commit()
- 
-        # Call the stored procedure to get the battle state
-        # Made by Tanjie
-        cursor.callproc('get_battle_state', (user_team_id, gym_id))
-        results = cursor.fetchall()
-
-        print(f"results = {results}")
-        battle_state = {}
-        for row in results:
-            if row['party_type'] == 'USER':
-                battle_state['player_pokemon'] = row
-            else:
-                battle_state['opponent_pokemon'] = row
-
-        # Keep track of pokemon's max hp for UI accuracy
-        for key in ['player_pokemon', 'opponent_pokemon']:
-            if key in battle_state:
-                battle_state[key]['hp'] = battle_state[key].get('max_hp', 1)
-
-        opponent_max_hp = battle_state['opponent_pokemon']['hp']
-
-        for party in battle_state.values():
-            party['moves'] = [
-                {'move_name': party['move_1_name'], 'current_pp': party['move_1_current_pp'], 'max_pp': party['move_1_max_pp']},
-                {'move_name': party['move_2_name'], 'current_pp': party['move_2_current_pp'], 'max_pp': party['move_2_max_pp']},
-                {'move_name': party['move_3_name'], 'current_pp': party['move_3_current_pp'], 'max_pp': party['move_3_max_pp']},
-                {'move_name': party['move_4_name'], 'current_pp': party['move_4_current_pp'], 'max_pp': party['move_4_max_pp']}
-            ]
 
-        return render_template('battle.html', state=battle_state, opponent_max_hp=opponent_max_hp)
+        # Load the battle once; turns work on the stored copy from here on
+        state = load_battle_state(cursor, battle_id, get_type_chart().matchups)
+        player = state.next_alive('USER') if state else None
+        opponent = state.next_alive('GYM') if state else None
+        if not player or not opponent:
+            return "Both sides need at least one Pokémon to battle.", 400
+        get_battle_store().put(state)
+        # Search the gym leader's first replies while the page loads
+        get_speculator().precompute(state, player.member_id, opponent.member_id, next_round=True)
+
+        return render_template('battle.html', **_battle_page(state, player, opponent))
 
     except Exception as e:
-        print(f"Error starting battle: {e}")
+        logger.exception("Could not start battle", extra={'gym_id': gym_id})
         return "An error occurred in start_battle()", 500
     finally:
         if conn:
             conn.close()
 
 
-@bp.route('/api/team/<int:user_team_id>', methods=['GET'])
-def get_user_team(user_team_id):
-    conn = None
+@bp.route('/api/team/<int:battle_id>', methods=['GET'])
+def get_user_team(battle_id):
     try:
-        conn = getconn()
-        cursor = conn.cursor()
-
-        # Get the user's battle team information
-        get_battle_team_info = """
-            SELECT utm.user_team_member_id, p.name, utm.current_hp,
-                p.hp AS max_hp, p.image_url
-            FROM user_poke_team_members utm
-            JOIN pokedex_entries p ON utm.pokedex_id = p.pokedex_id
-            WHERE utm.user_team_id = %s
-            ORDER BY utm.user_team_member_id;
-        """
-        cursor.execute(get_battle_team_info, (user_team_id,))
-        battle_team_info_results = cursor.fetchall()
+        with _checkout_battle(battle_id) as state:
+            if not _owns(state):
+                return jsonify({"error": "Battle not found"}), 404
+
+            # Get the user's battle team information for this battle
+            battle_team_info_results = [
+                {
+                    'user_team_member_id': member.member_id,
+                    'name': member.name,
+                    'current_hp': member.current_hp,
+                    'max_hp': member.max_hp,
+                    'image_url': member.image_url,
+                }
+                for member in state.team('USER')
+            ]
         return jsonify(battle_team_info_results)
 
     except Exception as e:
-        print(f"Error fetching team data in get_user_team(): {e}")
+        logger.exception("Could not load team", extra={'battle_id': battle_id})
         return jsonify({"error": str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
+
+
+def _player_turn(state, player_member_id, opponent_member_id, move_slot):
+    """
+    Resolve the player's attack and describe the result (plus the gym
+        leader's next Pokemon if the current one fainted).
+    """
+    turn = resolve_turn(state, 'USER', player_member_id, opponent_member_id, move_slot)
+    outcome_message = turn.message
+
+    player = state.get('USER', player_member_id)
+    opponent = state.get('GYM', opponent_member_id)
+    player_move_pps = _move_pps(player)
+
+    # For when gym team leaders' pokemon faints
+    if opponent.fainted:
+        new_opponent = state.next_alive('GYM')
+
+        if new_opponent:
+            return {
+                "message": outcome_message + f" {new_opponent.name} was sent out!",
+                "player_hp": player.current_hp,
+                "player_max_hp": player.max_hp,
+                "opponent_hp": new_opponent.current_hp,
+                "opponent_max_hp": new_opponent.max_hp,
+                "player_move_pps": player_move_pps,
+                "ai_switch_info": {
+                    "name": new_opponent.name,
+                    "image_url": new_opponent.image_url,
+                    "current_hp": new_opponent.current_hp,
+                    "max_hp": new_opponent.max_hp,
+                    "gym_team_member_id": new_opponent.member_id
+                }
+            }
+        else:
+            _finish_battle(state, won=True)
+            return {
+                "message": outcome_message + " All of the opponent's Pokémon have fainted. You win!",
+                "player_hp": player.current_hp,
+                "player_max_hp": player.max_hp,
+                "opponent_hp": 0,
+                "opponent_max_hp": 0,
+                "player_move_pps": player_move_pps,
+                "ai_switch_info": {
+                    "game_over": True
+                }
+            }
+
+    # Turn results
+    return {
+        "message": outcome_message,
+        "player_hp": player.current_hp,
+        "player_max_hp": player.max_hp,
+        "opponent_hp": opponent.current_hp,
+        "opponent_max_hp": opponent.max_hp,
+        "player_move_pps": player_move_pps
+    }
+
+
+def _ai_turn(state, user_member_id, gym_member_id):
+    """
+    Let the gym leader pick and use a move or switch Pokemon, and
+        describe the result (plus the player's next Pokemon if theirs
+        fainted).
+    """
+    player = state.get('USER', user_member_id)
+    opponent = state.get('GYM', gym_member_id)
+
+    # Pick the gym leader's action (see app/battle_ai.py), searched ahead
+    # if the player did what app/ai_speculation.py guessed, and resolve it
+    # against the stored state
+    difficulty = difficulty_for_gym(state.gym_id)
+    action = get_speculator().lookup(state, user_member_id, gym_member_id, difficulty)
+    if action is None:
+        action = choose_action(state, gym_member_id, user_member_id, get_type_chart(), difficulty)
+    logger.debug("AI picked an action", extra={
+        'battle_id': state.battle_id, 'difficulty': difficulty.name, 'move_slot': action.move_slot,
+        'switch_to': action.switch_to, 'depth': action.depth, 'nodes': action.nodes,
+    })
+
+    if action.switch_to is not None:
+        new_opponent = state.get('GYM', action.switch_to)
+        return {
+            "message": f"The opponent withdrew {opponent.name} and sent out {new_opponent.name}!",
+            "player_hp": player.current_hp,
+            "opponent_hp": new_opponent.current_hp,
+            "opponent_switch": {
+                "name": new_opponent.name,
+                "image_url": new_opponent.image_url,
+                "current_hp": new_opponent.current_hp,
+                "max_hp": new_opponent.max_hp,
+                "gym_team_member_id": new_opponent.member_id
+            }
+        }
+
+    turn = resolve_turn(state, 'GYM', gym_member_id, user_member_id, action.move_slot)
+    outcome_message = turn.message
+
+    if player.fainted:
+        next_pokemon = state.next_alive('USER')
+
+        if next_pokemon:
+            return {
+                "message": outcome_message + f" Your {next_pokemon.name} is ready to go!",
+                "player_hp": 0,
+                "opponent_hp": opponent.current_hp,
+                "force_player_switch": {
+                    "name": next_pokemon.name,
+                    "image_url": next_pokemon.image_url,
+                    "current_hp": next_pokemon.current_hp,
+                    "max_hp": next_pokemon.max_hp,
+                    "user_team_member_id": next_pokemon.member_id
+                }
+            }
+        else:
+            _finish_battle(state, won=False)
+            return {
+                "message": outcome_message + " All your Pokémon have fainted. You lose!",
+                "player_hp": 0,
+                "opponent_hp": opponent.current_hp,
+                "game_over": True
+            }
+
+    return { "message": outcome_message, "player_hp": player.current_hp, "opponent_hp": opponent.current_hp }
 
 
 @bp.route('/api/turn', methods=['POST'])
 def process_turn():
-    conn = None
     try:
         data = request.get_json()
-        
-        attacker_party = data.get('attacker_party')
-        attacker_team_id = data.get('attacker_team_id')
-        attacker_member_id = data.get('attacker_member_id')
-        defender_party = data.get('defender_party')
-        defender_team_id = data.get('defender_team_id')
-        defender_member_id = data.get('defender_member_id')
-        move_slot = data.get('move_slot')
-
-        conn = getconn()
-        cursor = conn.cursor()
 
-        # Call the stored procedure to process the battle turn
-        # Made by Tanjie
-        sp_args = [
-            attacker_party, attacker_team_id, attacker_member_id,
-            defender_party, defender_team_id, defender_member_id,
-            move_slot, ''
-        ]
-        
-        cursor.callproc('process_battle_turn', sp_args)
-        
-        cursor.execute("SELECT @_process_battle_turn_7;")
-        result = cursor.fetchone()
-        outcome_message = result.get('@_process_battle_turn_7')
-
-        # Get current HP for currently fighting pokemon
-        get_current_pokemon_hp = """
-            SELECT current_hp, pokedex_id
-            FROM user_poke_team_members
-            WHERE user_team_id = %s AND user_team_member_id = %s;
-        """
-        cursor.execute(get_current_pokemon_hp, (data.get('player_team_id'), data.get('player_member_id')))
-        player_record = cursor.fetchone()
-        player_hp = player_record['current_hp']
-        player_pokedex_id = player_record['pokedex_id']
-
-        # Get current HP for gym (opponent) pokemon
-        get_gym_pokemon_hp = """
-            SELECT current_hp, pokedex_id
-            FROM gym_leader_team_members
-            WHERE gym_id = %s AND gym_team_member_id = %s;
-        """
-        cursor.execute(get_gym_pokemon_hp, (data.get('opponent_team_id'), data.get('opponent_member_id')))
-        gym_leader_record = cursor.fetchone()
-        opponent_hp = gym_leader_record['current_hp']
-        opponent_pokedex_id = gym_leader_record['pokedex_id']
-
-        # Get max HP for current player's pokemon
-        get_max_hp = """
-            SELECT hp AS max_hp 
-            FROM pokedex_entries 
-            WHERE pokedex_id = %s;
-        """
-        cursor.execute(get_max_hp, (player_pokedex_id,))
-        player_max_hp = cursor.fetchone()['max_hp']
-
-        # Get max HP for current gym leader's pokemon
-        get_max_gym_hp = """
-            SELECT hp AS max_hp 
-            FROM pokedex_entries 
-            WHERE pokedex_id = %s;
-        """
-        cursor.execute(get_max_gym_hp, (opponent_pokedex_id,))
-        opponent_max_hp = cursor.fetchone()['max_hp']
-
-        # Get PP for current player's pokemon
-        get_player_pp = """
-            SELECT move_1_current_pp, move_2_current_pp, move_3_current_pp, move_4_current_pp
-            FROM user_poke_team_members
-            WHERE user_team_id = %s AND user_team_member_id = %s;
-        """
-        cursor.execute(get_player_pp, (data.get('player_team_id'), data.get('player_member_id')))
-        move_pps_row = cursor.fetchone()
-        player_move_pps = {
-            'move_1_current_pp': move_pps_row['move_1_current_pp'],
-            'move_2_current_pp': move_pps_row['move_2_current_pp'],
-            'move_3_current_pp': move_pps_row['move_3_current_pp'],
-            'move_4_current_pp': move_pps_row['move_4_current_pp'],
-        }
+        battle_id = int(data.get('battle_id'))
+        player_member_id = data.get('player_member_id')
+        opponent_member_id = data.get('opponent_member_id')
+        move_slot = data.get('move_slot')
 
-        # For when gym team leaders' pokemon gaints
-        if opponent_hp <= 0:
-            get_all_gym_pokemon = """
-                SELECT *
-                FROM gym_leader_team_members g
-                JOIN pokedex_entries p ON g.pokedex_id = p.pokedex_id
-                WHERE g.gym_id = %s AND g.current_hp > 0
-                ORDER BY g.gym_team_member_id ASC
-            """
-            cursor.execute(get_all_gym_pokemon, (data.get('opponent_team_id'),))
-            available_pokemon = cursor.fetchall()
-
-            if available_pokemon:
-                new_opponent = available_pokemon[0]
-                return jsonify({
-                    "success": True,
-                    "message": outcome_message + f" {new_opponent['name']} was sent out!",
-                    "player_hp": player_hp,
-                    "player_max_hp": player_max_hp,
-                    "opponent_hp": new_opponent['current_hp'],
-                    "opponent_max_hp": new_opponent['hp'],
-                    "player_move_pps": player_move_pps, 
-                    "ai_switch_info": {
-                        "name": new_opponent['name'],
-                        "image_url": new_opponent['image_url'],
-                        "current_hp": new_opponent['current_hp'],
-                        "max_hp": new_opponent['hp'],
-                        "gym_team_member_id": new_opponent['gym_team_member_id']
-                    }
-                })
-            else:
-                return jsonify({
-                    "success": True,
-                    "message": outcome_message + " All of the opponent's Pokémon have fainted. You win!",
-                    "player_hp": player_hp,
-                    "player_max_hp": player_max_hp,
-                    "opponent_hp": 0,
-                    "opponent_max_hp": 0,
-                    "player_move_pps": player_move_pps,
-                    "ai_switch_info": {
-                        "game_over": True
-                    }
-                }) 
+        with _checkout_battle(battle_id) as state:
+            if not _owns(state):
+                return jsonify({"success": False, "message": "This battle is not in progress."}), 404
 
-        conn.commit()
+            player = state.get('USER', player_member_id)
+            opponent = state.get('GYM', opponent_member_id)
+            if not player or not opponent or player.fainted or opponent.fainted:
+                return jsonify({"success": False, "message": "That Pokémon can't battle."}), 400
 
-        # Turn results
-        return jsonify({
-            "success": True,
-            "message": outcome_message,
-            "player_hp": player_hp,
-            "player_max_hp": player_max_hp,
-            "opponent_hp": opponent_hp,
-            "opponent_max_hp": opponent_max_hp,
-            "player_move_pps": player_move_pps  
-        })
+            result = _player_turn(state, player_member_id, opponent_member_id, move_slot)
+            # The gym leader's reply to this exact position is asked for next
+            if not state.ended and not state.get('GYM', opponent_member_id).fainted:
+                get_speculator().precompute(state, player_member_id, opponent_member_id)
+        return jsonify({"success": True, **result})
 
     except Exception as e:
-        print(f"Error processing turn: {e}")
-        if conn:
-            conn.rollback()
+        logger.exception("Could not process turn")
         return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
 
 
 @bp.route('/api/ai-turn', methods=['POST'])
 def process_ai_turn():
-    conn = None
     try:
         data = request.get_json()
-        user_team_id = data.get('player_team_id')
+        battle_id = int(data.get('battle_id'))
         user_member_id = data.get('player_member_id')
-        gym_id = data.get('opponent_team_id')
         gym_member_id = data.get('opponent_member_id')
 
-        conn = getconn()
-        cursor = conn.cursor()
+        with _checkout_battle(battle_id) as state:
+            if not _owns(state):
+                return jsonify({"success": False, "message": "This battle is not in progress."}), 404
 
-        print("DEBUG: we got here 1")
-        get_gym_moves_and_pp = """
-            SELECT name, move_1_id, move_2_id, move_3_id, move_4_id,
-                   move_1_current_pp, move_2_current_pp, move_3_current_pp, move_4_current_pp
-            FROM gym_leader_team_members
-            JOIN pokedex_entries ON gym_leader_team_members.pokedex_id = pokedex_entries.pokedex_id
-            WHERE gym_id = %s AND gym_team_member_id = %s;
-        """
-        cursor.execute(get_gym_moves_and_pp, (gym_id, gym_member_id))
-        gym_data = cursor.fetchone()
-
-        print("DEBUG; we got here 2")
-        get_player_moves_and_pp = """
-            SELECT pType_1, pType_2
-            FROM user_poke_team_members
-            JOIN pokedex_entries ON user_poke_team_members.pokedex_id = pokedex_entries.pokedex_id
-            WHERE user_team_id = %s AND user_team_member_id = %s;
-        """
-        cursor.execute(get_player_moves_and_pp, (user_team_id, user_member_id))
-        player_data = cursor.fetchone()
-        
-        if not gym_data or not player_data:
-            return jsonify({"success": False, "message": "AI failed to gather battle data."}), 500
-        
-        best_move = {'slot': 0, 'score': -1}
-        move_ids = [gym_data['move_1_id'], gym_data['move_2_id'], gym_data['move_3_id'], gym_data['move_4_id']]
-        move_pps = [gym_data['move_1_current_pp'], gym_data['move_2_current_pp'], gym_data['move_3_current_pp'], gym_data['move_4_current_pp']]
-
-        for i, move_id in enumerate(move_ids):
-            if move_id is not None and move_pps[i] > 0:
-                print(f"DEBUG; we got here 3 where move_id = {move_id}")
-                cursor.execute("SELECT move_power, move_type FROM moves WHERE move_id = %s;", (move_id,))
-                move_info = cursor.fetchone()
-                
-                print(f" move type is {move_info['move_type']} and ptype1 is {player_data['pType_1']}")
-                cursor.execute("SELECT multiplier FROM type_matchups WHERE attacking_type = %s AND defending_type = %s;", (move_info['move_type'], player_data['pType_1']))
-                result1 = cursor.fetchone()
-                multiplier = result1['multiplier'] if result1 else 1.0
-
-                if player_data['pType_2'] is not None:
-                    print(f"move type is {move_info['move_type']} and ptype2 is {player_data['pType_2']}")
-                    cursor.execute("SELECT multiplier FROM type_matchups WHERE attacking_type = %s AND defending_type = %s;", (move_info['move_type'], player_data['pType_2']))
-                    result2 = cursor.fetchone()
-                    if result2:
-                        multiplier *= result2['multiplier']
-                
-                score = move_info['move_power'] * multiplier
-                if score > best_move['score']:
-                    best_move['score'] = score
-                    best_move['slot'] = i + 1
-        
-        if best_move['slot'] == 0:
-            for i, pp in enumerate(move_pps):
-                if move_ids[i] is not None and pp > 0:
-                    best_move['slot'] = i + 1
-                    break
-
-        # Call the stored procedure Tanjie made
-        sp_args = ['GYM', gym_id, gym_member_id, 'USER', user_team_id, user_member_id, best_move['slot'], '']
-        cursor.callproc('process_battle_turn', sp_args)
-
-        cursor.execute("SELECT @_process_battle_turn_7;")
-        result = cursor.fetchone()
-        outcome_message = result.get('@_process_battle_turn_7')
-
-        cursor.execute("SELECT current_hp FROM user_poke_team_members WHERE user_team_id = %s AND user_team_member_id = %s;", (user_team_id, user_member_id))
-        player_hp = cursor.fetchone()['current_hp']
-
-        cursor.execute("SELECT current_hp FROM gym_leader_team_members WHERE gym_id = %s AND gym_team_member_id = %s;", (gym_id, gym_member_id))
-        opponent_hp = cursor.fetchone()['current_hp']
-        
-
-        if player_hp <= 0:
-            get_remaining_pokemon = """
-                SELECT *
-                FROM user_poke_team_members u
-                JOIN pokedex_entries p ON u.pokedex_id = p.pokedex_id
-                WHERE u.user_team_id = %s AND u.current_hp > 0
-                ORDER BY u.user_team_member_id ASC
-            """
-            cursor.execute(get_remaining_pokemon, (user_team_id,))
-            remaining_pokemon = cursor.fetchall()
-
-            if remaining_pokemon:
-                return jsonify({
-                    "success": True,
-                    "message": outcome_message + f" Your {remaining_pokemon[0]['name']} is ready to go!",
-                    "player_hp": 0,
-                    "opponent_hp": opponent_hp,
-                    "force_player_switch": {
-                        "name": remaining_pokemon[0]['name'],
-                        "image_url": remaining_pokemon[0]['image_url'],
-                        "current_hp": remaining_pokemon[0]['current_hp'],
-                        "max_hp": remaining_pokemon[0]['hp'],
-                        "user_team_member_id": remaining_pokemon[0]['user_team_member_id']
-                    }
-                })
-            else:
-                return jsonify({
-                    "success": True,
-                    "message": outcome_message + " All your Pokémon have fainted. You lose!",
-                    "player_hp": 0,
-                    "opponent_hp": opponent_hp,
-                    "game_over": True
-                })
+            if not state.get('USER', user_member_id) or not state.get('GYM', gym_member_id):
+                return jsonify({"success": False, "message": "AI failed to gather battle data."}), 500
+            if state.get('GYM', gym_member_id).fainted:
+                return jsonify({"success": False, "message": "That Pokémon can't battle."}), 400
+
+            result = _ai_turn(state, user_member_id, gym_member_id)
+        return jsonify({"success": True, **result})
 
-        conn.commit()
-        return jsonify({ "success": True, "message": outcome_message, "player_hp": player_hp, "opponent_hp": opponent_hp })
-    
     except Exception as e:
-        print(f"Error in AI turn in process_AI_turn(): {e}")
+        logger.exception("Could not process AI turn")
         return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        if conn:
-            conn.close()
 
 
-@bp.route('/api/moves/<int:member_id>')
-def get_moves(member_id):
-    conn = None
+def _play_round(state, data):
+    """
+    One full round on a checked-out battle: the player's action (a move
+        or a switch), then the gym leader's reply, including any Pokemon
+        sent out because one fainted. Returns (response body, status).
+    """
+    if not _owns(state):
+        return {"success": False, "message": "This battle is not in progress."}, 404
+
+    player = state.get('USER', data.get('player_member_id'))
+    opponent = state.get('GYM', data.get('opponent_member_id'))
+    if not player or not opponent:
+        return {"success": False, "message": "Unknown Pokémon for this battle."}, 400
+    # The stored state decides who can still battle, not the client; a
+    # fainted Pokemon of the player's may only be switched out
+    switching = data.get('action', 'move') == 'switch'
+    if opponent.fainted or (player.fainted and not switching):
+        return {"success": False, "message": "That Pokémon can't battle."}, 400
+
+    # First half: the player's action
+    if switching:
+        player = state.get('USER', data.get('switch_to_member_id'))
+        if not player or player.fainted:
+            return {"success": False, "message": "That Pokémon can't battle."}, 400
+        player_turn = {
+            "message": f"Go, {player.name}!",
+            "switched_to": player.member_id,
+        }
+    else:
+        player_turn = _player_turn(state, player.member_id, opponent.member_id, data.get('move_slot'))
+
+    # Second half: the gym leader replies, unless its Pokemon just
+    # fainted (a new one is sent out instead) or the battle is over
+    ai_turn = None
+    if not state.ended and not opponent.fainted:
+        ai_turn = _ai_turn(state, player.member_id, opponent.member_id)
+
+    # Search the next round's replies while the player chooses
+    if not state.ended:
+        if ai_turn and ai_turn.get('opponent_switch'):
+            opponent = state.get('GYM', ai_turn['opponent_switch']['gym_team_member_id'])
+        elif opponent.fainted:
+            opponent = state.next_alive('GYM')
+        get_speculator().precompute(state, player.member_id, opponent.member_id, next_round=True)
+
+    return {
+        "success": True,
+        "player_turn": player_turn,
+        "ai_turn": ai_turn,
+        "game_over": state.ended
+    }, 200
+
+
+@bp.route('/api/round', methods=['POST'])
+def process_round():
+    """
+    One full round in one request. The client animates both halves from
+        this single response.
+    """
     try:
-        conn = getconn()
-        cursor = conn.cursor()  
-
-        get_poke_moves = """
-            SELECT 
-                move_1_id, move_1_current_pp,
-                move_2_id, move_2_current_pp,
-                move_3_id, move_3_current_pp,
-                move_4_id, move_4_current_pp
-            FROM user_poke_team_members
-            WHERE user_team_member_id = %s;
-        """
-
-        cursor.execute(get_poke_moves, (member_id,))
-        record = cursor.fetchone()
-        if not record:
-            return jsonify({"error": "No data found"}), 404
-
-        move_ids = [
-            record['move_1_id'],
-            record['move_2_id'],
-            record['move_3_id'],
-            record['move_4_id']
-        ]
-        current_pps = [
-            record['move_1_current_pp'],
-            record['move_2_current_pp'],
-            record['move_3_current_pp'],
-            record['move_4_current_pp']
-        ]
-
-
-        moves = []
-        for i in range(4):
-            if move_ids[i] is None:
-                continue
-
-            cursor.execute("SELECT move_name, pp FROM moves WHERE move_id = %s", (move_ids[i],))
-            move_row = cursor.fetchone()
-            if not move_row:
-                move_name = "Unknown Move"
-                max_pp = 0
-            else:
-                move_name = move_row['move_name']
-                max_pp = move_row['pp']
-
-            moves.append({
-                "move_name": move_name,
-                "current_pp": current_pps[i],
-                "max_pp": max_pp
-            })
-
-
-        print(f"Fetching moves for user_team_member_id={member_id}")
-        print("Move IDs:", move_ids)
-        for move_id in move_ids:
-            if move_id is not None:
-                cursor.execute("SELECT move_name, pp FROM moves WHERE move_id = %s", (move_id,))
-                move_info = cursor.fetchone()
-                print(f"Move info for ID {move_id}: {move_info}")
+        data = request.get_json()
+        battle_id = int(data.get('battle_id'))
+
+        with _checkout_battle(battle_id) as state:
+            body, status = _play_round(state, data)
+        return jsonify(body), status
+
+    except Exception as e:
+        logger.exception("Could not process round")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+@bp.route('/api/<int:battle_id>/events', methods=['GET'])
+def battle_events(battle_id):
+    """
+    The battle's event stream (Server-Sent Events): every round played
+        on the side channel below arrives here as a "round" event, with
+        the same body /api/round returns. The stream ends after the round
+        that ends the battle.
+    """
+    with _checkout_battle(battle_id) as state:
+        if not _owns(state):
+            return jsonify({"success": False, "message": "This battle is not in progress."}), 404
+
+    events = get_battle_events()
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    subscriber = events.subscribe(battle_id, last_event_id)
+    return Response(stream(events, battle_id, subscriber), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Don't let a reverse proxy (e.g. nginx) hold events back
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@bp.route('/api/<int:battle_id>/events', methods=['POST'])
+def send_battle_action(battle_id):
+    """
+    The event stream's side channel: play a round (same body as
+        /api/round) and push the result down the open stream, answering
+        202. With no stream open in this process the result is the
+        response, like /api/round.
+    """
+    try:
+        data = request.get_json()
+
+        with _checkout_battle(battle_id) as state:
+            body, status = _play_round(state, data)
+            # Published before the battle is released so events stay in
+            # the order the rounds were played
+            if status == 200 and get_battle_events().publish(battle_id, 'round', body, last=state.ended):
+                return jsonify({"success": True, "pushed": True}), 202
+        return jsonify(body), status
+
+    except Exception as e:
+        logger.exception("Could not process round", extra={'battle_id': battle_id})
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+@bp.route('/api/moves/<int:battle_id>/<int:member_id>')
+def get_moves(battle_id, member_id):
+    try:
+        with _checkout_battle(battle_id) as state:
+            if not _owns(state):
+                return jsonify({"error": "Battle not found"}), 404
+
+            member = state.get('USER', member_id)
+            if not member:
+                return jsonify({"error": "No data found"}), 404
+
+            moves = _move_list(member)
 
         return jsonify(moves)
 
     except Exception as e:
-        print(f"[EXCEPTION in get_moves] member_id={member_id}, error={e}")
-        traceback.print_exc()
+        logger.exception("Could not fetch moves", extra={'battle_id': battle_id, 'member_id': member_id})
         return jsonify({"error": "Move fetch failed"}), 500
-    finally:
-        if conn:
-            conn.close()
@@ -0,0 +1,472 @@
+"""
+Gym leader AI with difficulty tiers.
+
+easy is the original rule: the strongest move by power * type multiplier
+(choose_greedy_move in app/battle_engine.py). normal and hard search
+ahead with expectimax: the gym leader takes the action with the best
+expected outcome over the player's reply (usually their strongest move)
+and over every attack that can miss, weighted by its accuracy. hard
+searches deeper and also considers switching to another Pokemon.
+
+The search runs on a compact copy of the battle (HP and PP as tuples of
+ints, so a child state costs a couple of tuple copies) and looks damage
+up in a table of every attacker x move x defender, computed in one NumPy
+expression before the search starts. It deepens one round at a time and
+plays the best action of the deepest round it finished within the time
+budget, so a decision never holds a request for much longer than
+GYM_AI_BUDGET_MS.
+
+Difficulty is set per gym with GYM_AI_DIFFICULTY_BY_GYM ("3:normal,4:hard");
+other gyms use GYM_AI_DIFFICULTY.
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.battle_engine import choose_greedy_move
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Difficulty:
+    name: str
+    # Rounds (gym leader action + player reply) to look ahead; 0 = greedy rule
+    max_depth: int
+    # Whether switching Pokemon is one of the gym leader's options
+    switching: bool
+
+
+DIFFICULTIES = {
+    'easy': Difficulty('easy', 0, False),
+    'normal': Difficulty('normal', 2, False),
+    'hard': Difficulty('hard', 8, True),
+}
+
+default_difficulty = os.environ.get("GYM_AI_DIFFICULTY", "easy")
+# Comma separated gym_id:difficulty pairs
+difficulty_by_gym = os.environ.get("GYM_AI_DIFFICULTY_BY_GYM", "")
+# Milliseconds a search-based decision may take
+budget_ms = float(os.environ.get("GYM_AI_BUDGET_MS", "20"))
+
+# Value of a won battle; the heuristic stays within (-1, 1)
+WIN = 2.0
+
+USER, GYM = 0, 1
+
+# How a memoized value relates to the true one
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# How the search expects the player to play: their strongest move with
+# this chance, otherwise any of their other moves
+PLAYER_BEST_MOVE = 0.7
+
+
+def _parse_difficulties(text):
+    difficulties = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        gym_id, _, name = item.partition(':')
+        name = name.strip()
+        if name not in DIFFICULTIES:
+            logger.warning("Unknown gym AI difficulty", extra={'gym_id': gym_id.strip(), 'difficulty': name})
+            continue
+        difficulties[int(gym_id)] = name
+    return difficulties
+
+
+_gym_difficulties = _parse_difficulties(difficulty_by_gym)
+
+
+def difficulty_for_gym(gym_id):
+    name = _gym_difficulties.get(gym_id, default_difficulty)
+    return DIFFICULTIES.get(name, DIFFICULTIES['easy'])
+
+
+@dataclass
+class AIAction:
+    # 1-4, or 0 when the gym leader switches or has no move left
+    move_slot: int = 0
+    # member_id of the Pokemon to switch to
+    switch_to: int = None
+    # Rounds searched to pick it (0 = greedy rule)
+    depth: int = 0
+    nodes: int = 0
+
+
+def _damage_table(attackers, defenders, chart):
+    """
+    damage[attacker][slot][defender] of a hit, for every pair at once,
+        with the same formula as battle_engine.calculate_damage.
+    """
+    power = np.array([[move.power if move else 0 for move in c.moves] for c in attackers], dtype=np.int64)
+    move_type = np.array([[chart.type_id(move.move_type) if move else chart.neutral for move in c.moves]
+                          for c in attackers], dtype=np.intp)
+    attack = np.array([c.attack for c in attackers], dtype=np.int64)
+    defense = np.maximum(np.array([c.defense for c in defenders], dtype=np.int64), 1)
+    type_1 = np.array([chart.type_id(c.types[0]) for c in defenders], dtype=np.intp)
+    type_2 = np.array([chart.type_id(c.types[1]) for c in defenders], dtype=np.intp)
+
+    move_type = move_type[:, :, None]
+    multiplier = chart.matrix[move_type, type_1[None, None, :]] * chart.matrix[move_type, type_2[None, None, :]]
+    base = (22 * power[:, :, None] * attack[:, None, None]) // (defense[None, None, :] * 50) + 2
+    damage = np.where(power[:, :, None] > 0, np.floor(base * multiplier), 0)
+    return damage.astype(np.int64).tolist()
+
+
+def _hit_chances(team):
+    return [[1.0 if move is None or move.accuracy is None else min(max(move.accuracy, 0), 100) / 100
+             for move in c.moves] for c in team]
+
+
+def _player_weights(count):
+    # Chance of each of count moves, strongest first
+    if count == 1:
+        return (1.0,)
+    rest = (1 - PLAYER_BEST_MOVE) / (count - 1)
+    return (PLAYER_BEST_MOVE,) + (rest,) * (count - 1)
+
+
+def _replace(pair, side, value):
+    return (value, pair[1]) if side == USER else (pair[0], value)
+
+
+def _index(team, member_id):
+    for i, c in enumerate(team):
+        if c.member_id == int(member_id):
+            return i
+    raise ValueError("Unknown combatant for this battle")
+
+
+def position(teams, user_member_id, gym_member_id):
+    """
+    The search state (see CompactBattle) of a battle with these two
+        Pokemon in play. teams is (state.team('USER'), state.team('GYM')).
+    """
+    hp = tuple(tuple(c.current_hp for c in team) for team in teams)
+    pp = tuple(tuple(move.current_pp if move else 0 for c in team for move in c.moves) for team in teams)
+    active = (_index(teams[USER], user_member_id), _index(teams[GYM], gym_member_id))
+    return hp, pp, active
+
+
+class CompactBattle:
+    """
+    What the search needs of a BattleState. A search state is the tuple
+        (hp, pp, active): per side, a tuple of every member's HP, a tuple
+        of every member's four PP counts, and the index of the Pokemon in
+        battle (-1 once the side has none left). Members are in
+        BattleState.team order.
+    """
+
+    def __init__(self, state, chart):
+        self.teams = (state.team('USER'), state.team('GYM'))
+        user, gym = self.teams
+        self.damage = (_damage_table(user, gym, chart), _damage_table(gym, user, chart))
+        self.hit_chance = (_hit_chances(user), _hit_chances(gym))
+        self.total_hp = tuple(max(sum(c.max_hp for c in team), 1) for team in self.teams)
+
+    def initial(self, user_member_id, gym_member_id):
+        return position(self.teams, user_member_id, gym_member_id)
+
+    def index(self, side, member_id):
+        return _index(self.teams[side], member_id)
+
+    def usable_slots(self, s, side):
+        _, pp, active = s
+        base = active[side] * 4
+        side_pp = pp[side]
+        return [slot for slot in range(4) if side_pp[base + slot] > 0]
+
+    def by_damage(self, s, side, slots):
+        # Strongest expected hit first
+        attacker, target = s[2][side], s[2][1 - side]
+        damage = self.damage[side][attacker]
+        hit = self.hit_chance[side][attacker]
+        return sorted(slots, key=lambda slot: -hit[slot] * damage[slot][target])
+
+    def attack(self, s, side, slot, hit):
+        """
+        The state after side's Pokemon uses slot (0-based), and whether
+            the defender fainted. A fainted defender is replaced by the
+            first of its team still standing, like BattleState.next_alive.
+        """
+        hp, pp, active = s
+        attacker = active[side]
+        side_pp = list(pp[side])
+        side_pp[attacker * 4 + slot] -= 1
+        pp = _replace(pp, side, tuple(side_pp))
+        if not hit:
+            return (hp, pp, active), False
+
+        foe = 1 - side
+        target = active[foe]
+        damage = self.damage[side][attacker][slot][target]
+        if not damage:
+            return (hp, pp, active), False
+        foe_hp = list(hp[foe])
+        foe_hp[target] = max(foe_hp[target] - damage, 0)
+        hp = _replace(hp, foe, tuple(foe_hp))
+        if foe_hp[target]:
+            return (hp, pp, active), False
+        replacement = next((i for i, value in enumerate(foe_hp) if value > 0), -1)
+        return (hp, pp, _replace(active, foe, replacement)), True
+
+    def evaluate(self, s):
+        """
+        From the gym leader's side: WIN or -WIN once a side is out of
+            Pokemon, otherwise how much better the gym's share of its HP
+            and of its Pokemon left is than the player's. Counting
+            Pokemon too makes a knockout worth more than its last few HP.
+        """
+        hp, _, active = s
+        if active[GYM] < 0:
+            return -WIN
+        if active[USER] < 0:
+            return WIN
+        hp_share = sum(hp[GYM]) / self.total_hp[GYM] - sum(hp[USER]) / self.total_hp[USER]
+        standing = (sum(1 for value in hp[GYM] if value) / len(hp[GYM])
+                    - sum(1 for value in hp[USER] if value) / len(hp[USER]))
+        return (hp_share + standing) / 2
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+class _Search:
+    """
+    Expectimax over CompactBattle states: the gym leader maximizes, the
+        player's reply and every hit or miss are chance nodes. A chance
+        node stops looking at its remaining outcomes once even their best
+        possible total can't change the gym leader's choice. depth counts
+        the rounds (a gym leader action, then the player's reply) still
+        to search.
+    """
+
+    def __init__(self, battle, switching, deadline=None, max_nodes=None):
+        self.battle = battle
+        self.switching = switching
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        # (node kind, state, depth) -> (value, bound); the same positions
+        # come up again through different orders of hits and misses
+        self.memo = {}
+
+    def _visit(self):
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise _OutOfBudget()
+        if self.deadline is not None and not self.nodes & 63 and time.perf_counter() > self.deadline:
+            raise _OutOfBudget()
+
+    def _lookup(self, key, alpha, beta):
+        entry = self.memo.get(key)
+        if entry is None:
+            return None
+        value, bound = entry
+        if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+            return value
+        return None
+
+    def _store(self, key, value, alpha, beta):
+        bound = UPPER if value <= alpha else LOWER if value >= beta else EXACT
+        self.memo[key] = (value, bound)
+
+    def actions(self, s):
+        # Strongest move first and switches last; the root breaks ties in
+        # favour of the first action, i.e. the easy tier's choice
+        actions = [('move', slot) for slot in self.battle.by_damage(s, GYM, self.battle.usable_slots(s, GYM))]
+        if self.switching:
+            hp, _, active = s
+            actions += [('switch', i) for i, value in enumerate(hp[GYM]) if value > 0 and i != active[GYM]]
+        return actions or [('pass', None)]
+
+    def _attack_outcomes(self, s, side, slot, weight=1.0):
+        # (chance, state, defender fainted) of a hit and of a miss
+        p = self.battle.hit_chance[side][s[2][side]][slot]
+        outcomes = []
+        if p > 0:
+            outcomes.append((weight * p, *self.battle.attack(s, side, slot, True)))
+        if p < 1:
+            outcomes.append((weight * (1 - p), *self.battle.attack(s, side, slot, False)))
+        return outcomes
+
+    def _expect(self, outcomes, then, alpha, beta):
+        """
+        Expected value of then(state, fainted, alpha, beta) over the
+            outcomes. Stops as soon as the outcomes searched so far put it
+            outside (alpha, beta), returning a bound instead.
+        """
+        total = 0.0
+        left = 1.0
+        for chance, after, fainted in outcomes:
+            left -= chance
+            low = (alpha - total - left * WIN) / chance
+            high = (beta - total + left * WIN) / chance
+            value = then(after, fainted, max(low, -WIN), min(high, WIN))
+            total += chance * value
+            if value <= low:
+                return total + left * WIN
+            if value >= high:
+                return total - left * WIN
+        return total
+
+    def action_value(self, s, action, depth, alpha=-WIN, beta=WIN):
+        kind, arg = action
+        if kind == 'switch':
+            hp, pp, active = s
+            return self.player_value((hp, pp, _replace(active, GYM, arg)), depth, alpha, beta)
+        if kind == 'pass':
+            return self.player_value(s, depth, alpha, beta)
+        return self._expect(self._attack_outcomes(s, GYM, arg),
+                            lambda after, fainted, a, b: self._after_gym(after, fainted, depth, a, b),
+                            alpha, beta)
+
+    def _after_gym(self, s, fainted, depth, alpha, beta):
+        # Sending out the next Pokemon after one fainted is the player's
+        # whole reply (the battle page's forced switch)
+        if fainted:
+            return self.gym_value(s, depth - 1, alpha, beta)
+        return self.player_value(s, depth, alpha, beta)
+
+    def gym_value(self, s, depth, alpha, beta):
+        self._visit()
+        active = s[2]
+        if depth == 0 or active[USER] < 0 or active[GYM] < 0:
+            return self.battle.evaluate(s)
+        key = (GYM, s, depth)
+        value = self._lookup(key, alpha, beta)
+        if value is not None:
+            return value
+
+        best = float('-inf')
+        floor = alpha
+        for action in self.actions(s):
+            best = max(best, self.action_value(s, action, depth, floor, beta))
+            floor = max(floor, best)
+            if floor >= beta:
+                break
+        self._store(key, best, alpha, beta)
+        return best
+
+    def _after_player(self, s, fainted, depth, alpha, beta):
+        # A gym Pokemon that just fainted doesn't get to reply this round
+        if fainted:
+            return self.player_value(s, depth - 1, alpha, beta)
+        return self.gym_value(s, depth - 1, alpha, beta)
+
+    def player_value(self, s, depth, alpha, beta):
+        """
+        The player's reply, then the rest of the search.
+        """
+        self._visit()
+        active = s[2]
+        if depth == 0 or active[USER] < 0 or active[GYM] < 0:
+            return self.battle.evaluate(s)
+        key = (USER, s, depth)
+        value = self._lookup(key, alpha, beta)
+        if value is not None:
+            return value
+
+        slots = self.battle.by_damage(s, USER, self.battle.usable_slots(s, USER))
+        if not slots:
+            value = self.gym_value(s, depth - 1, alpha, beta)
+        else:
+            outcomes = []
+            for slot, weight in zip(slots, _player_weights(len(slots))):
+                outcomes += self._attack_outcomes(s, USER, slot, weight)
+            # Likeliest first, so cutoffs come early
+            outcomes.sort(key=lambda outcome: -outcome[0])
+            value = self._expect(outcomes,
+                                 lambda after, fainted, a, b: self._after_player(after, fainted, depth, a, b),
+                                 alpha, beta)
+        self._store(key, value, alpha, beta)
+        return value
+
+
+def decide(battle, root, difficulty, budget_ms=budget_ms, max_nodes=None):
+    """
+    Search from root at a search-based difficulty. Returns None if not
+        even one round fit in the budget.
+    """
+    deadline = time.perf_counter() + budget_ms / 1000 if budget_ms is not None else None
+    search = _Search(battle, difficulty.switching, deadline, max_nodes)
+
+    best = None
+    try:
+        for depth in range(1, difficulty.max_depth + 1):
+            best_value = None
+            for action in search.actions(root):
+                alpha = -WIN if best_value is None else best_value
+                value = search.action_value(root, action, depth, alpha, WIN)
+                if best_value is None or value > best_value + 1e-9:
+                    best_value, best_action = value, action
+            # Every action looks lost: keep the shallower choice, which
+            # at least fights on
+            if best is not None and best_value <= -WIN:
+                break
+            best = best_action, depth
+            # Nothing deeper changes a decided battle
+            if abs(best_value) >= WIN:
+                break
+    except _OutOfBudget:
+        pass
+
+    if best is None:
+        return None
+    (kind, arg), depth = best
+    if kind == 'switch':
+        return AIAction(switch_to=battle.teams[GYM][arg].member_id, depth=depth, nodes=search.nodes)
+    return AIAction(move_slot=arg + 1 if kind == 'move' else 0, depth=depth, nodes=search.nodes)
+
+
+def choose_action(state, gym_member_id, user_member_id, chart, difficulty, budget_ms=budget_ms, max_nodes=None):
+    """
+    The gym leader's action for this turn. Search-based difficulties
+        stop after budget_ms milliseconds and/or max_nodes search nodes
+        (None for no limit); the simulator uses a node limit so its
+        results don't depend on the machine.
+    """
+    if isinstance(difficulty, str):
+        difficulty = DIFFICULTIES[difficulty]
+
+    if difficulty.max_depth > 0:
+        battle = CompactBattle(state, chart)
+        action = decide(battle, battle.initial(user_member_id, gym_member_id), difficulty, budget_ms, max_nodes)
+        if action is not None:
+            return action
+    # Not searching, or not even one round fit in the budget
+    return AIAction(move_slot=choose_greedy_move(state, 'GYM', gym_member_id, user_member_id, chart))
+
+
+def likely_positions(battle, s, count):
+    """
+    The positions the gym leader will most likely have to reply to next
+        round, likeliest first: after each hit or miss of the player's
+        moves (weighted like the search's player model), then after a
+        switch. Outcomes that knock out the gym's Pokemon are left out;
+        it doesn't reply to those. If the player's Pokemon has fainted,
+        sending out each of the others is equally likely.
+    """
+    hp, pp, active = s
+    bench = [i for i, value in enumerate(hp[USER]) if value > 0 and i != active[USER]]
+    switches = [(hp, pp, _replace(active, USER, i)) for i in bench]
+    if not hp[USER][active[USER]]:
+        return switches[:count]
+
+    outcomes = []
+    slots = battle.by_damage(s, USER, battle.usable_slots(s, USER))
+    for slot, weight in zip(slots, _player_weights(len(slots)) if slots else ()):
+        p = battle.hit_chance[USER][active[USER]][slot]
+        for chance, hit in ((weight * p, True), (weight * (1 - p), False)):
+            if chance > 0:
+                after, fainted = battle.attack(s, USER, slot, hit)
+                if not fainted:
+                    outcomes.append((chance, after))
+    outcomes.sort(key=lambda outcome: -outcome[0])
+    return ([after for _, after in outcomes] + switches)[:count]
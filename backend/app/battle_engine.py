@@ -0,0 +1,303 @@
+"""
+In-process battle engine.
+
+A battle is loaded once into a BattleState (both teams, their moves and
+the type chart), turns are resolved in memory, and only the combatants
+that changed are written back in a single statement. This module is the
+only implementation of the battle rules.
+"""
+import math
+import random
+from dataclasses import dataclass, field
+
+
+PARTIES = ('USER', 'GYM')
+
+
+@dataclass
+class MoveSlot:
+    move_id: int
+    name: str
+    move_type: str
+    power: int
+    accuracy: int
+    max_pp: int
+    current_pp: int
+
+
+@dataclass
+class Combatant:
+    party: str
+    member_id: int
+    pokedex_id: int
+    name: str
+    image_url: str
+    types: tuple
+    attack: int
+    defense: int
+    max_hp: int
+    current_hp: int
+    # Always four entries, None for an empty move slot
+    moves: list
+
+    @property
+    def fainted(self):
+        return self.current_hp <= 0
+
+
+@dataclass
+class BattleState:
+    battle_id: int
+    user_id: int
+    user_team_id: int
+    gym_id: int
+    ended: bool
+    combatants: dict
+    # {(attacking_type, defending_type): multiplier}
+    matchups: dict
+    # (party, member_id) of every combatant changed since the last save
+    dirty: set = field(default_factory=set)
+
+    def get(self, party, member_id):
+        return self.combatants.get((party, int(member_id)))
+
+    def team(self, party):
+        members = [c for (p, _), c in self.combatants.items() if p == party]
+        return sorted(members, key=lambda c: c.member_id)
+
+    def next_alive(self, party):
+        for combatant in self.team(party):
+            if not combatant.fainted:
+                return combatant
+        return None
+
+    def winner(self):
+        """
+        'USER' or 'GYM' once one side has no Pokemon left, otherwise None.
+        """
+        if self.next_alive('GYM') is None:
+            return 'USER'
+        if self.next_alive('USER') is None:
+            return 'GYM'
+        return None
+
+
+@dataclass
+class TurnResult:
+    message: str
+    damage: int = 0
+    multiplier: float = 1.0
+    missed: bool = False
+    fainted: bool = False
+
+
+def other_party(party):
+    return 'GYM' if party == 'USER' else 'USER'
+
+
+def type_multiplier(matchups, move_type, defender_types):
+    """
+    Product of the type chart entries for a move against each of the
+        defender's types. Missing pairs count as neutral (1.0).
+    """
+    multiplier = 1.0
+    for defending_type in defender_types:
+        if defending_type is not None:
+            multiplier *= matchups.get((move_type, defending_type), 1.0)
+    return multiplier
+
+
+def calculate_damage(power, attack, defense, multiplier):
+    """
+    The damage of one hit; 0 for moves without power.
+    """
+    if not power or power <= 0:
+        return 0
+    base = (22 * power * attack) // (max(defense, 1) * 50) + 2
+    return int(math.floor(base * multiplier))
+
+
+def resolve_turn(state, attacker_party, attacker_member_id, defender_member_id, move_slot, rng=random):
+    """
+    Apply one attack to the in-memory battle state and describe what happened.
+    """
+    defender_party = other_party(attacker_party)
+    attacker = state.get(attacker_party, attacker_member_id)
+    defender = state.get(defender_party, defender_member_id)
+    if attacker is None or defender is None:
+        raise ValueError("Unknown combatant for this battle")
+
+    slot = int(move_slot or 0)
+    move = attacker.moves[slot - 1] if 1 <= slot <= 4 else None
+
+    if move is None or not move.current_pp or move.current_pp <= 0:
+        return TurnResult(message=f"{attacker.name} has no PP left for that move!")
+
+    # Spend one PP
+    move.current_pp -= 1
+    state.dirty.add((attacker.party, attacker.member_id))
+
+    if move.accuracy is not None and rng.random() * 100 >= move.accuracy:
+        return TurnResult(message=f"{attacker.name} used {move.name}, but it missed!", missed=True)
+
+    multiplier = type_multiplier(state.matchups, move.move_type, defender.types)
+    damage = calculate_damage(move.power, attacker.attack, defender.defense, multiplier)
+
+    defender.current_hp = max(defender.current_hp - damage, 0)
+    state.dirty.add((defender.party, defender.member_id))
+
+    message = f"{attacker.name} used {move.name}!"
+    if multiplier == 0:
+        message += f" It doesn't affect {defender.name}..."
+    elif multiplier > 1:
+        message += " It's super effective!"
+    elif multiplier < 1:
+        message += " It's not very effective..."
+    if damage > 0:
+        message += f" {defender.name} took {damage} damage."
+    if defender.current_hp == 0:
+        message += f" {defender.name} fainted!"
+
+    return TurnResult(message=message, damage=damage, multiplier=multiplier,
+                      fainted=defender.current_hp == 0)
+
+
+def choose_greedy_move(state, attacker_party, attacker_member_id, defender_member_id, chart):
+    """
+    The gym AI: pick the move with the highest power * type multiplier
+        that still has PP. All four slots are scored at once with the
+        precomputed type chart (see app/type_chart.py).
+    """
+    attacker = state.get(attacker_party, attacker_member_id)
+    defender = state.get(other_party(attacker_party), defender_member_id)
+
+    move_ids = [move.move_id if move else None for move in attacker.moves]
+    move_pps = [move.current_pp if move else 0 for move in attacker.moves]
+    return chart.best_slot(move_ids, move_pps, defender.types)
+
+
+LOAD_BATTLE = """
+    SELECT b.battle_id, b.user_team_id, b.gym_id, b.end_time, UT.user_id,
+        bc.party, bc.member_id, bc.pokedex_id, bc.current_hp,
+        p.name, p.image_url, p.pType_1, p.pType_2, p.attack, p.defense, p.hp AS max_hp,
+        bc.move_1_id, m1.move_name AS move_1_name, m1.move_type AS move_1_type,
+            m1.move_power AS move_1_power, m1.accuracy AS move_1_accuracy,
+            m1.pp AS move_1_max_pp, bc.move_1_current_pp,
+        bc.move_2_id, m2.move_name AS move_2_name, m2.move_type AS move_2_type,
+            m2.move_power AS move_2_power, m2.accuracy AS move_2_accuracy,
+            m2.pp AS move_2_max_pp, bc.move_2_current_pp,
+        bc.move_3_id, m3.move_name AS move_3_name, m3.move_type AS move_3_type,
+            m3.move_power AS move_3_power, m3.accuracy AS move_3_accuracy,
+            m3.pp AS move_3_max_pp, bc.move_3_current_pp,
+        bc.move_4_id, m4.move_name AS move_4_name, m4.move_type AS move_4_type,
+            m4.move_power AS move_4_power, m4.accuracy AS move_4_accuracy,
+            m4.pp AS move_4_max_pp, bc.move_4_current_pp
+    FROM battles b
+    JOIN user_teams UT ON UT.user_team_id = b.user_team_id
+    JOIN battle_combatants bc ON bc.battle_id = b.battle_id
+    JOIN pokedex_entries p ON p.pokedex_id = bc.pokedex_id
+    LEFT JOIN moves m1 ON m1.move_id = bc.move_1_id
+    LEFT JOIN moves m2 ON m2.move_id = bc.move_2_id
+    LEFT JOIN moves m3 ON m3.move_id = bc.move_3_id
+    LEFT JOIN moves m4 ON m4.move_id = bc.move_4_id
+    WHERE b.battle_id = %s;
+"""
+
+
+def load_matchups(cursor):
+    cursor.execute("SELECT attacking_type, defending_type, multiplier FROM type_matchups;")
+    return {
+        (row['attacking_type'], row['defending_type']): float(row['multiplier'])
+        for row in cursor.fetchall()
+    }
+
+
+def combatant_from_row(row):
+    moves = []
+    for i in range(1, 5):
+        if row[f'move_{i}_id'] is None:
+            moves.append(None)
+            continue
+        moves.append(MoveSlot(
+            move_id=row[f'move_{i}_id'],
+            name=row[f'move_{i}_name'] or "Unknown Move",
+            move_type=row[f'move_{i}_type'],
+            power=row[f'move_{i}_power'] or 0,
+            accuracy=row[f'move_{i}_accuracy'],
+            max_pp=row[f'move_{i}_max_pp'] or 0,
+            current_pp=row[f'move_{i}_current_pp'] or 0,
+        ))
+    return Combatant(
+        party=row['party'],
+        member_id=row['member_id'],
+        pokedex_id=row['pokedex_id'],
+        name=row['name'],
+        image_url=row['image_url'],
+        types=(row['pType_1'], row['pType_2']),
+        attack=row['attack'],
+        defense=row['defense'],
+        max_hp=row['max_hp'],
+        current_hp=row['current_hp'],
+        moves=moves,
+    )
+
+
+def load_battle_state(cursor, battle_id, matchups=None):
+    """
+    Load everything a turn needs for one battle. Returns None if the
+        battle doesn't exist. Pass matchups to reuse an already loaded
+        type chart instead of querying type_matchups.
+    """
+    cursor.execute(LOAD_BATTLE, (battle_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    first = rows[0]
+    combatants = {}
+    for row in rows:
+        combatant = combatant_from_row(row)
+        combatants[(combatant.party, combatant.member_id)] = combatant
+
+    return BattleState(
+        battle_id=first['battle_id'],
+        user_id=first['user_id'],
+        user_team_id=first['user_team_id'],
+        gym_id=first['gym_id'],
+        ended=first['end_time'] is not None,
+        combatants=combatants,
+        matchups=matchups if matchups is not None else load_matchups(cursor),
+    )
+
+
+def save_battle_state(cursor, state):
+    """
+    Write every changed combatant back with one multi-row upsert.
+    """
+    if not state.dirty:
+        return
+
+    values = []
+    params = []
+    for party, member_id in sorted(state.dirty):
+        combatant = state.combatants[(party, member_id)]
+        pps = [move.current_pp if move is not None else None for move in combatant.moves]
+        values.append("(%s, %s, %s, %s, %s, %s, %s, %s, %s)")
+        params.extend([state.battle_id, party, member_id, combatant.pokedex_id,
+                       combatant.current_hp, *pps])
+
+    save_combatants = f"""
+        INSERT INTO battle_combatants (
+            battle_id, party, member_id, pokedex_id, current_hp,
+            move_1_current_pp, move_2_current_pp, move_3_current_pp, move_4_current_pp
+        )
+        VALUES {', '.join(values)}
+        ON DUPLICATE KEY UPDATE
+            current_hp = VALUES(current_hp),
+            move_1_current_pp = VALUES(move_1_current_pp),
+            move_2_current_pp = VALUES(move_2_current_pp),
+            move_3_current_pp = VALUES(move_3_current_pp),
+            move_4_current_pp = VALUES(move_4_current_pp);
+    """
+    cursor.execute(save_combatants, params)
+    state.dirty.clear()
@@ -0,0 +1,157 @@
+"""
+Per-battle event channels.
+
+The battle page keeps one Server-Sent Events stream open per battle
+(GET /battle/api/<battle_id>/events) and sends its actions on the side
+channel (POST to the same URL). Each round's result is pushed down the
+stream as one event instead of being the POST's response body. Channels
+are in-process: the stream and the actions must reach the same worker
+(run one worker with threads, or sticky sessions). When no stream is
+open in this process, the side channel answers with the result like
+/battle/api/round, so nothing is lost.
+
+Every channel keeps its last few events, so a stream reopened after a
+dropped connection (EventSource sends Last-Event-ID) gets what it missed.
+"""
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+
+# Seconds between keep-alive comments on an idle stream (also how soon a
+# closed connection is noticed)
+keepalive_seconds = float(os.environ.get("BATTLE_EVENTS_KEEPALIVE", "15"))
+# Events kept per battle for reconnecting streams
+history_size = int(os.environ.get("BATTLE_EVENTS_HISTORY", "16"))
+# Channels kept at once; idle ones (no stream open) are dropped first
+max_channels = int(os.environ.get("BATTLE_EVENTS_MAX", "1000"))
+
+# Browsers wait this long (ms) before reopening a dropped stream
+RETRY_MS = 2000
+
+
+class _Channel:
+    __slots__ = ('next_id', 'history', 'subscribers')
+
+    def __init__(self, history):
+        self.next_id = 1
+        self.history = deque(maxlen=history)
+        self.subscribers = []
+
+
+class BattleEvents:
+    """
+    In-process pub/sub of battle events. A subscriber is a queue of
+        (id, event, data) tuples; None means the channel was closed.
+    """
+
+    def __init__(self, history=16, max_channels=1000):
+        self.history = history
+        self.max_channels = max_channels
+        self._channels = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0}
+
+    def _channel(self, battle_id):
+        channel = self._channels.get(battle_id)
+        if channel is None:
+            channel = self._channels[battle_id] = _Channel(self.history)
+            # Drop the least recently used channels nobody is listening to
+            for old_id in list(self._channels):
+                if len(self._channels) <= self.max_channels:
+                    break
+                if not self._channels[old_id].subscribers:
+                    del self._channels[old_id]
+        self._channels.move_to_end(battle_id)
+        return channel
+
+    def subscribe(self, battle_id, last_event_id=None):
+        """
+        A new subscriber queue for a battle, holding the kept events after
+            last_event_id if the stream is being reopened.
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            channel = self._channel(battle_id)
+            if last_event_id is not None:
+                for event in channel.history:
+                    if event[0] > last_event_id:
+                        subscriber.put(event)
+            channel.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, battle_id, subscriber):
+        with self._lock:
+            channel = self._channels.get(battle_id)
+            if channel is not None and subscriber in channel.subscribers:
+                channel.subscribers.remove(subscriber)
+
+    def publish(self, battle_id, event, data, last=False):
+        """
+        Send an event to every open stream of a battle. With last, the
+            streams end after it and the channel is dropped. Returns the
+            number of streams it went to; 0 means nobody in this process
+            is listening and the event was not kept.
+        """
+        with self._lock:
+            channel = self._channels.get(battle_id)
+            if channel is None or not channel.subscribers:
+                return 0
+            item = (channel.next_id, event, data)
+            channel.next_id += 1
+            channel.history.append(item)
+            for subscriber in channel.subscribers:
+                subscriber.put(item)
+                if last:
+                    subscriber.put(None)
+            if last:
+                del self._channels[battle_id]
+            self._stats['published'] += 1
+            self._stats['delivered'] += len(channel.subscribers)
+            return len(channel.subscribers)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['channels'] = len(self._channels)
+            snapshot['streams'] = sum(len(channel.subscribers) for channel in self._channels.values())
+        return snapshot
+
+
+def stream(events, battle_id, subscriber, keepalive=keepalive_seconds):
+    """
+    The text/event-stream body of one subscriber: each event as compact
+        JSON, a comment when idle so proxies keep the connection open,
+        until the channel is closed or the client goes away.
+    """
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            try:
+                item = subscriber.get(timeout=keepalive)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                return
+            event_id, event, data = item
+            yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+    finally:
+        events.unsubscribe(battle_id, subscriber)
+
+
+_events = None
+_events_lock = threading.Lock()
+
+
+def get_battle_events():
+    """
+    The event channels of this process, created on first use.
+    """
+    global _events
+    if _events is None:
+        with _events_lock:
+            if _events is None:
+                _events = BattleEvents(history=history_size, max_channels=max_channels)
+    return _events
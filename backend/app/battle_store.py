@@ -0,0 +1,413 @@
+"""
+Server-side store for in-progress battles.
+
+start_battle loads a battle's state once and puts it here. Turns then
+read and update the cached state without touching the database. The
+state is written back to battle_combatants when the battle ends, or when
+an abandoned battle is evicted (idle for longer than the TTL, or pushed
+out by the size limit).
+
+Two backends are available, picked with the BATTLE_STORE env var:
+    memory - per-process LRU dict (default)
+    redis  - shared by every worker, needs the redis package and BATTLE_STORE_URL
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app.db import getconn
+from app.battle_engine import BattleState, combatant_from_row, save_battle_state
+from app.refdata import refdata
+from app.type_chart import get_type_chart
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+store_backend = os.environ.get("BATTLE_STORE", "memory")
+store_url = os.environ.get("BATTLE_STORE_URL", "redis://localhost:6379/0")
+# Seconds a battle may sit idle before it is written back and dropped
+session_ttl = float(os.environ.get("BATTLE_SESSION_TTL", "1800"))
+# Most battles kept in memory at once
+session_max = int(os.environ.get("BATTLE_SESSION_MAX", "1000"))
+# Seconds between sweeps of idle battles out of Redis
+sweep_interval = float(os.environ.get("BATTLE_STORE_SWEEP_INTERVAL", "30"))
+
+
+def write_back(state):
+    """
+    Persist a battle's unsaved HP/PP changes to battle_combatants.
+    """
+    if not state.dirty:
+        return
+    conn = getconn()
+    try:
+        with conn.cursor() as cursor:
+            save_battle_state(cursor, state)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class _Entry:
+    __slots__ = ('battle_id', 'state', 'expires_at', 'lock', 'evicted')
+
+    def __init__(self, battle_id, state, expires_at):
+        self.battle_id = battle_id
+        # None while the first request for the battle is still loading it
+        self.state = state
+        self.expires_at = expires_at
+        self.lock = threading.Lock()
+        # Set once the entry has left the store; requests that were
+        # waiting on it start over instead of using it
+        self.evicted = False
+
+
+class MemoryBattleStore:
+    """
+    Per-process battle cache with TTL and LRU eviction.
+    """
+
+    def __init__(self, ttl=1800.0, max_battles=1000, on_evict=write_back):
+        self.ttl = ttl
+        self.max_battles = max_battles
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Battles evicted but not yet written back; they can't be loaded
+        # again until the write-back is done
+        self._writing_back = set()
+        self._written_back = threading.Condition(self._lock)
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _remove(self, battle_id):
+        # Caller must hold the store lock
+        entry = self._entries.pop(battle_id)
+        entry.evicted = True
+        self._writing_back.add(battle_id)
+        return entry
+
+    def _evict(self, entries):
+        # Write back outside the store lock, so a slow database doesn't
+        # block other battles. Taking the entry's lock waits for a request
+        # still holding the battle.
+        for entry in entries:
+            with entry.lock:
+                try:
+                    if entry.state is not None:
+                        self.on_evict(entry.state)
+                except Exception as e:
+                    logger.exception("Could not write back battle", extra={'battle_id': entry.battle_id})
+                finally:
+                    with self._lock:
+                        self._writing_back.discard(entry.battle_id)
+                        self._written_back.notify_all()
+
+    def _collect_expired(self, now):
+        # Caller must hold the store lock. Entries are kept in access
+        # order, so expired ones are always at the front.
+        evicted = []
+        while self._entries:
+            battle_id, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_battles:
+                break
+            evicted.append(self._remove(battle_id))
+            self._stats['evictions'] += 1
+        return evicted
+
+    def _sweep(self):
+        with self._lock:
+            evicted = self._collect_expired(time.monotonic())
+        self._evict(evicted)
+
+    def put(self, state):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[state.battle_id] = _Entry(state.battle_id, state, now + self.ttl)
+            self._entries.move_to_end(state.battle_id)
+            evicted = self._collect_expired(now)
+        self._evict(evicted)
+
+    def _claim(self, battle_id):
+        # The battle's entry, and True if the caller has to load it. A new
+        # entry goes in already locked, so other requests for the battle
+        # wait for this load instead of loading it again.
+        self._sweep()
+        now = time.monotonic()
+        with self._lock:
+            while battle_id in self._writing_back:
+                self._written_back.wait()
+            entry = self._entries.get(battle_id)
+            if entry is not None:
+                self._stats['hits'] += 1
+                entry.expires_at = now + self.ttl
+                self._entries.move_to_end(battle_id)
+                return entry, False
+            self._stats['misses'] += 1
+            entry = self._entries[battle_id] = _Entry(battle_id, None, now + self.ttl)
+            entry.lock.acquire()
+            return entry, True
+
+    @contextmanager
+    def checkout(self, battle_id, load):
+        """
+        Hold one battle's state for the length of a request. The state is
+            loaded with load() if it isn't cached, and other requests for the
+            same battle wait until this one is done with it.
+        """
+        while True:
+            entry, loading = self._claim(battle_id)
+            if loading:
+                try:
+                    entry.state = load()
+                finally:
+                    if entry.state is None:
+                        with self._lock:
+                            if self._entries.get(battle_id) is entry:
+                                del self._entries[battle_id]
+                        entry.evicted = True
+                        entry.lock.release()
+                if entry.state is None:
+                    yield None
+                    return
+                break
+            entry.lock.acquire()
+            if not entry.evicted:
+                break
+            # Evicted, discarded or failed to load while we waited
+            entry.lock.release()
+
+        try:
+            yield entry.state
+        finally:
+            entry.lock.release()
+            # Over max_battles, e.g. with a limit of 0: write back now
+            self._sweep()
+
+    def discard(self, battle_id):
+        """
+        Forget a battle without writing it back (it has already been saved).
+        """
+        with self._lock:
+            entry = self._entries.pop(battle_id, None)
+            if entry is not None:
+                entry.evicted = True
+
+    def flush(self):
+        """
+        Write back and drop every cached battle (used on shutdown).
+        """
+        with self._lock:
+            evicted = [self._remove(battle_id) for battle_id in list(self._entries)]
+        self._evict(evicted)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['active_battles'] = len(self._entries)
+        return snapshot
+
+
+def pack_state(state):
+    """
+    The part of a battle that changes, as compact JSON: the battle's ids
+        and, per combatant, its Pokemon, move ids, HP and PP. Names,
+        stats, moves and the type chart come back from the reference data
+        in unpack_state.
+    """
+    return json.dumps({
+        'battle_id': state.battle_id, 'user_id': state.user_id, 'user_team_id': state.user_team_id,
+        'gym_id': state.gym_id, 'ended': state.ended,
+        'combatants': [
+            [c.party, c.member_id, c.pokedex_id, c.current_hp,
+             [move.move_id if move else None for move in c.moves],
+             [move.current_pp if move else None for move in c.moves]]
+            for c in state.combatants.values()
+        ],
+        'dirty': sorted(state.dirty),
+    }, separators=(',', ':'))
+
+
+def unpack_state(blob):
+    """
+    Rebuild a BattleState from pack_state's JSON and the reference data.
+    """
+    data = json.loads(blob)
+    combatants = {}
+    for party, member_id, pokedex_id, current_hp, move_ids, pps in data['combatants']:
+        pokemon = refdata.pokemon(pokedex_id)
+        row = {
+            'party': party, 'member_id': member_id, 'pokedex_id': pokedex_id,
+            'name': pokemon['name'], 'image_url': pokemon['image_url'],
+            'pType_1': pokemon['pType_1'], 'pType_2': pokemon['pType_2'],
+            'attack': pokemon['attack'], 'defense': pokemon['defense'],
+            'max_hp': pokemon['hp'], 'current_hp': current_hp,
+        }
+        for i, (move_id, pp) in enumerate(zip(move_ids, pps), start=1):
+            move = refdata.move(move_id) if move_id is not None else None
+            row.update({
+                f'move_{i}_id': move_id,
+                f'move_{i}_name': move['move_name'] if move else None,
+                f'move_{i}_type': move['move_type'] if move else None,
+                f'move_{i}_power': move['move_power'] if move else None,
+                f'move_{i}_accuracy': move['accuracy'] if move else None,
+                f'move_{i}_max_pp': move['pp'] if move else None,
+                f'move_{i}_current_pp': pp,
+            })
+        combatant = combatant_from_row(row)
+        combatants[(party, member_id)] = combatant
+
+    return BattleState(
+        battle_id=data['battle_id'], user_id=data['user_id'], user_team_id=data['user_team_id'],
+        gym_id=data['gym_id'], ended=data['ended'], combatants=combatants,
+        matchups=get_type_chart().matchups,
+        dirty={tuple(key) for key in data['dirty']},
+    )
+
+
+class RedisBattleStore:
+    """
+    Battle cache shared between worker processes through Redis (or any
+        server speaking the Redis protocol). Each battle is kept under
+        battle:<id> as pack_state's compact JSON; a sorted set of
+        last-access times drives TTL and LRU eviction, swept on a
+        background thread, so that abandoned battles still get written
+        back.
+    """
+
+    LRU_KEY = 'battle:lru'
+
+    def __init__(self, url, ttl=1800.0, max_battles=1000, on_evict=write_back, sweep_interval=30.0):
+        if redis is None:
+            raise RuntimeError("BATTLE_STORE=redis needs the 'redis' package installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.max_battles = max_battles
+        self.on_evict = on_evict
+        # Battles finished by this process while checked out
+        self._discarded = set()
+        self._discarded_lock = threading.Lock()
+        self._sweeper = None
+        self.start_sweeper(sweep_interval)
+
+    def _key(self, battle_id):
+        return f'battle:{battle_id}'
+
+    def _save(self, state):
+        pipe = self.client.pipeline()
+        # Keep the record a little longer than the TTL so the sweep can
+        # still write it back before Redis drops it
+        pipe.set(self._key(state.battle_id), pack_state(state), ex=int(self.ttl * 2) + 1)
+        pipe.zadd(self.LRU_KEY, {state.battle_id: time.time()})
+        pipe.execute()
+
+    def sweep(self):
+        """
+        Write back and drop battles idle for longer than the TTL, and the
+            least recently used ones over max_battles.
+        """
+        now = time.time()
+        stale = self.client.zrangebyscore(self.LRU_KEY, 0, now - self.ttl)
+        overflow = self.client.zcard(self.LRU_KEY) - self.max_battles
+        if overflow > 0:
+            stale += self.client.zrange(self.LRU_KEY, 0, overflow - 1)
+        battle_ids = sorted({int(raw_id) for raw_id in stale})
+        if not battle_ids:
+            return
+
+        # Only the worker that wins the ZREM writes a battle back
+        pipe = self.client.pipeline()
+        for battle_id in battle_ids:
+            pipe.zrem(self.LRU_KEY, battle_id)
+        won = [battle_id for battle_id, removed in zip(battle_ids, pipe.execute()) if removed]
+
+        for battle_id in won:
+            with self.client.lock(f'{self._key(battle_id)}:lock', timeout=30):
+                pipe = self.client.pipeline()
+                pipe.get(self._key(battle_id))
+                pipe.delete(self._key(battle_id))
+                blob, _ = pipe.execute()
+            if blob:
+                try:
+                    self.on_evict(unpack_state(blob))
+                except Exception as e:
+                    logger.exception("Could not write back battle", extra={'battle_id': battle_id})
+
+    def start_sweeper(self, interval):
+        if self._sweeper is not None or not interval:
+            return
+
+        def sweep_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.warning(f"Could not sweep idle battles: {e}")
+
+        self._sweeper = threading.Thread(target=sweep_forever, name='battle-store-sweep', daemon=True)
+        self._sweeper.start()
+
+    def put(self, state):
+        self._save(state)
+
+    @contextmanager
+    def checkout(self, battle_id, load):
+        with self.client.lock(f'{self._key(battle_id)}:lock', timeout=30):
+            blob = self.client.get(self._key(battle_id))
+            state = unpack_state(blob) if blob else load()
+            if state is None:
+                yield None
+                return
+            yield state
+            with self._discarded_lock:
+                finished = battle_id in self._discarded
+                self._discarded.discard(battle_id)
+            if not finished:
+                self._save(state)
+
+    def discard(self, battle_id):
+        with self._discarded_lock:
+            self._discarded.add(battle_id)
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(battle_id))
+        pipe.zrem(self.LRU_KEY, battle_id)
+        pipe.execute()
+
+    def flush(self):
+        # Shared between workers; the sweep takes care of abandoned battles
+        pass
+
+    def stats(self):
+        return {'active_battles': self.client.zcard(self.LRU_KEY)}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_battle_store():
+    """
+    The battle store for this process, created on first use.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if store_backend == 'redis':
+                    _store = RedisBattleStore(store_url, ttl=session_ttl, max_battles=session_max,
+                                              sweep_interval=sweep_interval)
+                else:
+                    _store = MemoryBattleStore(ttl=session_ttl, max_battles=session_max)
+                    # Don't lose unsaved battles when the worker exits
+                    atexit.register(_store.flush)
+    return _store
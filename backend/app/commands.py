@@ -0,0 +1,121 @@
+"""
+Maintenance commands, run with the flask CLI, e.g.
+    flask --app run rebuild-user-stats
+"""
+import json
+
+import click
+
+from app.db import getconn
+from app.refdata import refdata
+from app.stats import rebuild_user_stats
+from app.slowlog import read_report, slow_query_log_path
+from app.battle_ai import DIFFICULTIES
+from app.simulator import PLAYER_POLICIES, load_matchup, simulate
+from app.type_chart import get_type_chart
+
+
+@click.command('rebuild-user-stats')
+@click.option('--user-id', type=int, default=None, help="Only rebuild this user's stats.")
+def rebuild_user_stats_command(user_id):
+    """
+    Recompute user_stats and user_gym_clears from the battles table.
+    """
+    conn = getconn()
+    try:
+        with conn.cursor() as cursor:
+            users = rebuild_user_stats(cursor, user_id=user_id)
+        conn.commit()
+    finally:
+        conn.close()
+    click.echo(f"Rebuilt stats for {users} user(s).")
+
+
+@click.command('slow-query-report')
+@click.option('--path', default=slow_query_log_path, show_default=True, help="Slow-query log to read.")
+@click.option('--top', type=int, default=20, show_default=True, help="Statements to show.")
+@click.option('--explain/--no-explain', default=False, help="Print each statement's EXPLAIN plan.")
+def slow_query_report_command(path, top, explain):
+    """
+    Summarize the slow-query log by statement, most total time first.
+    """
+    try:
+        rows = read_report(path)
+    except FileNotFoundError:
+        raise click.ClickException(f"No slow-query log at {path}")
+
+    click.echo(f"{len(rows)} slow statement(s) in {path}")
+    for row in rows[:top]:
+        click.echo("")
+        click.echo(f"{row['total_ms']:.0f} ms total, {row['count']} run(s), "
+                   f"{row['max_ms']:.0f} ms max")
+        click.echo(f"  routes: {', '.join(row['endpoints']) or '-'}")
+        if row['full_scans']:
+            click.echo(f"  full scans (needs an index?): {', '.join(map(str, row['full_scans']))}")
+        click.echo(f"  {row['fingerprint']}")
+        if explain and row['explain']:
+            for step in row['explain']:
+                click.echo(f"    {step}")
+
+
+@click.command('simulate-battles')
+@click.option('--team-id', 'team_ids', type=int, multiple=True, required=True,
+              help="user_team_id to play with (repeat for several teams).")
+@click.option('--gym-id', 'gym_ids', type=int, multiple=True,
+              help="Gym to play against (repeat for several; default every gym).")
+@click.option('--battles', type=int, default=1000, show_default=True, help="Battles per team and gym.")
+@click.option('--workers', type=int, default=None, help="Worker processes (default: one per CPU).")
+@click.option('--seed', type=int, default=0, show_default=True, help="Seed of every battle's RNG.")
+@click.option('--player', type=click.Choice(sorted(PLAYER_POLICIES)), default='greedy', show_default=True,
+              help="How the user team picks its moves.")
+@click.option('--max-turns', type=int, default=500, show_default=True, help="Turns before a battle is a draw.")
+@click.option('--ai', type=click.Choice(list(DIFFICULTIES)), default=None,
+              help="Gym leader difficulty (default: each gym's configured one).")
+@click.option('--ai-nodes', type=int, default=2000, show_default=True,
+              help="Search nodes per gym leader decision at normal and hard.")
+@click.option('--json', 'json_path', default=None, help="Also write the results to this JSON file.")
+def simulate_battles_command(team_ids, gym_ids, battles, workers, seed, player, max_turns, ai, ai_nodes,
+                             json_path):
+    """
+    Play user teams against gym leaders headlessly and report win rates.
+    """
+    chart = get_type_chart()
+    gym_ids = gym_ids or [gym['gym_id'] for gym in refdata.gym_leaders()]
+
+    templates = []
+    conn = getconn()
+    try:
+        with conn.cursor() as cursor:
+            for team_id in team_ids:
+                for gym_id in gym_ids:
+                    template = load_matchup(cursor, team_id, gym_id, chart.matchups)
+                    if template is None:
+                        click.echo(f"Skipping team {team_id} vs gym {gym_id}: a side has no Pokemon.", err=True)
+                        continue
+                    templates.append(template)
+    finally:
+        conn.close()
+    if not templates:
+        raise click.ClickException("Nothing to simulate.")
+
+    results = simulate(templates, chart, battles, seed=seed, workers=workers, player=player,
+                       max_turns=max_turns, ai=ai, ai_nodes=ai_nodes)
+
+    click.echo(f"{'team':>6} {'gym':>4} {'ai':>6} {'battles':>8} {'win rate':>9} {'95% CI':>15} "
+               f"{'draws':>6} {'turns':>6} {'p50':>5} {'p90':>5}")
+    for row in results:
+        low, high = row['win_rate_95']
+        click.echo(f"{row['user_team_id']:>6} {row['gym_id']:>4} {row['ai']:>6} {row['battles']:>8} "
+                   f"{row['win_rate']:>9.1%} {f'{low:.1%}-{high:.1%}':>15} {row['draw']:>6} "
+                   f"{row['mean_turns']:>6.1f} {row['p50_turns']:>5} {row['p90_turns']:>5}")
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as output:
+            json.dump({'seed': seed, 'battles': battles, 'player': player, 'ai_nodes': ai_nodes, 'results': results},
+                      output, indent=2)
+
+
+def register_commands(app):
+    app.cli.add_command(rebuild_user_stats_command)
+    app.cli.add_command(slow_query_report_command)
+    app.cli.add_command(simulate_battles_command)
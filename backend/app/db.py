@@ -1,8 +1,14 @@
 import os
-from flask import Flask
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from flask import Flask, g, has_app_context
 from dotenv import load_dotenv
 import pymysql
 from google.cloud.sql.connector import Connector
+from app.slowlog import slow_log
 
 # load enviornment vars from .env file
 load_dotenv()
@@ -10,19 +16,391 @@ load_dotenv()
 app = Flask(__name__)
 
 # Load database connection details from enviornment vars
-instance_connection_name = os.environ[
-        "INSTANCE_CONNECTION_NAME"
-    ]  # e.g. 'project:region:instance'
+# Set DB_HOST to connect straight to a MySQL server (e.g. a local one for
+# load tests) instead of going through the Cloud SQL Connector
+db_host = os.environ.get("DB_HOST")
+db_port = int(os.environ.get("DB_PORT", "3306"))
+if db_host:
+    instance_connection_name = os.environ.get("INSTANCE_CONNECTION_NAME")
+else:
+    instance_connection_name = os.environ[
+            "INSTANCE_CONNECTION_NAME"
+        ]  # e.g. 'project:region:instance'
 db_user = os.environ["DB_USER"]  # e.g. 'my-db-user'
 db_pass = os.environ["DB_PASS"]  # e.g. 'my-db-password'
 db_name = os.environ["DB_NAME"]  # e.g. 'my-database'
 
-# Initialize the Cloud SQL Connector
-connector = Connector()
+# Connection pool settings (all optional)
+pool_min_size = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+pool_max_size = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+# Seconds a physical connection may live before it is recycled
+pool_max_lifetime = float(os.environ.get("DB_POOL_MAX_LIFETIME", "1800"))
+# Seconds a request waits for a free connection before giving up
+pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+# Connections idle for longer than this are pinged before being handed out
+pool_health_check_after = float(os.environ.get("DB_POOL_HEALTH_CHECK_AFTER", "5"))
 
-# Connect to the database 
-def getconn() -> pymysql.connections.Connection:
-    conn: pymysql.connections.Connection = connector.connect(
+
+# SQL tracing (see app/debug.py)
+# Share of requests whose statements are recorded (0 turns tracing off)
+sql_trace_sample_rate = float(os.environ.get("SQL_TRACE_SAMPLE_RATE", "0.01"))
+# A statement shape run this many times in one request is flagged as N+1
+sql_trace_repeat_threshold = int(os.environ.get("SQL_TRACE_REPEAT_THRESHOLD", "5"))
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection became free within the pool's wait timeout.
+    """
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pymysql connection that is handed out by the pool.
+        Everything is forwarded to the real connection, except close(),
+        which gives the connection back to the pool instead of dropping it.
+    """
+
+    def __init__(self, pool, raw_conn, created_at):
+        self._pool = pool
+        self._raw = raw_conn
+        self.created_at = created_at
+        self.last_used = time.monotonic()
+        self._checked_out = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        trace = current_trace()
+        if trace is not None or slow_log.enabled:
+            return TracedCursor(cursor, trace)
+        return cursor
+
+    def close(self):
+        # Blueprints call close() in their finally blocks; return to pool
+        if self._checked_out:
+            self._checked_out = False
+            self._pool.release(self)
+
+
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|\b\d+(?:\.\d+)?\b|%s|%\(\w+\)s")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\?\.\.\.\)(?:\s*,\s*\(\?\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Normalized shape of a statement: literals and placeholders become ?,
+        IN/VALUES lists collapse to (?...), whitespace is squeezed. Two
+        statements that differ only in their parameters share a fingerprint.
+    """
+    shape = _LITERALS.sub('?', sql)
+    shape = _LISTS.sub('(?...)', shape)
+    shape = _ROWS.sub('(?...)', shape)
+    shape = _SPACES.sub(' ', shape).strip().rstrip(';').strip()
+    return shape
+
+
+class QueryTrace:
+    """
+    Statements run while handling one request: how many, how long they
+        took, and how often each fingerprint came up.
+    """
+
+    def __init__(self, repeat_threshold=5):
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.total_time = 0.0
+        # fingerprint -> [count, total seconds]
+        self.fingerprints = {}
+
+    def record(self, sql, elapsed, statements=1):
+        self.count += statements
+        self.total_time += elapsed
+        entry = self.fingerprints.get(sql)
+        if entry is None:
+            self.fingerprints[sql] = [statements, elapsed]
+        else:
+            entry[0] += statements
+            entry[1] += elapsed
+
+    def summary(self):
+        """
+        Totals plus per-fingerprint counts, slowest first. Raw statements
+            are only fingerprinted here, after the request is done.
+        """
+        shapes = {}
+        for sql, (count, elapsed) in self.fingerprints.items():
+            shape = shapes.setdefault(fingerprint(sql), [0, 0.0])
+            shape[0] += count
+            shape[1] += elapsed
+        statements = sorted(
+            ({'fingerprint': shape, 'count': count, 'time_ms': round(elapsed * 1000, 3),
+              'repeated': count >= self.repeat_threshold}
+             for shape, (count, elapsed) in shapes.items()),
+            key=lambda row: row['time_ms'], reverse=True,
+        )
+        return {
+            'queries': self.count,
+            'time_ms': round(self.total_time * 1000, 3),
+            'repeated': [row['fingerprint'] for row in statements if row['repeated']],
+            'statements': statements,
+        }
+
+
+class TracedCursor:
+    """
+    Cursor wrapper that times every execute() into the request's QueryTrace
+        (if it is sampled) and the slow-query log. Anything else is
+        forwarded to the real cursor.
+    """
+
+    def __init__(self, cursor, trace):
+        self._cursor = cursor
+        self._trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _observe(self, query, args, elapsed):
+        if self._trace is not None:
+            self._trace.record(query, elapsed)
+        slow_log.observe(self._cursor, query, args, elapsed)
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            self._observe(query, args, time.perf_counter() - start)
+
+    def executemany(self, query, args):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            self._observe(query, args, time.perf_counter() - start)
+
+
+def current_trace():
+    """
+    The QueryTrace of the request being handled, if it was sampled.
+    """
+    if not has_app_context():
+        return None
+    return g.get('sql_trace')
+
+
+class ConnectionPool:
+    """
+    A bounded pool of database connections for one worker process.
+        - min_size connections are kept open once the pool is warm
+        - at most max_size connections exist at the same time
+        - connections older than max_lifetime seconds are recycled
+        - idle connections are pinged on checkout before being reused
+        - callers wait up to timeout seconds when the pool is exhausted
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_lifetime=1800.0,
+                 timeout=10.0, health_check_after=5.0):
+        self._connect = connect
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'failed_health_checks': 0,
+        }
+
+    def _open(self):
+        raw = self._connect()
+        with self._cond:
+            self._stats['connections_created'] += 1
+        return PooledConnection(self, raw, time.monotonic())
+
+    def _discard(self, conn):
+        # Caller must hold the condition lock
+        self._size -= 1
+        self._stats['connections_closed'] += 1
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+        self._cond.notify()
+
+    def _expired(self, conn, now):
+        return self.max_lifetime > 0 and now - conn.created_at > self.max_lifetime
+
+    def _healthy(self, conn, now):
+        if now - conn.last_used < self.health_check_after:
+            return True
+        try:
+            conn._raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def fill(self):
+        """
+        Open connections until the pool holds at least min_size of them.
+        """
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, opening a new one if the pool
+            still has room, or waiting for one to be released otherwise.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                conn = None
+                while conn is None:
+                    now = time.monotonic()
+                    if self._idle:
+                        candidate = self._idle.pop()
+                        if self._expired(candidate, now):
+                            self._discard(candidate)
+                            continue
+                        conn = candidate
+                    elif self._size < self.max_size:
+                        # Reserve a slot, then connect outside the lock
+                        self._size += 1
+                        break
+                    else:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            raise PoolTimeout(
+                                f"No database connection available after {self.timeout}s"
+                            )
+                        self._stats['waits'] += 1
+                        self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, time.monotonic()):
+                with self._cond:
+                    self._stats['failed_health_checks'] += 1
+                    self._discard(conn)
+                continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+            conn._checked_out = True
+            return conn
+
+    def release(self, conn):
+        """
+        Give a connection back. Any transaction left open by the request is
+            rolled back so the next user starts from a clean session.
+        """
+        try:
+            conn._raw.rollback()
+            broken = False
+        except Exception:
+            broken = True
+
+        now = time.monotonic()
+        conn.last_used = now
+        with self._cond:
+            if broken or self._expired(conn, now):
+                self._discard(conn)
+            else:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def stats(self):
+        """
+        Return a snapshot of pool utilization counters.
+        """
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['size'] = self._size
+            snapshot['idle'] = len(self._idle)
+            snapshot['in_use'] = self._size - len(self._idle)
+            snapshot['min_size'] = self.min_size
+            snapshot['max_size'] = self.max_size
+        return snapshot
+
+    def close_all(self):
+        """
+        Close every idle connection (used on shutdown).
+        """
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+
+# One pool (and one Cloud SQL Connector) per worker process. Both are
+# created lazily so that forking WSGI servers don't share sockets.
+_connector = None
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _connect() -> pymysql.connections.Connection:
+    if db_host:
+        return pymysql.connect(
+            host=db_host,
+            port=db_port,
+            user=db_user,
+            password=db_pass,
+            db=db_name,
+            cursorclass=pymysql.cursors.DictCursor,
+            charset='utf8mb4'
+        )
+    conn: pymysql.connections.Connection = _connector.connect(
         instance_connection_name,
         "pymysql",
         user=db_user,
@@ -31,4 +409,38 @@ def getconn() -> pymysql.connections.Connection:
         cursorclass=pymysql.cursors.DictCursor,
         charset='utf8mb4'
     )
-    return conn
\ No newline at end of file
+    return conn
+
+
+def get_pool() -> ConnectionPool:
+    global _pool, _pool_pid, _connector
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # Initialize the Cloud SQL Connector
+                if not db_host:
+                    _connector = Connector()
+                _pool = ConnectionPool(
+                    _connect,
+                    min_size=pool_min_size,
+                    max_size=pool_max_size,
+                    max_lifetime=pool_max_lifetime,
+                    timeout=pool_timeout,
+                    health_check_after=pool_health_check_after,
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+
+# Connect to the database
+def getconn() -> PooledConnection:
+    """
+    Check a connection out of this worker's pool. Calling close() on the
+        returned connection hands it back to the pool.
+    """
+    return get_pool().acquire()
@@ -0,0 +1,117 @@
+"""
+Per-request SQL tracing.
+
+A sample of requests (SQL_TRACE_SAMPLE_RATE) get a QueryTrace in flask.g;
+every cursor handed out by app.db during that request records its
+statements into it. Traced responses carry X-DB-Queries, X-DB-Time-Ms
+and, when some statement shape ran SQL_TRACE_REPEAT_THRESHOLD times or
+more (an N+1 pattern), X-DB-Repeated. The most recent traces are listed
+at /debug/sql, and this worker's slow statements (app/slowlog.py) at
+/debug/slow. Both are only served when the app runs in debug mode or
+SQL_TRACE_DEBUG=1. Sending "X-DB-Trace: 1" traces a single request in
+those same setups.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from flask import jsonify, Blueprint, current_app, g, request, abort
+
+from app.db import QueryTrace, sql_trace_sample_rate, sql_trace_repeat_threshold
+from app.slowlog import slow_log
+
+logger = logging.getLogger(__name__)
+
+
+debug_endpoint_enabled = os.environ.get("SQL_TRACE_DEBUG", "0") == "1"
+# Traced requests kept for /debug/sql
+RECENT_TRACES = 100
+
+bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+_recent = deque(maxlen=RECENT_TRACES)
+_recent_lock = threading.Lock()
+
+
+def _debug_allowed():
+    return debug_endpoint_enabled or current_app.debug
+
+
+@bp.before_app_request
+def start_trace():
+    forced = request.headers.get('X-DB-Trace') == '1' and _debug_allowed()
+    if forced or (sql_trace_sample_rate > 0 and random.random() < sql_trace_sample_rate):
+        g.sql_trace = QueryTrace(repeat_threshold=sql_trace_repeat_threshold)
+
+
+@bp.after_app_request
+def finish_trace(response):
+    trace = g.pop('sql_trace', None)
+    if trace is None or request.blueprint == 'debug':
+        return response
+
+    summary = trace.summary()
+    response.headers['X-DB-Queries'] = str(summary['queries'])
+    response.headers['X-DB-Time-Ms'] = f"{summary['time_ms']:.3f}"
+    if summary['repeated']:
+        response.headers['X-DB-Repeated'] = str(len(summary['repeated']))
+        logger.warning("Possible N+1 queries", extra={'repeated': summary['repeated']})
+
+    summary.update({
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'at': time.time(),
+    })
+    with _recent_lock:
+        _recent.append(summary)
+    return response
+
+
+@bp.route('/sql', methods=['GET'])
+def recent_sql():
+    """
+    Recent traced requests (newest first), plus the repeated statement
+        shapes seen across all of them.
+    """
+    if not _debug_allowed():
+        abort(404)
+
+    with _recent_lock:
+        traces = list(reversed(_recent))
+
+    repeated = {}
+    for trace in traces:
+        for row in trace['statements']:
+            if row['repeated']:
+                hot = repeated.setdefault(row['fingerprint'], {'fingerprint': row['fingerprint'],
+                                                               'requests': 0, 'endpoints': set()})
+                hot['requests'] += 1
+                hot['endpoints'].add(trace['endpoint'])
+    for hot in repeated.values():
+        hot['endpoints'] = sorted(e for e in hot['endpoints'] if e)
+
+    return jsonify({
+        'sample_rate': sql_trace_sample_rate,
+        'repeat_threshold': sql_trace_repeat_threshold,
+        'repeated': sorted(repeated.values(), key=lambda hot: hot['requests'], reverse=True),
+        'requests': traces,
+    })
+
+
+@bp.route('/slow', methods=['GET'])
+def slow_sql():
+    """
+    Slow statements seen by this worker, most total time first.
+    """
+    if not _debug_allowed():
+        abort(404)
+    return jsonify({
+        'threshold_ms': slow_log.threshold * 1000,
+        'log': slow_log.path,
+        'statements': slow_log.summary(),
+    })
@@ -1,5 +1,8 @@
+import logging
 from flask import jsonify, render_template, Blueprint
-from app.db import getconn
+from app.refdata import refdata
+
+logger = logging.getLogger(__name__)
 
 # Routes will go here e.g. @bp.route('/gyms')
 bp = Blueprint('gym', __name__, url_prefix='/gym')
@@ -8,41 +11,16 @@ bp = Blueprint('gym', __name__, url_prefix='/gym')
 # Create the endpoint at url_prefix='/gyms'
 @bp.route('/', methods=['GET'])
 def select_gym_leader():
-    conn = None
-    try:  
-        # Get the database connection
-        conn = getconn()
-        print('Connection open.')
-    
-        # Create a cursor to execute queries and return in a dict format
-        cursor = conn.cursor()
-    
-        query = "SELECT * FROM gym_leaders ORDER BY gym_id;"
-        # Select query
-        print('Fetching data...')
-        cursor.execute(query)
-        print('Data successfully fetched.')
-    
-        # Fetch the results
-        results = cursor.fetchall()
-    
-        # Print results (for debugging)
-        for i in results:
-            print(i)
-    
-        # Close the cursor and return the data as JSON
-        cursor.close()
+    try:
+        # Gym leaders come from the reference data cache (ordered by gym_id)
+        results = refdata.gym_leaders()
+        logger.debug("Loaded gym leaders", extra={'count': len(results)})
+
         #return jsonify(results)
 
         # Rendering results in viewer
         return render_template('gym.html', leaders=results)
 
     except Exception as e:
-        print(f"There was an error fetching data: {e}")
-        return jsonify({"error": str(e)}), 500
-  
-    finally: 
-        # Close the connection
-        if conn is not None:
-            conn.close()
-            print('Connection closed.')
\ No newline at end of file
+        logger.exception("Could not load gym leaders")
+        return jsonify({"error": str(e)}), 500
\ No newline at end of file
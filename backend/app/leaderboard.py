@@ -0,0 +1,403 @@
+"""
+Global leaderboard.
+
+Rankings are kept in sorted lists (sortedcontainers.SortedList) in each
+worker, built from the user_stats and user_gym_clears rollups instead of
+GROUP BYs over battles:
+    win_rate - highest share of battles won (ties: more wins)
+    badges   - most distinct gyms beaten (ties: more wins)
+    fastest  - quickest win against one gym, one board per gym
+A finished battle updates its player's entries in place. Top-k and
+"my rank" are O(log n) lookups. A background thread in each worker builds
+the lists once at startup, then every LEADERBOARD_REFRESH_INTERVAL
+seconds reads only the rollup rows changed since its last read (by their
+updated_at), so battles finished by other workers show up. A full
+rebuild runs again after a failed read and every
+LEADERBOARD_REBUILD_INTERVAL seconds, to recover from anything the
+polling missed (e.g. rows deleted by rebuild-user-stats). Requests never
+wait for either.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from flask import jsonify, render_template, Blueprint, request, session, redirect, url_for
+from sortedcontainers import SortedList
+
+from app.db import getconn
+from app.refdata import refdata
+
+logger = logging.getLogger(__name__)
+
+refresh_interval = float(os.environ.get("LEADERBOARD_REFRESH_INTERVAL", "10"))
+rebuild_interval = float(os.environ.get("LEADERBOARD_REBUILD_INTERVAL", "3600"))
+
+# Each poll reaches this far back before the previous one, to catch rows
+# whose transaction committed after that poll read them
+POLL_OVERLAP = timedelta(seconds=5)
+
+BOARDS = ('win_rate', 'badges', 'fastest')
+# Most entries returned by one top-k query
+MAX_TOP = 100
+
+bp = Blueprint('leaderboard', __name__, url_prefix='/leaderboard', template_folder='templates')
+
+
+def _win_rate_key(entry):
+    battles = entry['wins'] + entry['losses']
+    win_rate = entry['wins'] / battles if battles else 0.0
+    return (-win_rate, -entry['wins'], entry['user_id'])
+
+
+def _badges_key(entry):
+    return (-entry['gyms_beaten'], -entry['wins'], entry['user_id'])
+
+
+class Leaderboard:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+        self.loaded_at = None
+        # Updates made while a reload is reading the rollups, replayed onto
+        # the new lists before they are swapped in; None when not reloading
+        self._replay = None
+
+    def _clear(self):
+        # user_id -> {user_id, user_name, wins, losses, gyms_beaten}
+        self._users = {}
+        self._win_rate = SortedList()
+        self._badges = SortedList()
+        # user_id -> (win_rate key, badges key) currently in the lists
+        self._user_keys = {}
+        # gym_id -> SortedList of (best_clear_seconds, user_id)
+        self._fastest = {}
+        # (gym_id, user_id) -> key currently in that gym's list
+        self._clear_keys = {}
+
+    # ---- updates ----
+
+    def _set_user(self, entry):
+        # Caller must hold the lock
+        user_id = entry['user_id']
+        old_keys = self._user_keys.get(user_id)
+        if old_keys is not None:
+            self._win_rate.remove(old_keys[0])
+            self._badges.remove(old_keys[1])
+
+        self._users[user_id] = entry
+        if entry['wins'] + entry['losses'] == 0:
+            self._user_keys.pop(user_id, None)
+            return
+        keys = (_win_rate_key(entry), _badges_key(entry))
+        self._win_rate.add(keys[0])
+        self._badges.add(keys[1])
+        self._user_keys[user_id] = keys
+
+    def _set_clear(self, user_id, gym_id, seconds):
+        # Caller must hold the lock
+        board = self._fastest.setdefault(gym_id, SortedList())
+        old_key = self._clear_keys.get((gym_id, user_id))
+        if old_key is not None:
+            board.remove(old_key)
+        key = (seconds, user_id)
+        board.add(key)
+        self._clear_keys[(gym_id, user_id)] = key
+
+    def _apply(self, entries, clears):
+        # Caller must hold the lock
+        for entry in entries:
+            self._set_user(entry)
+        for clear in clears:
+            self._set_clear(clear['user_id'], clear['gym_id'], clear['best_clear_seconds'])
+
+    def apply(self, entries, clears):
+        """
+        Put changed rollup rows (as read by load_rollups) into the rankings.
+        """
+        with self._lock:
+            self._apply(entries, clears)
+            if self._replay is not None:
+                self._replay.append((entries, clears))
+
+    def update(self, entry, gym_id=None, best_clear_seconds=None):
+        """
+        Put one player's latest rollup (and, after a win, their best time
+            against gym_id) into the rankings.
+        """
+        clears = []
+        if gym_id is not None and best_clear_seconds is not None:
+            clears.append({'user_id': entry['user_id'], 'gym_id': gym_id,
+                           'best_clear_seconds': best_clear_seconds})
+        self.apply([entry], clears)
+
+    def begin_load(self):
+        """
+        Call before reading the rows for load(), so updates made meanwhile
+            aren't undone by the swap.
+        """
+        with self._lock:
+            self._replay = []
+
+    def load(self, entries, clears):
+        """
+        Replace every ranking with the given rollup rows. The new lists are
+            built aside and swapped in, so lookups don't wait for the build.
+        """
+        staged = Leaderboard()
+        staged._apply(entries, clears)
+
+        with self._lock:
+            for replayed in self._replay or ():
+                staged._apply(*replayed)
+            self._replay = None
+            self._users, self._user_keys = staged._users, staged._user_keys
+            self._win_rate, self._badges = staged._win_rate, staged._badges
+            self._fastest, self._clear_keys = staged._fastest, staged._clear_keys
+            self.loaded_at = time.monotonic()
+
+    # ---- queries ----
+
+    def _board(self, board, gym_id=None):
+        if board == 'win_rate':
+            return self._win_rate
+        if board == 'badges':
+            return self._badges
+        if board == 'fastest':
+            return self._fastest.get(gym_id, SortedList())
+        raise ValueError(f"Unknown leaderboard '{board}'")
+
+    def _row(self, board, key, rank):
+        user_id = key[-1]
+        entry = self._users.get(user_id, {})
+        wins = entry.get('wins', 0)
+        battles = wins + entry.get('losses', 0)
+        row = {
+            'rank': rank,
+            'user_id': user_id,
+            'user_name': entry.get('user_name'),
+            'wins': wins,
+            'battles': battles,
+            'win_percentage': round(wins * 100 / battles, 2) if battles else None,
+            'gyms_beaten': entry.get('gyms_beaten', 0),
+        }
+        if board == 'fastest':
+            row['best_clear_seconds'] = key[0]
+        return row
+
+    def top(self, board, k=10, gym_id=None):
+        with self._lock:
+            ranking = self._board(board, gym_id)
+            return [self._row(board, key, rank) for rank, key in enumerate(ranking[:k], start=1)]
+
+    def rank(self, board, user_id, gym_id=None):
+        """
+        A player's row on a board, or None if they aren't ranked on it.
+        """
+        with self._lock:
+            ranking = self._board(board, gym_id)
+            if board == 'fastest':
+                key = self._clear_keys.get((gym_id, user_id))
+            else:
+                keys = self._user_keys.get(user_id)
+                key = keys[BOARDS.index(board)] if keys else None
+            if key is None:
+                return None
+            return self._row(board, key, ranking.index(key) + 1)
+
+    def size(self, board, gym_id=None):
+        with self._lock:
+            return len(self._board(board, gym_id))
+
+
+def load_rollups(cursor, since=None):
+    """
+    Every player's rollup row and every best clear time, or with since,
+        only the rows changed from then on (an index range on updated_at).
+    """
+    changed = "WHERE S.updated_at >= %s" if since is not None else ""
+    params = (since,) if since is not None else ()
+    cursor.execute(f"""
+        SELECT S.user_id, U.user_name, S.wins, S.losses, S.gyms_beaten
+        FROM user_stats S JOIN users U ON U.user_id = S.user_id
+        {changed};
+    """, params)
+    entries = cursor.fetchall()
+    changed = "AND updated_at >= %s" if since is not None else ""
+    cursor.execute(f"""
+        SELECT user_id, gym_id, best_clear_seconds
+        FROM user_gym_clears
+        WHERE best_clear_seconds IS NOT NULL {changed};
+    """, params)
+    clears = cursor.fetchall()
+    return entries, clears
+
+
+def _db_now(cursor):
+    # The database's clock, which is the one updated_at is set by
+    cursor.execute("SELECT NOW(3) AS now;")
+    return cursor.fetchone()['now']
+
+
+def read_player_entry(cursor, user_id, gym_id):
+    """
+    One player's rollup row and best time against gym_id (primary key
+        lookups). Read it in the transaction that records a battle and pass
+        it to Leaderboard.update() once that has committed.
+    """
+    cursor.execute("""
+        SELECT S.user_id, U.user_name, S.wins, S.losses, S.gyms_beaten
+        FROM user_stats S JOIN users U ON U.user_id = S.user_id
+        WHERE S.user_id = %s;
+    """, (user_id,))
+    entry = cursor.fetchone()
+    cursor.execute("""
+        SELECT best_clear_seconds
+        FROM user_gym_clears
+        WHERE user_id = %s AND gym_id = %s;
+    """, (user_id, gym_id))
+    clear = cursor.fetchone()
+    return entry, clear['best_clear_seconds'] if clear else None
+
+
+_leaderboard = Leaderboard()
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def rebuild_leaderboard():
+    """
+    Rebuild this worker's rankings from the rollup tables. Returns the
+        database time the rows were read at, for poll_leaderboard.
+    """
+    _leaderboard.begin_load()
+    conn = getconn()
+    try:
+        with conn.cursor() as cursor:
+            read_at = _db_now(cursor)
+            entries, clears = load_rollups(cursor)
+    finally:
+        conn.close()
+    _leaderboard.load(entries, clears)
+    return read_at
+
+
+def poll_leaderboard(since):
+    """
+    Put the rollup rows changed since the last read into this worker's
+        rankings. Returns the time to poll from next.
+    """
+    conn = getconn()
+    try:
+        with conn.cursor() as cursor:
+            read_at = _db_now(cursor)
+            entries, clears = load_rollups(cursor, since=since - POLL_OVERLAP)
+    finally:
+        conn.close()
+    _leaderboard.apply(entries, clears)
+    return read_at
+
+
+def start_background_refresh(interval=None):
+    """
+    Build this worker's rankings now, then poll for changed rollup rows
+        every LEADERBOARD_REFRESH_INTERVAL seconds, on a background thread.
+    """
+    global _refresher
+    interval = refresh_interval if interval is None else interval
+    with _refresher_lock:
+        if _refresher is not None:
+            return
+
+        def refresh_forever():
+            read_at = None
+            rebuilt_at = None
+            while True:
+                try:
+                    if read_at is None or time.monotonic() - rebuilt_at >= rebuild_interval:
+                        read_at = rebuild_leaderboard()
+                        rebuilt_at = time.monotonic()
+                    else:
+                        read_at = poll_leaderboard(read_at)
+                except Exception as e:
+                    logger.warning(f"Could not refresh the leaderboard: {e}")
+                    # Start over from a full rebuild
+                    read_at = None
+                time.sleep(interval)
+
+        _refresher = threading.Thread(target=refresh_forever, name='leaderboard-refresh', daemon=True)
+        _refresher.start()
+
+
+def get_leaderboard():
+    """
+    This worker's leaderboard. The first call starts the background
+        refresh if create_app hasn't; it never waits for it.
+    """
+    if _refresher is None:
+        start_background_refresh()
+    return _leaderboard
+
+
+def _board_args():
+    board = request.args.get('board', 'win_rate')
+    gym_id = request.args.get('gym_id', type=int)
+    if board not in BOARDS:
+        raise ValueError(f"board must be one of {', '.join(BOARDS)}")
+    if board == 'fastest' and gym_id is None:
+        raise ValueError("gym_id is required for the fastest board")
+    return board, gym_id
+
+
+@bp.route('/')
+def show_leaderboard():
+    user_id = session.get('user_id')
+    if not user_id:
+        return redirect(url_for('auth.login'))
+
+    leaderboard = get_leaderboard()
+    gyms = []
+    for gym in refdata.gym_leaders():
+        gyms.append({
+            'gym': gym,
+            'top': leaderboard.top('fastest', 5, gym_id=gym['gym_id']),
+            'mine': leaderboard.rank('fastest', user_id, gym_id=gym['gym_id']),
+        })
+
+    return render_template('leaderboard.html',
+                           win_rate=leaderboard.top('win_rate', 10),
+                           badges=leaderboard.top('badges', 10),
+                           my_win_rate=leaderboard.rank('win_rate', user_id),
+                           my_badges=leaderboard.rank('badges', user_id),
+                           gyms=gyms)
+
+
+# e.g. /leaderboard/api/top?board=fastest&gym_id=3&k=10
+@bp.route('/api/top', methods=['GET'])
+def top_players():
+    try:
+        board, gym_id = _board_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    k = min(max(request.args.get('k', 10, type=int), 1), MAX_TOP)
+    return jsonify(get_leaderboard().top(board, k, gym_id=gym_id))
+
+
+# e.g. /leaderboard/api/rank?board=badges
+@bp.route('/api/rank', methods=['GET'])
+def my_rank():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+    try:
+        board, gym_id = _board_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    leaderboard = get_leaderboard()
+    return jsonify({
+        'ranked': leaderboard.size(board, gym_id=gym_id),
+        'entry': leaderboard.rank(board, user_id, gym_id=gym_id),
+    })
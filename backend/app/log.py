@@ -0,0 +1,170 @@
+"""
+Structured, non-blocking logging.
+
+Modules log through logging.getLogger(__name__) (everything under the
+"app" logger). Records are put on a queue by the request thread and
+written as one JSON object per line by a background listener thread, so
+a request never waits on stdout. Every record logged while handling a
+request carries its request id (taken from an incoming X-Request-ID
+header or generated, and echoed back in the response), method, path and
+endpoint.
+
+DEBUG output is sampled per request: LOG_DEBUG_SAMPLE_RATE of requests
+keep all their debug lines, the rest drop them, so debug logging can stay
+on under load. LOG_LEVEL sets the lowest level written at all.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+
+log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
+debug_sample_rate = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+# "json" (default) or "text" for a human-readable line per record
+log_format = os.environ.get("LOG_FORMAT", "json")
+
+# LogRecord attributes that aren't user supplied extra= fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, message, the request
+        context, anything passed with extra=, and the traceback if any.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))
+                  + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} " \
+               f"[{getattr(record, 'request_id', '-')}] {record.getMessage()}"
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds the current request's id, method, path and endpoint to a record,
+        and drops DEBUG records of requests that weren't sampled. Runs in
+        the thread that logged the record, where the request is visible.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            if record.levelno <= logging.DEBUG and not g.get('log_debug', False):
+                return False
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+        elif record.levelno <= logging.DEBUG and random.random() >= debug_sample_rate:
+            return False
+        return True
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    QueueHandler whose listener thread is started (again) on first use in
+        each process, so it keeps working in forked WSGI workers.
+    """
+
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self._handlers = handlers
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._start_lock:
+            if self._listener_pid == pid:
+                return
+            self._listener = QueueListener(self.queue, *self._handlers, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = pid
+
+    def prepare(self, record):
+        # Render the traceback here; the listener can't see the frames
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        super().enqueue(record)
+
+    def stop(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+
+
+_handler = None
+
+
+def init_logging(app):
+    """
+    Route the app's loggers through the queue and add request ids.
+    """
+    global _handler
+    if _handler is None:
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+        _handler = BackgroundQueueHandler([output])
+        _handler.addFilter(RequestContextFilter())
+        atexit.register(_handler.stop)
+
+    # app.logger is the "app" logger, the parent of every module's logger
+    logger = app.logger
+    logger.removeHandler(default_handler)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+    logger.setLevel(log_level)
+    logger.propagate = False
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16])[:64]
+        g.log_debug = random.random() < debug_sample_rate
+
+    @app.after_request
+    def echo_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
@@ -1,5 +1,7 @@
 from flask import jsonify, render_template, Blueprint, request, session, redirect, url_for
 from app.db import getconn
+from app.refdata import refdata
+from app.stats import get_user_stats
 
 # Routes will go here e.g. @bp.route('/')
 bp = Blueprint('home', __name__, url_prefix='/', template_folder='templates')
@@ -53,70 +55,21 @@ def load_profile():
     badge_level = "unknown for now"
     # Get the number of badges earned
     badges_earned = "unknown for now"
-    # Stored procedure determine win_loss_rate
+    # Percentage of battles won
     win_loss_rate = "unknown for now"
-    # Stored procedure determines average_battle_time
+    # Average battle time in minutes
     avg_battle_time = "unknown for now"
     try:
         # Open "context manager" for sql_cursor (auto-ends)
         with db_conn.cursor() as sql_cursor:
-        
-            # Set isolation level - we do not want write-write conflicts
-            # There should only be unique usernames
-            sql_cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
-
-
-            # Get the user's badge level
-            get_badge_level = """
-                SELECT badge_level
-                FROM users 
-                WHERE user_name LIKE %s;
-            """ 
-            sql_cursor.execute(get_badge_level, (f"%{username}%", ))
-            badge_level_result = sql_cursor.fetchone()
-            badge_level = badge_level_result['badge_level']
-
-
-            # Get the number of badges earned by a user -- JOIN
-            get_num_badges = """
-                SELECT COUNT(DISTINCT B.gym_id) AS badge_nums
-                FROM user_teams UT NATURAL JOIN battles B
-                WHERE UT.user_id = %s AND B.win_loss_outcome = 1
-            """
-            sql_cursor.execute(get_num_badges, (user_id, ))
-            num_badges_result = sql_cursor.fetchone()
-            badges_earned = num_badges_result['badge_nums']
-
-
-            # Get the percentage win/loss rate -- JOIN, GROUP BY
-            get_win_rate = """
-                SELECT ((COUNT(B2.battle_id) / total_battles.num_battles)*100) AS win_percentage
-                FROM (
-                    SELECT UT.user_id, COUNT(B.battle_id) AS num_battles
-                    FROM user_teams UT NATURAL JOIN battles B
-                    WHERE UT.user_id = %s
-                    GROUP BY UT.user_id
-                ) AS total_battles JOIN user_teams UT2 ON UT2.user_id = total_battles.user_id 
-                JOIN battles B2 ON B2.user_team_id = UT2.user_team_id
-                WHERE total_battles.user_id = %s AND B2.win_loss_outcome = 1 
-                
-            """
-            sql_cursor.execute(get_win_rate, (user_id, user_id))
-            win_rate_result = sql_cursor.fetchone()
-            win_loss_rate = win_rate_result['win_percentage']
-            print(f"win loss rate is = {win_rate_result}")
-
-
-            # Get the average battle time
-            get_avg_battle_time = """
-                SELECT AVG(TIMESTAMPDIFF(MINUTE, B.start_time, B.end_time)) AS avg_time
-                FROM user_teams UT NATURAL JOIN battles B
-                WHERE UT.user_id = %s
-            """
-            sql_cursor.execute(get_avg_battle_time, (user_id, ))
-            avg_battle_time_result = sql_cursor.fetchone()
-            avg_battle_time = avg_battle_time_result['avg_time']
-            print(f"Avg battle time result is = {avg_battle_time_result}")
+            # Everything comes from the user_stats rollup, which is updated
+            # whenever a battle ends -- one primary key lookup
+            stats = get_user_stats(sql_cursor, user_id)
+            if stats:
+                badge_level = stats['badge_level']
+                badges_earned = stats['gyms_beaten']
+                win_loss_rate = stats['win_percentage']
+                avg_battle_time = stats['avg_battle_minutes']
 
     # Close connection to GCP
     finally:
@@ -170,7 +123,15 @@ def load_teams():
     finally:
             db_conn.close()
 
-    # Organize pokemons by team_id for easy access in template
+    teams_data = group_team_pokemon(team_pokemons)
+    return render_template('teams_home.html', teams=teams_data)
+
+
+def group_team_pokemon(team_pokemons):
+    """
+    Organize (team, pokemon) rows by team_id for easy access in the
+        template, keeping the order teams first appear in.
+    """
     teams_map = {}
     for row in team_pokemons:
         team_id = row['user_team_id']
@@ -185,8 +146,7 @@ def load_teams():
             }
         teams_map[team_id]['pokemons'].append(pokemon_name)
 
-    teams_data = list(teams_map.values())
-    return render_template('teams_home.html', teams=teams_data)
+    return list(teams_map.values())
 
 
 
@@ -220,14 +180,8 @@ def load_battle():
             sql_cursor.execute(get_user_teams, (f"%{username}%",))
             user_teams = sql_cursor.fetchall()
 
-            # Get gym_leaders
-            get_gym_leaders = """
-                SELECT gym_id, gym_leader
-                FROM gym_leaders
-                ORDER BY gym_leader
-            """
-            sql_cursor.execute(get_gym_leaders)
-            gym_leaders = sql_cursor.fetchall()
+            # Get gym_leaders (from the reference data cache)
+            gym_leaders = sorted(refdata.gym_leaders(), key=lambda gym: gym['gym_leader'])
 
             # If the user submitted the form, store their selections (optional)
             if request.method == 'POST':
@@ -269,14 +223,8 @@ def load_badges():
     try:
         with db_conn.cursor() as sql_cursor:
 
-            # Get all badges for gyms
-            get_badge_name = """
-                SELECT badge_title
-                FROM gym_leaders
-            """
-            sql_cursor.execute(get_badge_name)
-            gym_badges_dict = sql_cursor.fetchall()
-            for pair in gym_badges_dict:
+            # Get all badges for gyms (from the reference data cache)
+            for pair in refdata.gym_leaders():
                 badge_title = pair['badge_title']
                 all_gym_badges.append({
                     "name": badge_title,
@@ -284,21 +232,20 @@ def load_badges():
                     "image_filename": "badge.png"  
                 })
 
-            # Get a user's earned badges
+            # Get the gyms a user has beaten from the user_gym_clears rollup
+            # (one row per gym, see sql/user_stats.sql), then their badge titles
             get_earned_badges = """
-                SELECT DISTINCT GL.badge_title
-                FROM (
-                    SELECT gym_id, B.win_loss_outcome
-                    FROM user_teams UT NATURAL JOIN battles B
-                    WHERE B.win_loss_outcome = 1 AND UT.user_id = %s
-                    GROUP BY gym_id
-                ) AS gyms_won JOIN gym_leaders GL 
-                ON gyms_won.gym_id = GL.gym_id
+                SELECT gym_id
+                FROM user_gym_clears
+                WHERE user_id = %s
+                ORDER BY gym_id
             """
             sql_cursor.execute(get_earned_badges, (user_id,))
             earned_badges_dict = sql_cursor.fetchall()
             for pair in earned_badges_dict:
-                earned_badges.append(pair['badge_title']) 
+                gym = refdata.gym_leader(pair['gym_id'])
+                if gym:
+                    earned_badges.append(gym['badge_title'])
 
     finally:
         db_conn.close()
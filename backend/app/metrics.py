@@ -0,0 +1,346 @@
+"""
+Prometheus-style metrics at /metrics.
+
+Request counts, latency histograms and error counts are recorded per
+blueprint and endpoint by in-process counters (a dict and a lock per
+metric, no external client library). Pool utilization, reference data
+cache hit ratios and active battles are read when /metrics is scraped.
+
+Multi-process WSGI servers: set METRICS_DIR to a directory shared by the
+workers. Each worker then writes a snapshot of its counters there every
+METRICS_FLUSH_INTERVAL seconds (and on exit), and /metrics adds up the
+snapshots of every worker, so it doesn't matter which worker answers the
+scrape. Point-in-time values (pool, battles, cache) are reported per
+worker with a pid label.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, g, request
+
+logger = logging.getLogger(__name__)
+
+
+metrics_dir = os.environ.get("METRICS_DIR", "")
+flush_interval = float(os.environ.get("METRICS_FLUSH_INTERVAL", "10"))
+
+PREFIX = 'pokemon_'
+# Request latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+bp = Blueprint('metrics', __name__)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(total, samples):
+        for labels, value in samples:
+            key = tuple(labels)
+            total[key] = total.get(key, 0) + value
+
+    def render(self, merged):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(merged.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(counts), total, count]
+                    for labels, (counts, total, count) in self._values.items()]
+
+    @staticmethod
+    def merge(total, samples):
+        for labels, counts, value_sum, count in samples:
+            key = tuple(labels)
+            entry = total.get(key)
+            if entry is None:
+                total[key] = [list(counts), value_sum, count]
+            else:
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += value_sum
+                entry[2] += count
+
+    def render(self, merged):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, (counts, value_sum, count) in sorted(merged.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = (('le', _number(bound)),)
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {repr(float(value_sum))}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+REQUEST_LABELS = ('blueprint', 'endpoint', 'method', 'status')
+
+requests_total = Counter('http_requests_total', "HTTP requests handled.", REQUEST_LABELS)
+request_errors_total = Counter('http_request_errors_total', "HTTP requests that ended in a 5xx response.",
+                               REQUEST_LABELS)
+request_latency = Histogram('http_request_duration_seconds', "Time spent handling HTTP requests.",
+                            ('blueprint', 'endpoint', 'method'))
+
+# Every metric merged across workers
+METRICS = [requests_total, request_errors_total, request_latency]
+
+
+# ---- multi-process snapshots ----
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _snapshot_path(pid):
+    return os.path.join(metrics_dir, f'metrics-{pid}.json')
+
+
+def _gauges():
+    """
+    Point-in-time values for this worker, as (name, help, value).
+    """
+    # Imported here so the metrics module stays importable on its own
+    from app import ai_speculation, battle_events, db
+    from app.refdata import refdata
+    from app.battle_store import get_battle_store
+
+    gauges = []
+
+    # Only report the pool if this worker has one; don't open one to scrape
+    pool = db._pool if db._pool_pid == os.getpid() else None
+    if pool is not None:
+        stats = pool.stats()
+        for key in ('size', 'idle', 'in_use', 'max_size'):
+            gauges.append((f'db_pool_{key}', f"Database pool connections ({key}).", stats[key]))
+        for key in ('checkouts', 'waits', 'timeouts', 'failed_health_checks'):
+            gauges.append((f'db_pool_{key}_total', f"Database pool {key.replace('_', ' ')} so far.", stats[key]))
+
+    cache = refdata.stats()
+    gauges.append(('refdata_found_total', "Reference data lookups that found a row.", cache['found']))
+    gauges.append(('refdata_not_found_total', "Reference data lookups for ids that don't exist.",
+                   cache['not_found']))
+    gauges.append(('refdata_unchanged_checks_total', "Reference data checks that kept the current snapshot.",
+                   cache['unchanged_checks']))
+    gauges.append(('refdata_reloads_total', "Reference data snapshots loaded.", cache['reloads']))
+    gauges.append(('refdata_failed_refreshes_total', "Reference data checks that failed.",
+                   cache['failed_refreshes']))
+
+    battles = get_battle_store().stats()
+    gauges.append(('active_battles', "Battles held in the battle store.", battles['active_battles']))
+    for key in ('hits', 'misses', 'evictions'):
+        if key in battles:
+            gauges.append((f'battle_store_{key}_total', f"Battle store {key}.", battles[key]))
+
+    events = battle_events._events
+    if events is not None:
+        channels = events.stats()
+        gauges.append(('battle_event_streams', "Open battle event streams.", channels['streams']))
+        gauges.append(('battle_events_published_total', "Battle events pushed to open streams.",
+                       channels['published']))
+
+    speculator = ai_speculation._speculator
+    if speculator is not None:
+        replies = speculator.stats()
+        gauges.append(('ai_speculation_battles', "Battles with gym AI replies searched ahead.", replies['battles']))
+        for key in ('hits', 'waits', 'misses'):
+            gauges.append((f'ai_speculation_{key}_total', f"Gym AI turns with a reply searched ahead ({key}).",
+                           replies[key]))
+    return gauges
+
+
+def _safe_gauges():
+    try:
+        return _gauges()
+    except Exception as e:
+        logger.exception("Could not collect gauge metrics")
+        return []
+
+
+def _snapshot():
+    return {
+        'pid': os.getpid(),
+        'written_at': time.time(),
+        'metrics': {metric.name: metric.snapshot() for metric in METRICS},
+        'gauges': [[name, documentation, value] for name, documentation, value in _safe_gauges()],
+    }
+
+
+def write_snapshot():
+    """
+    Write this worker's counters to METRICS_DIR (atomically).
+    """
+    if not metrics_dir:
+        return
+    path = _snapshot_path(os.getpid())
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+        json.dump(_snapshot(), snapshot_file)
+    os.replace(tmp_path, path)
+
+
+def _start_flusher():
+    global _flusher_pid
+    pid = os.getpid()
+    if not metrics_dir or _flusher_pid == pid:
+        return
+    with _flusher_lock:
+        if _flusher_pid == pid:
+            return
+        os.makedirs(metrics_dir, exist_ok=True)
+
+        def flush_forever():
+            while True:
+                time.sleep(flush_interval)
+                try:
+                    write_snapshot()
+                except Exception as e:
+                    logger.exception("Could not write metrics snapshot")
+
+        threading.Thread(target=flush_forever, name='metrics-flush', daemon=True).start()
+        atexit.register(write_snapshot)
+        _flusher_pid = pid
+
+
+def _other_workers():
+    # Snapshots written by every other worker in METRICS_DIR
+    if not metrics_dir or not os.path.isdir(metrics_dir):
+        return []
+    snapshots = []
+    own = os.path.basename(_snapshot_path(os.getpid()))
+    for filename in os.listdir(metrics_dir):
+        if filename == own or not filename.startswith('metrics-') or not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, filename), encoding='utf-8') as snapshot_file:
+                snapshots.append(json.load(snapshot_file))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def render_metrics():
+    """
+    The Prometheus text exposition of every worker's metrics.
+    """
+    current = _snapshot()
+    snapshots = [current] + _other_workers()
+
+    lines = []
+    for metric in METRICS:
+        merged = {}
+        for snapshot in snapshots:
+            metric.merge(merged, snapshot['metrics'].get(metric.name, []))
+        lines.extend(metric.render(merged))
+
+    # Point-in-time values of workers that are still writing snapshots
+    fresh_after = time.time() - 3 * flush_interval
+    gauges = {}
+    for snapshot in snapshots:
+        if snapshot is not current and snapshot['written_at'] < fresh_after:
+            continue
+        for name, documentation, value in snapshot['gauges']:
+            gauges.setdefault(name, [documentation, []])[1].append((snapshot['pid'], value))
+    for name, (documentation, values) in gauges.items():
+        kind = 'counter' if name.endswith('_total') else 'gauge'
+        lines.append(f'# HELP {PREFIX}{name} {documentation}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+        for pid, value in sorted(values):
+            lines.append(f'{PREFIX}{name}{{pid="{pid}"}} {_number(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+# ---- request instrumentation ----
+
+@bp.before_app_request
+def start_timer():
+    _start_flusher()
+    g.metrics_start = time.perf_counter()
+
+
+@bp.after_app_request
+def record_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None or request.endpoint == 'metrics.metrics':
+        return response
+
+    blueprint = request.blueprint or ''
+    # Unmatched URLs share one label instead of one per path
+    endpoint = request.endpoint or 'unmatched'
+    status = str(response.status_code)
+    request_latency.observe(time.perf_counter() - start, blueprint, endpoint, request.method)
+    requests_total.inc(blueprint, endpoint, request.method, status)
+    if response.status_code >= 500:
+        request_errors_total.inc(blueprint, endpoint, request.method, status)
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,121 @@
+"""
+In-memory search index over Pokemon names.
+
+Replaces LOWER(name) LIKE '%x%' scans with two structures built from the
+reference data snapshot:
+    - a prefix trie, for "starts with" matches
+    - an n-gram index (every 1-, 2- and 3-character substring), for
+      "contains" matches; longer queries intersect their 3-gram postings
+      and verify the few candidates left
+Results are ranked exact match > prefix match > substring match, then by
+where the match starts, name length and name.
+"""
+import threading
+
+from app.refdata import refdata
+
+
+MAX_GRAM = 3
+# Prefix matches kept per trie node, enough for any suggestion limit
+TRIE_NODE_LIMIT = 50
+
+
+class NameIndex:
+
+    def __init__(self, pokemon_rows):
+        self.rows = list(pokemon_rows)
+        self.names = [row['name'].lower() for row in self.rows]
+
+        # Rank prefix matches: shorter names first, then alphabetically
+        order = sorted(range(len(self.rows)), key=lambda i: (len(self.names[i]), self.names[i]))
+
+        self.trie = {}
+        for i in order:
+            node = self.trie
+            for char in self.names[i]:
+                node = node.setdefault(char, {})
+                matches = node.setdefault('', [])
+                if len(matches) < TRIE_NODE_LIMIT:
+                    matches.append(i)
+
+        self.grams = {}
+        for i, name in enumerate(self.names):
+            for size in range(1, MAX_GRAM + 1):
+                for start in range(len(name) - size + 1):
+                    self.grams.setdefault(name[start:start + size], set()).add(i)
+
+    def _prefix_matches(self, query):
+        node = self.trie
+        for char in query:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get('', [])
+
+    def _substring_matches(self, query):
+        if len(query) <= MAX_GRAM:
+            return self.grams.get(query, set())
+
+        postings = []
+        for start in range(len(query) - MAX_GRAM + 1):
+            posting = self.grams.get(query[start:start + MAX_GRAM])
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                break
+        return {i for i in candidates if query in self.names[i]}
+
+    def search(self, query, limit=10):
+        """
+        Up to limit Pokemon rows whose name contains query (case-insensitive),
+            best matches first.
+        """
+        query = (query or '').strip().lower()
+        if not query or limit <= 0:
+            return []
+
+        results = []
+        seen = set()
+        for i in self._prefix_matches(query):
+            results.append(i)
+            seen.add(i)
+            if len(results) >= limit:
+                break
+
+        if len(results) < limit:
+            rest = [i for i in self._substring_matches(query) if i not in seen]
+            rest.sort(key=lambda i: (self.names[i].find(query), len(self.names[i]), self.names[i]))
+            results.extend(rest[:limit - len(results)])
+
+        return [self.rows[i] for i in results]
+
+    def best_match(self, query):
+        """
+        The single best match for query, or None.
+        """
+        matches = self.search(query, limit=1)
+        return matches[0] if matches else None
+
+
+_index = None
+_index_snapshot = None
+_index_lock = threading.Lock()
+
+
+def get_name_index():
+    """
+    The name index for the current reference data snapshot.
+    """
+    global _index, _index_snapshot
+    snapshot = refdata.snapshot()
+    if _index_snapshot is not snapshot:
+        with _index_lock:
+            if _index_snapshot is not snapshot:
+                _index = NameIndex(snapshot.pokemon)
+                _index_snapshot = snapshot
+    return _index
@@ -1,48 +1,108 @@
-from flask import jsonify, render_template, Blueprint, request
+import os
+from flask import jsonify, render_template, stream_template, Blueprint, request
+from pymysql.cursors import SSDictCursor
 from app.db import getconn
+from app.name_index import get_name_index
 
 bp = Blueprint('pokedex', __name__, url_prefix='/pokedex', template_folder='templates')
 
-# Route for displaying ALL Pokémon
+# Most suggestions returned by /pokedex/api/suggest
+MAX_SUGGESTIONS = 50
+
+# Pokedex listing page size (?limit= may ask for up to MAX_PAGE_SIZE)
+PAGE_SIZE = int(os.environ.get("POKEDEX_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 500
+# Rows pulled from the server-side cursor at a time when streaming
+STREAM_BATCH_SIZE = 100
+
+# Only the columns pokedex.html shows
+LISTING_COLUMNS = "pokedex_id, name, pType_1, pType_2, hp, attack, defense"
+
+
+def _stream_pokemon(after_id):
+    """
+    Yield every Pokemon after after_id in pokedex_id order, reading the
+        table through an unbuffered cursor in small batches so only one
+        batch is held in memory at a time.
+    """
+    conn = getconn()
+    try:
+        with conn.cursor(SSDictCursor) as cursor:
+            cursor.execute(f"""
+                SELECT {LISTING_COLUMNS}
+                FROM pokedex_entries
+                WHERE pokedex_id > %s
+                ORDER BY pokedex_id;
+            """, (after_id,))
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield from rows
+    finally:
+        conn.close()
+
+
+# Route for displaying ALL Pokémon, one page at a time:
+#   /pokedex?after=<last pokedex_id seen>&limit=<page size>
+#   /pokedex?stream=1 renders the whole dex, sending rows as they are read
 @bp.route('/', methods=['GET'])
 def get_all_pokemon():
-    conn = None
+    after_id = max(request.args.get('after', 0, type=int), 0)
+
+    if request.args.get('stream', type=int):
+        return stream_template('pokedex.html', entries=_stream_pokemon(after_id), streaming=True)
+
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    conn = getconn()
     try:
-        conn = getconn()
-        cursor = conn.cursor()
+        with conn.cursor() as cursor:
+            # Keyset pagination: seek past the last id instead of OFFSET,
+            # one extra row tells us whether there is a next page
+            cursor.execute(f"""
+                SELECT {LISTING_COLUMNS}
+                FROM pokedex_entries
+                WHERE pokedex_id > %s
+                ORDER BY pokedex_id
+                LIMIT %s;
+            """, (after_id, limit + 1))
+            entries = cursor.fetchall()
 
-        get_all_pokemon = "SELECT * FROM pokedex_entries ORDER BY pokedex_id;"
-        cursor.execute(get_all_pokemon)
-        all_pokemon = cursor.fetchall()
-        cursor.close()
+        next_after = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_after = entries[-1]['pokedex_id']
 
-        return render_template('pokedex.html', entries=all_pokemon)
+        return render_template('pokedex.html', entries=entries, limit=limit,
+                               after=after_id, next_after=next_after)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
     finally:
-        if conn is not None:
-            conn.close()
+        conn.close()
 
 # Route for displaying a Pokémon by NAME
 @bp.route('/search/<string:name>', methods=['GET'])
 def get_pokemon_by_name(name):
-    conn = None
     try:
-        conn = getconn()
-        cursor = conn.cursor()
-
-        get_pokemon_name = "SELECT * FROM pokedex_entries WHERE LOWER(name) LIKE LOWER(%s);"
-        cursor.execute(get_pokemon_name, (f"%{name}%",))
-        pokemon_name = cursor.fetchone()
-        cursor.close()
+        # Best match from the in-memory name index (no LIKE '%name%' scan)
+        pokemon_name = get_name_index().best_match(name)
 
         return render_template('pokedex.html', pokemon=pokemon_name)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        if conn is not None:
-            conn.close()
\ No newline at end of file
+
+# Route for name suggestions while typing, e.g. /pokedex/api/suggest?q=char
+@bp.route('/api/suggest', methods=['GET'])
+def suggest_pokemon():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_SUGGESTIONS)
+
+    matches = get_name_index().search(query, limit=limit)
+    return jsonify([
+        {'pokedex_id': row['pokedex_id'], 'name': row['name']}
+        for row in matches
+    ])
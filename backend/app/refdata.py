@@ -0,0 +1,243 @@
+"""
+Process-wide cache of the reference tables.
+
+pokedex_entries, moves, pokemon_moves, type_matchups and gym_leaders
+hardly ever change, so they are loaded once into an immutable snapshot
+with typed lookups (by id, by name, learnset by pokedex_id). The cache is
+warmed at startup and a background thread swaps in a fresh snapshot when
+the tables' checksums change (checked every REFDATA_CHECK_INTERVAL
+seconds) or when the snapshot is older than REFDATA_TTL seconds.
+"""
+import logging
+import os
+import threading
+import time
+
+from app.db import getconn
+
+logger = logging.getLogger(__name__)
+
+
+check_interval = float(os.environ.get("REFDATA_CHECK_INTERVAL", "60"))
+max_age = float(os.environ.get("REFDATA_TTL", "3600"))
+
+REFERENCE_TABLES = ('pokedex_entries', 'moves', 'pokemon_moves', 'type_matchups', 'gym_leaders')
+
+
+class ReferenceSnapshot:
+    """
+    One consistent, read-only copy of the reference tables. Rows are the
+        same dicts the DictCursor returns, so templates can use them as is.
+    """
+
+    def __init__(self, pokemon_rows, move_rows, learnset_rows, matchup_rows, gym_rows, version=None):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        self.pokemon = sorted(pokemon_rows, key=lambda row: row['pokedex_id'])
+        self.pokemon_by_id = {row['pokedex_id']: row for row in self.pokemon}
+        self.pokemon_by_name = {row['name'].lower(): row for row in self.pokemon}
+
+        self.moves_by_id = {row['move_id']: row for row in move_rows}
+        self.moves_by_name = {row['move_name']: row for row in move_rows}
+
+        # pokedex_id -> move ids, ordered by move name like the old query
+        learnsets = {}
+        for row in learnset_rows:
+            learnsets.setdefault(row['pokedex_id'], []).append(row['move_id'])
+        for move_ids in learnsets.values():
+            move_ids.sort(key=lambda move_id: self.moves_by_id[move_id]['move_name'])
+        self.learnsets = learnsets
+
+        self.type_matchups = list(matchup_rows)
+
+        self.gym_leaders = sorted(gym_rows, key=lambda row: row['gym_id'])
+        self.gym_leaders_by_id = {row['gym_id']: row for row in self.gym_leaders}
+
+
+def _table_version(cursor):
+    cursor.execute(f"CHECKSUM TABLE {', '.join(REFERENCE_TABLES)};")
+    return tuple(row['Checksum'] for row in cursor.fetchall())
+
+
+def load_snapshot(cursor, version=None):
+    cursor.execute("SELECT * FROM pokedex_entries;")
+    pokemon_rows = cursor.fetchall()
+    cursor.execute("SELECT * FROM moves;")
+    move_rows = cursor.fetchall()
+    cursor.execute("SELECT pokedex_id, move_id FROM pokemon_moves;")
+    learnset_rows = cursor.fetchall()
+    cursor.execute("SELECT attacking_type, defending_type, multiplier FROM type_matchups;")
+    matchup_rows = cursor.fetchall()
+    cursor.execute("SELECT * FROM gym_leaders;")
+    gym_rows = cursor.fetchall()
+    return ReferenceSnapshot(pokemon_rows, move_rows, learnset_rows, matchup_rows, gym_rows,
+                             version=version)
+
+
+class ReferenceCache:
+
+    def __init__(self, loader=load_snapshot, version_check=_table_version):
+        self._loader = loader
+        self._version_check = version_check
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._refresher = None
+        self._stats_lock = threading.Lock()
+        # Every lookup is served from the snapshot: found/not_found count
+        # ids that exist or not, while unchanged_checks vs reloads shows
+        # how often the snapshot was kept or replaced
+        self._stats = {'found': 0, 'not_found': 0, 'unchanged_checks': 0, 'reloads': 0,
+                       'failed_refreshes': 0}
+
+    # ---- loading ----
+
+    def _reload(self, force=False):
+        conn = getconn()
+        try:
+            with conn.cursor() as cursor:
+                version = self._version_check(cursor)
+                current = self._snapshot
+                stale = current is None or time.monotonic() - current.loaded_at > max_age
+                if not force and not stale and current.version == version:
+                    with self._stats_lock:
+                        self._stats['unchanged_checks'] += 1
+                    return False
+                snapshot = self._loader(cursor, version=version)
+        finally:
+            conn.close()
+
+        self.install(snapshot)
+        return True
+
+    def install(self, snapshot):
+        """
+        Swap in a snapshot and tell the listeners. Offline tools (e.g. the
+            benchmarks) use it to run on reference data without a database.
+        """
+        self._snapshot = snapshot
+        with self._stats_lock:
+            self._stats['reloads'] += 1
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.exception("Reference data listener failed")
+
+    def warm(self):
+        """
+        Load the reference tables now (called from create_app).
+        """
+        with self._lock:
+            self._reload(force=True)
+
+    def refresh(self):
+        """
+        Reload the snapshot if the reference tables changed or it expired.
+        """
+        with self._lock:
+            return self._reload()
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._reload(force=True)
+                snapshot = self._snapshot
+        return snapshot
+
+    def on_reload(self, listener):
+        """
+        Call listener(snapshot) every time a new snapshot is swapped in.
+        """
+        self._listeners.append(listener)
+
+    def start_background_refresh(self, interval=None):
+        if self._refresher is not None:
+            return
+        interval = check_interval if interval is None else interval
+
+        def refresh_forever():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    with self._stats_lock:
+                        self._stats['failed_refreshes'] += 1
+                    logger.warning(f"Could not refresh reference data: {e}")
+
+        self._refresher = threading.Thread(target=refresh_forever, name='refdata-refresh', daemon=True)
+        self._refresher.start()
+
+    # ---- metrics ----
+
+    def _count(self, found):
+        with self._stats_lock:
+            self._stats['found' if found else 'not_found'] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    # ---- typed lookups ----
+
+    def pokemon(self, pokedex_id):
+        row = self.snapshot().pokemon_by_id.get(pokedex_id)
+        self._count(row is not None)
+        return row
+
+    def pokemon_by_name(self, name):
+        row = self.snapshot().pokemon_by_name.get((name or '').strip().lower())
+        self._count(row is not None)
+        return row
+
+    def all_pokemon(self):
+        self._count(True)
+        return self.snapshot().pokemon
+
+    def move(self, move_id):
+        row = self.snapshot().moves_by_id.get(move_id)
+        self._count(row is not None)
+        return row
+
+    def move_by_name(self, move_name):
+        row = self.snapshot().moves_by_name.get(move_name)
+        self._count(row is not None)
+        return row
+
+    def learnset(self, pokedex_id):
+        """
+        Every move a Pokemon can learn (full move rows, ordered by name).
+        """
+        snapshot = self.snapshot()
+        move_ids = snapshot.learnsets.get(pokedex_id)
+        self._count(move_ids is not None)
+        return [snapshot.moves_by_id[move_id] for move_id in move_ids or []]
+
+    def learnset_ids(self, pokedex_id):
+        """
+        Move ids a Pokemon can learn (ordered by move name).
+        """
+        move_ids = self.snapshot().learnsets.get(pokedex_id)
+        self._count(move_ids is not None)
+        return move_ids or []
+
+    def type_matchups(self):
+        self._count(True)
+        return self.snapshot().type_matchups
+
+    def gym_leaders(self):
+        self._count(True)
+        return self.snapshot().gym_leaders
+
+    def gym_leader(self, gym_id):
+        row = self.snapshot().gym_leaders_by_id.get(gym_id)
+        self._count(row is not None)
+        return row
+
+
+# The cache shared by every request in this process
+refdata = ReferenceCache()
@@ -0,0 +1,271 @@
+"""
+Headless battle simulator.
+
+Plays a user team against gym leaders thousands of times with the same
+rules as the battle page (app/battle_engine.py) and the same gym AI, to
+answer "what is this team's win rate against each gym" or to tune gym
+difficulty. Rosters are read once, with full HP and PP like a new battle;
+the battles themselves never touch the database and are spread over a
+process pool. Every battle gets its own RNG derived from the seed and its
+index, so results don't depend on the number of workers.
+
+    flask --app run simulate-battles --team-id 12 --battles 5000 --seed 1
+"""
+import dataclasses
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from app.battle_ai import choose_action, difficulty_for_gym
+from app.battle_engine import BattleState, choose_greedy_move, combatant_from_row, resolve_turn
+from app.refdata import refdata
+
+# Battles per task handed to a worker
+CHUNK_SIZE = 250
+
+USER_ROSTER = """
+    SELECT user_team_member_id AS member_id, pokedex_id, move_1_id, move_2_id, move_3_id, move_4_id
+    FROM user_poke_team_members
+    WHERE user_team_id = %s
+    ORDER BY user_team_member_id;
+"""
+
+GYM_ROSTER = """
+    SELECT gym_team_member_id AS member_id, pokedex_id, move_1_id, move_2_id, move_3_id, move_4_id
+    FROM gym_leader_team_members
+    WHERE gym_id = %s
+    ORDER BY gym_team_member_id;
+"""
+
+
+def _combatant(party, member):
+    """
+    A full-HP, full-PP combatant built from the reference data, the same
+        row start_battle copies into battle_combatants.
+    """
+    pokemon = refdata.pokemon(member['pokedex_id'])
+    if pokemon is None:
+        raise ValueError(f"Unknown pokedex_id {member['pokedex_id']}")
+    row = {
+        'party': party, 'member_id': member['member_id'], 'pokedex_id': member['pokedex_id'],
+        'name': pokemon['name'], 'image_url': pokemon['image_url'],
+        'pType_1': pokemon['pType_1'], 'pType_2': pokemon['pType_2'],
+        'attack': pokemon['attack'], 'defense': pokemon['defense'],
+        'max_hp': pokemon['hp'], 'current_hp': pokemon['hp'],
+    }
+    for i in range(1, 5):
+        move = refdata.move(member[f'move_{i}_id']) if member[f'move_{i}_id'] is not None else None
+        row.update({
+            f'move_{i}_id': move['move_id'] if move else None,
+            f'move_{i}_name': move['move_name'] if move else None,
+            f'move_{i}_type': move['move_type'] if move else None,
+            f'move_{i}_power': move['move_power'] if move else None,
+            f'move_{i}_accuracy': move['accuracy'] if move else None,
+            f'move_{i}_max_pp': move['pp'] if move else None,
+            f'move_{i}_current_pp': move['pp'] if move else None,
+        })
+    return combatant_from_row(row)
+
+
+def load_matchup(cursor, user_team_id, gym_id, matchups):
+    """
+    The opening state of a battle between a user team and a gym, or None
+        if either side has no Pokemon.
+    """
+    combatants = {}
+    for party, query, key in (('USER', USER_ROSTER, user_team_id), ('GYM', GYM_ROSTER, gym_id)):
+        cursor.execute(query, (key,))
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+        for member in rows:
+            combatant = _combatant(party, member)
+            combatants[(party, combatant.member_id)] = combatant
+
+    return BattleState(battle_id=0, user_id=None, user_team_id=user_team_id, gym_id=gym_id,
+                       ended=False, combatants=combatants, matchups=matchups)
+
+
+def fresh_state(template):
+    """
+    A copy of an opening state to play one battle on. Only the
+        combatants and their moves change during a battle; the type
+        chart is shared.
+    """
+    combatants = {
+        key: dataclasses.replace(combatant, moves=[
+            dataclasses.replace(move) if move is not None else None for move in combatant.moves
+        ])
+        for key, combatant in template.combatants.items()
+    }
+    return dataclasses.replace(template, combatants=combatants, dirty=set())
+
+
+# ---- the player's side ----
+
+def greedy_player(state, player, opponent, chart, rng):
+    # The same strongest-move rule the gym AI uses
+    return choose_greedy_move(state, 'USER', player.member_id, opponent.member_id, chart)
+
+
+def random_player(state, player, opponent, chart, rng):
+    usable = [slot for slot, move in enumerate(player.moves, start=1) if move and move.current_pp > 0]
+    return rng.choice(usable) if usable else 0
+
+
+PLAYER_POLICIES = {'greedy': greedy_player, 'random': random_player}
+
+
+def _can_act(combatant):
+    return any(move and move.current_pp > 0 for move in combatant.moves)
+
+
+def play_battle(state, chart, rng, player_policy=greedy_player, max_turns=500, difficulty='easy',
+                ai_nodes=None):
+    """
+    Play a battle to the end, round by round like /battle/api/round: the
+        player moves, then the gym leader replies (at the given
+        app/battle_ai.py difficulty, searching at most ai_nodes nodes per
+        decision) unless its Pokemon just fainted. Fainted Pokemon are
+        replaced by the next one alive; on the player's side that takes
+        their next action, like the battle page's forced switch. Returns
+        ('won' | 'lost' | 'draw', turns); a draw is a battle where
+        neither side has PP left or that hit max_turns.
+    """
+    player = state.next_alive('USER')
+    opponent = state.next_alive('GYM')
+    sending_out = False
+
+    for turn in range(1, max_turns + 1):
+        if not _can_act(player) and not _can_act(opponent):
+            return 'draw', turn - 1
+
+        if sending_out:
+            sending_out = False
+        else:
+            slot = player_policy(state, player, opponent, chart, rng)
+            resolve_turn(state, 'USER', player.member_id, opponent.member_id, slot, rng=rng)
+            if opponent.fainted:
+                opponent = state.next_alive('GYM')
+                if opponent is None:
+                    return 'won', turn
+                continue
+
+        # No time budget, so results don't depend on the machine
+        action = choose_action(state, opponent.member_id, player.member_id, chart, difficulty,
+                               budget_ms=None, max_nodes=ai_nodes)
+        if action.switch_to is not None:
+            opponent = state.get('GYM', action.switch_to)
+            continue
+        resolve_turn(state, 'GYM', opponent.member_id, player.member_id, action.move_slot, rng=rng)
+        if player.fainted:
+            player = state.next_alive('USER')
+            if player is None:
+                return 'lost', turn
+            sending_out = True
+
+    return 'draw', max_turns
+
+
+# ---- fan-out ----
+
+_worker_chart = None
+
+
+def _init_worker(chart):
+    global _worker_chart
+    _worker_chart = chart
+
+
+def battle_seed(seed, user_team_id, gym_id, index):
+    return f'{seed}:{user_team_id}:{gym_id}:{index}'
+
+
+def simulate_chunk(template, seed, start, count, player, max_turns, ai, ai_nodes, chart=None):
+    """
+    Play battles start .. start+count-1 of one matchup. Returns the
+        outcome counts and every battle's turn count.
+    """
+    chart = chart if chart is not None else _worker_chart
+    policy = PLAYER_POLICIES[player]
+    difficulty = ai or difficulty_for_gym(template.gym_id).name
+    outcomes = {'won': 0, 'lost': 0, 'draw': 0}
+    turns = []
+    for index in range(start, start + count):
+        rng = random.Random(battle_seed(seed, template.user_team_id, template.gym_id, index))
+        outcome, battle_turns = play_battle(fresh_state(template), chart, rng, policy, max_turns,
+                                            difficulty, ai_nodes)
+        outcomes[outcome] += 1
+        turns.append(battle_turns)
+    return template.user_team_id, template.gym_id, outcomes, turns
+
+
+def wilson_interval(successes, total, z=1.96):
+    """
+    95% confidence interval of a win rate.
+    """
+    if not total:
+        return 0.0, 0.0
+    p = successes / total
+    denominator = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominator
+    return max(centre - margin, 0.0), min(centre + margin, 1.0)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    return sorted_values[max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)]
+
+
+def simulate(templates, chart, battles, seed=0, workers=None, player='greedy', max_turns=500,
+             ai=None, ai_nodes=2000):
+    """
+    Play `battles` battles of every matchup in templates, on `workers`
+        processes (1 plays them in this process). The gym leaders play at
+        difficulty `ai`, or each gym's configured one if None. Returns
+        one summary per matchup.
+    """
+    tasks = []
+    for template in templates:
+        for start in range(0, battles, CHUNK_SIZE):
+            tasks.append((template, seed, start, min(CHUNK_SIZE, battles - start), player, max_turns,
+                          ai, ai_nodes))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        chunks = [simulate_chunk(*task, chart=chart) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(chart,)) as pool:
+            chunks = list(pool.map(simulate_chunk, *zip(*tasks)))
+
+    totals = {}
+    for user_team_id, gym_id, outcomes, turns in chunks:
+        total = totals.setdefault((user_team_id, gym_id), {'won': 0, 'lost': 0, 'draw': 0, 'turns': []})
+        for outcome, count in outcomes.items():
+            total[outcome] += count
+        total['turns'].extend(turns)
+
+    summaries = []
+    for (user_team_id, gym_id), total in totals.items():
+        played = total['won'] + total['lost'] + total['draw']
+        turns = sorted(total['turns'])
+        low, high = wilson_interval(total['won'], played)
+        summaries.append({
+            'user_team_id': user_team_id,
+            'gym_id': gym_id,
+            'ai': ai or difficulty_for_gym(gym_id).name,
+            'battles': played,
+            'won': total['won'],
+            'lost': total['lost'],
+            'draw': total['draw'],
+            'win_rate': round(total['won'] / played, 4) if played else 0.0,
+            'win_rate_95': [round(low, 4), round(high, 4)],
+            'mean_turns': round(sum(turns) / len(turns), 2) if turns else 0.0,
+            'p50_turns': _percentile(turns, 50),
+            'p90_turns': _percentile(turns, 90),
+            'max_turns': turns[-1] if turns else 0,
+        })
+    return sorted(summaries, key=lambda row: (row['user_team_id'], row['gym_id']))
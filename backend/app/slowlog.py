@@ -0,0 +1,206 @@
+"""
+Slow-query log.
+
+Every statement run through a pooled connection that takes longer than
+SLOW_QUERY_MS is written as one JSON line to SLOW_QUERY_LOG. Each line
+has the statement's fingerprint, its parameters with strings redacted,
+the route that ran it and how long it took. The first time a fingerprint
+is slow (and then at most once every SLOW_QUERY_EXPLAIN_INTERVAL seconds)
+its EXPLAIN plan is captured on a separate cursor.
+
+The log is meant to be read offline:
+    flask --app run slow-query-report
+groups it by fingerprint and shows which routes need indexes.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import has_request_context, request
+from pymysql.cursors import DictCursor, SSCursor
+
+logger = logging.getLogger(__name__)
+
+
+slow_query_ms = float(os.environ.get("SLOW_QUERY_MS", "200"))
+slow_query_log_path = os.environ.get("SLOW_QUERY_LOG", "slow_queries.jsonl")
+explain_interval = float(os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))
+
+# Statements MySQL can EXPLAIN
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'replace', 'with')
+# Longest redacted parameter list written per statement
+MAX_PARAMS = 50
+
+
+def redact(args):
+    """
+    Parameters with every string replaced by its type and length, so the
+        log never holds names, emails or passwords. Numbers and NULLs
+        are kept; ids are what most EXPLAIN plans depend on.
+    """
+    if args is None:
+        return None
+    if isinstance(args, dict):
+        return {key: redact(value) for key, value in args.items()}
+    if isinstance(args, (list, tuple)):
+        return [redact(value) for value in args[:MAX_PARAMS]]
+    if isinstance(args, (str, bytes)):
+        return f"<{type(args).__name__} len={len(args)}>"
+    if isinstance(args, (int, float)):
+        return args
+    return f"<{type(args).__name__}>"
+
+
+class SlowQueryLog:
+
+    def __init__(self, threshold_ms=200.0, path='slow_queries.jsonl', explain_interval=300.0):
+        self.threshold = threshold_ms / 1000
+        self.path = path
+        self.explain_interval = explain_interval
+        self._lock = threading.Lock()
+        # fingerprint -> {count, total_ms, max_ms, endpoints, explain, explained_at}
+        self._aggregates = {}
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def _should_explain(self, shape, now):
+        # Caller must hold the lock
+        aggregate = self._aggregates.get(shape)
+        if aggregate is None or aggregate['explained_at'] is None:
+            return True
+        return now - aggregate['explained_at'] >= self.explain_interval
+
+    def _explain(self, cursor, query, args):
+        if isinstance(cursor, SSCursor):
+            # Rows of an unbuffered cursor are still on the wire
+            return None
+        if query.lstrip().split(None, 1)[0].lower() not in EXPLAINABLE:
+            return None
+        try:
+            with cursor.connection.cursor(DictCursor) as explain_cursor:
+                explain_cursor.execute("EXPLAIN " + query, args)
+                return [
+                    {key: value for key, value in row.items() if value is not None}
+                    for row in explain_cursor.fetchall()
+                ]
+        except Exception as e:
+            return [{'error': str(e)}]
+
+    def observe(self, cursor, query, args, elapsed):
+        """
+        Called after every statement; cheap unless the statement was slow.
+        """
+        if not self.enabled or elapsed < self.threshold:
+            return
+
+        # app.db imports this module, so look the fingerprint helper up late
+        from app.db import fingerprint
+        shape = fingerprint(query)
+        now = time.time()
+        elapsed_ms = round(elapsed * 1000, 3)
+        endpoint = request.endpoint if has_request_context() else None
+
+        with self._lock:
+            explain = self._should_explain(shape, now)
+            aggregate = self._aggregates.setdefault(shape, {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'endpoints': set(), 'explain': None, 'explained_at': None,
+            })
+            if explain:
+                # Claim it so concurrent requests don't all run EXPLAIN
+                aggregate['explained_at'] = now
+
+        plan = self._explain(cursor, query, args) if explain else None
+
+        record = {
+            'at': now,
+            'fingerprint': shape,
+            'elapsed_ms': elapsed_ms,
+            'rows': getattr(cursor, 'rowcount', None),
+            'params': redact(args),
+            'endpoint': endpoint,
+            'path': request.path if has_request_context() else None,
+        }
+        if plan is not None:
+            record['explain'] = plan
+
+        with self._lock:
+            aggregate['count'] += 1
+            aggregate['total_ms'] += elapsed_ms
+            aggregate['max_ms'] = max(aggregate['max_ms'], elapsed_ms)
+            if endpoint:
+                aggregate['endpoints'].add(endpoint)
+            if plan is not None:
+                aggregate['explain'] = plan
+            try:
+                with open(self.path, 'a', encoding='utf-8') as log_file:
+                    log_file.write(json.dumps(record, default=str) + '\n')
+            except OSError as e:
+                logger.warning(f"Could not write the slow-query log: {e}")
+
+    def summary(self):
+        """
+        Slow statements seen by this process, most total time first.
+        """
+        with self._lock:
+            rows = [
+                {
+                    'fingerprint': shape,
+                    'count': aggregate['count'],
+                    'total_ms': round(aggregate['total_ms'], 3),
+                    'max_ms': aggregate['max_ms'],
+                    'endpoints': sorted(aggregate['endpoints']),
+                    'explain': aggregate['explain'],
+                }
+                for shape, aggregate in self._aggregates.items()
+            ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+
+def full_scans(plan):
+    """
+    Tables an EXPLAIN plan reads without an index.
+    """
+    return [
+        row.get('table') for row in plan or []
+        if row.get('type') == 'ALL' or (row.get('type') == 'index' and not row.get('key'))
+    ]
+
+
+def read_report(path):
+    """
+    Aggregate a slow-query log file by fingerprint, most total time first.
+    """
+    aggregates = {}
+    with open(path, encoding='utf-8') as log_file:
+        for line in log_file:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            aggregate = aggregates.setdefault(record['fingerprint'], {
+                'fingerprint': record['fingerprint'], 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'endpoints': set(), 'explain': None,
+            })
+            aggregate['count'] += 1
+            aggregate['total_ms'] += record['elapsed_ms']
+            aggregate['max_ms'] = max(aggregate['max_ms'], record['elapsed_ms'])
+            if record.get('endpoint'):
+                aggregate['endpoints'].add(record['endpoint'])
+            if record.get('explain') is not None:
+                aggregate['explain'] = record['explain']
+
+    rows = sorted(aggregates.values(), key=lambda row: row['total_ms'], reverse=True)
+    for row in rows:
+        row['endpoints'] = sorted(row['endpoints'])
+        row['full_scans'] = full_scans(row['explain'])
+    return rows
+
+
+# The log shared by every connection in this process
+slow_log = SlowQueryLog(threshold_ms=slow_query_ms, path=slow_query_log_path,
+                        explain_interval=explain_interval)
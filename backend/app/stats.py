@@ -0,0 +1,116 @@
+"""
+Per-user battle statistics.
+
+user_stats and user_gym_clears (sql/user_stats.sql) hold running totals
+of every user's finished battles. record_battle_result() adds one battle
+to them in the same transaction that ends the battle, and
+rebuild_user_stats() recomputes them from the battles table (used to
+backfill, or to repair the rollups by hand).
+"""
+
+
+def record_battle_result(cursor, user_id, gym_id, battle_id, won):
+    """
+    Add a battle that just ended to the user's totals. Call it after the
+        battle's end_time and win_loss_outcome are set, before committing.
+    """
+    add_battle = """
+        INSERT INTO user_stats (user_id, wins, losses, total_battle_seconds, gyms_beaten)
+        SELECT %s, %s, %s, GREATEST(TIMESTAMPDIFF(SECOND, start_time, end_time), 0), 0
+        FROM battles
+        WHERE battle_id = %s
+        ON DUPLICATE KEY UPDATE
+            wins = wins + VALUES(wins),
+            losses = losses + VALUES(losses),
+            total_battle_seconds = total_battle_seconds + VALUES(total_battle_seconds);
+    """
+    cursor.execute(add_battle, (user_id, 1 if won else 0, 0 if won else 1, battle_id))
+
+    if not won:
+        return
+
+    # First win against this gym earns a badge; later wins may lower the
+    # best clear time used by the leaderboard
+    add_clear = """
+        INSERT INTO user_gym_clears (user_id, gym_id, first_cleared_at, best_clear_seconds)
+        SELECT %s, %s, NOW(), GREATEST(TIMESTAMPDIFF(SECOND, start_time, end_time), 0)
+        FROM battles
+        WHERE battle_id = %s
+        ON DUPLICATE KEY UPDATE
+            best_clear_seconds = LEAST(COALESCE(best_clear_seconds, VALUES(best_clear_seconds)),
+                                       VALUES(best_clear_seconds));
+    """
+    cursor.execute(add_clear, (user_id, gym_id, battle_id))
+    # 1 = new row, 2 = existing row updated, 0 = unchanged
+    if cursor.rowcount == 1:
+        cursor.execute("""
+            UPDATE user_stats
+            SET gyms_beaten = gyms_beaten + 1
+            WHERE user_id = %s;
+        """, (user_id,))
+
+
+def get_user_stats(cursor, user_id):
+    """
+    A user's badge level and battle totals, with the win rate (percent)
+        and average battle time (minutes) worked out. None if the user
+        doesn't exist.
+    """
+    get_stats = """
+        SELECT U.user_id, U.badge_level,
+            COALESCE(S.wins, 0) AS wins,
+            COALESCE(S.losses, 0) AS losses,
+            COALESCE(S.total_battle_seconds, 0) AS total_battle_seconds,
+            COALESCE(S.gyms_beaten, 0) AS gyms_beaten
+        FROM users U
+        LEFT JOIN user_stats S ON S.user_id = U.user_id
+        WHERE U.user_id = %s;
+    """
+    cursor.execute(get_stats, (user_id,))
+    stats = cursor.fetchone()
+    if stats is None:
+        return None
+
+    battles = stats['wins'] + stats['losses']
+    stats['battles'] = battles
+    stats['win_percentage'] = round(stats['wins'] * 100 / battles, 2) if battles else None
+    stats['avg_battle_minutes'] = round(stats['total_battle_seconds'] / battles / 60, 1) if battles else None
+    return stats
+
+
+def rebuild_user_stats(cursor, user_id=None):
+    """
+    Recompute the rollups from the battles table, for one user or for
+        everyone. Returns the number of users rebuilt.
+    """
+    only_user = "AND UT.user_id = %s" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    if user_id is not None:
+        cursor.execute("DELETE FROM user_gym_clears WHERE user_id = %s;", params)
+        cursor.execute("DELETE FROM user_stats WHERE user_id = %s;", params)
+    else:
+        cursor.execute("DELETE FROM user_gym_clears;")
+        cursor.execute("DELETE FROM user_stats;")
+
+    cursor.execute(f"""
+        INSERT INTO user_gym_clears (user_id, gym_id, first_cleared_at, best_clear_seconds)
+        SELECT UT.user_id, B.gym_id, MIN(B.end_time),
+            MIN(GREATEST(TIMESTAMPDIFF(SECOND, B.start_time, B.end_time), 0))
+        FROM user_teams UT JOIN battles B ON B.user_team_id = UT.user_team_id
+        WHERE B.win_loss_outcome = 1 AND B.end_time IS NOT NULL {only_user}
+        GROUP BY UT.user_id, B.gym_id;
+    """, params)
+
+    cursor.execute(f"""
+        INSERT INTO user_stats (user_id, wins, losses, total_battle_seconds, gyms_beaten)
+        SELECT UT.user_id,
+            SUM(B.win_loss_outcome = 1),
+            SUM(B.win_loss_outcome = 0),
+            SUM(GREATEST(TIMESTAMPDIFF(SECOND, B.start_time, B.end_time), 0)),
+            (SELECT COUNT(*) FROM user_gym_clears C WHERE C.user_id = UT.user_id)
+        FROM user_teams UT JOIN battles B ON B.user_team_id = UT.user_team_id
+        WHERE B.end_time IS NOT NULL AND B.win_loss_outcome IS NOT NULL {only_user}
+        GROUP BY UT.user_id;
+    """, params)
+    return cursor.rowcount
@@ -1,5 +1,10 @@
+import logging
 from flask import jsonify, render_template, Blueprint, request, session, redirect, url_for
 from app.db import getconn
+from app.refdata import refdata
+from app.name_index import get_name_index
+
+logger = logging.getLogger(__name__)
 
 
 # Routes will go here e.g. @bp.route('/teams')
@@ -32,7 +37,7 @@ def create_team():
                 team_name_results = cursor.fetchone()
                 if team_name_results:
                     team_name = team_name_results["team_name"]
-                    print(f"current team name is {team_name}")
+                    logger.debug("Editing team", extra={'user_team_id': user_team_id, 'team_name': team_name})
                 else:
                     team_name = ""
         finally:
@@ -42,22 +47,8 @@ def create_team():
     if request.method == 'POST':
         # Get the search term (user input) from the form
         user_pokemon_input = request.form.get('pokemon_search', '').strip()
-        print("We are seraching for pokemon name")
-        results = []
-        if user_pokemon_input:
-            db_conn = getconn()
-            try:
-                with db_conn.cursor() as cursor:
-                    get_pokemon_name = """
-                        SELECT name 
-                        FROM pokedex_entries 
-                        WHERE LOWER(name) LIKE %s
-                        LIMIT 10;
-                    """
-                    cursor.execute(get_pokemon_name, (f"%{user_pokemon_input.lower()}%",))
-                    pokemon_name_results = cursor.fetchall()
-            finally:
-                db_conn.close()
+        # Look the name up in the in-memory name index (best matches first)
+        pokemon_name_results = get_name_index().search(user_pokemon_input, limit=10)
 
         return render_template('create_team.html', pokemon_results=pokemon_name_results, team=team, team_name=team_name)
 
@@ -87,8 +78,8 @@ def add_pokemon():
 def update_team():
     """
     Update the team. Once the user presses "Save" for the team,
-        we will delete the original pokemon on the team, but
-        will maintain the same user team id.
+        only the team slots that changed are rewritten, and the
+        same user team id is kept.
     """
     user_team_id = session.get('user_team_id')
     if not user_team_id:
@@ -101,49 +92,69 @@ def update_team():
         if poke_name:
             new_updated_team.append(poke_name)
 
+    # Resolve every name from the cached Pokedex, keeping each Pokemon's
+    # position on the team as its user_team_member_id
+    new_members = {}
+    for team_order, poke_name in enumerate(new_updated_team):
+        entry = refdata.pokemon_by_name(poke_name)
+        if entry:
+            new_members[team_order + 1] = entry['pokedex_id']
+
     # Connect to GCP
     db_conn = getconn()
     try:
         with db_conn.cursor() as cursor:
-
-            print("We deleted the team.")
-
-            # Delete pokemon on team to prepare for update
-            delete_team = """
-                DELETE 
-                FROM user_poke_team_members 
+            # Current roster, so only the slots that changed are written
+            get_current_team = """
+                SELECT user_team_member_id, pokedex_id
+                FROM user_poke_team_members
                 WHERE user_team_id = %s
             """
-            cursor.execute(delete_team, (user_team_id,))
-
-            # ---- SETUP variables to be looped through ----
-            # Get the pokedex id of the pokemon chosen by user
-            selected_pokedex_id = """
-                SELECT pokedex_id 
-                FROM pokedex_entries 
-                WHERE LOWER(name) = %s LIMIT 1
-            """
-            # Add the pokemon chosen by user to database
-            add_pokemon_to_team = """
-                INSERT INTO user_poke_team_members (user_team_id, user_team_member_id, pokedex_id)
-                VALUES (%s, %s, %s);
-            """
+            cursor.execute(get_current_team, (user_team_id,))
+            current_members = {
+                row['user_team_member_id']: row['pokedex_id']
+                for row in cursor.fetchall()
+            }
+
+            # Drop the slots that are no longer on the team
+            removed = [member_id for member_id in current_members if member_id not in new_members]
+            if removed:
+                delete_members = f"""
+                    DELETE
+                    FROM user_poke_team_members
+                    WHERE user_team_id = %s
+                    AND user_team_member_id IN ({', '.join(['%s'] * len(removed))})
+                """
+                cursor.execute(delete_members, (user_team_id, *removed))
+
+            # Add new slots and swap changed ones in a single upsert. A slot
+            # that gets a different Pokemon loses its old moves, like the
+            # delete and re-insert used to do.
+            changed = [
+                (member_id, pokedex_id)
+                for member_id, pokedex_id in new_members.items()
+                if current_members.get(member_id) != pokedex_id
+            ]
+            if changed:
+                params = []
+                for member_id, pokedex_id in changed:
+                    params.extend([user_team_id, member_id, pokedex_id])
+                upsert_members = f"""
+                    INSERT INTO user_poke_team_members (user_team_id, user_team_member_id, pokedex_id)
+                    VALUES {', '.join(['(%s, %s, %s)'] * len(changed))}
+                    ON DUPLICATE KEY UPDATE
+                        pokedex_id = VALUES(pokedex_id),
+                        move_1_id = NULL, move_1_current_pp = NULL,
+                        move_2_id = NULL, move_2_current_pp = NULL,
+                        move_3_id = NULL, move_3_current_pp = NULL,
+                        move_4_id = NULL, move_4_current_pp = NULL;
+                """
+                cursor.execute(upsert_members, params)
 
-            # Get the pokedex_id of the user's chosen pokemon and add it to current team
-            # Add pokemon in order (0 to 6) in same way user set up team
-            for team_order, poke_name in enumerate(new_updated_team):
-                # Step 1: Get pokedex id
-                cursor.execute(selected_pokedex_id, (poke_name.lower(),))
-                pokedex_id_result = cursor.fetchone()
-                if pokedex_id_result:
-                    pokedex_id = pokedex_id_result['pokedex_id']
-                    # Order the pokemon is on the team
-                    user_team_member_id = team_order + 1
-                    # Step 2: Add pokemon to team in database
-                    cursor.execute(add_pokemon_to_team, (user_team_id, user_team_member_id, pokedex_id))
             db_conn.commit()
 
-            print("We saved the team")
+            logger.info("Saved team", extra={'user_team_id': user_team_id,
+                                             'changed': len(changed), 'removed': len(removed)})
     finally:
         db_conn.close()
 
@@ -349,43 +360,39 @@ def choose_moves():
     db_conn = getconn()
     try:
         with db_conn.cursor() as cursor:
-            # Get the pokedex_id and name for each Pokemon on the user's team
+            # Get the pokedex_id of each Pokemon on the user's team
             get_team_query = """
-                SELECT PE.pokedex_id, PE.name
-                FROM user_poke_team_members UPT
-                JOIN pokedex_entries PE ON UPT.pokedex_id = PE.pokedex_id
-                WHERE UPT.user_team_id = %s
-                ORDER BY UPT.user_team_member_id ASC
+                SELECT pokedex_id
+                FROM user_poke_team_members
+                WHERE user_team_id = %s
+                ORDER BY user_team_member_id ASC
             """
             cursor.execute(get_team_query, (user_team_id,))
             team_pokemon = cursor.fetchall()
 
-            # For each Pokeon, get its available moves (all move info)
-            moves_by_pokemon = []
-            for poke in team_pokemon:
-                pokedex_id = poke['pokedex_id']
-                name = poke['name']
-                
-                get_moves_query = """
-                    SELECT M.move_name, M.move_type, M.category, M.move_power, M.accuracy, M.pp
-                    FROM pokemon_moves PM
-                    JOIN moves M ON PM.move_id = M.move_id
-                    WHERE PM.pokedex_id = %s
-                    ORDER BY M.move_name
-                """
-                cursor.execute(get_moves_query, (pokedex_id,))
-                move_results = cursor.fetchall()  
-
-                moves_by_pokemon.append({
-                    'name': name,
-                    'pokedex_id': pokedex_id,
-                    'moves': move_results 
-                })
-
     finally:
         db_conn.close()
 
-    return render_template('moves.html', moves_by_pokemon=moves_by_pokemon)
+    # Learnsets come from the cached learnset index. Every move is sent
+    # once in a shared table; each Pokemon only lists the ids it can learn.
+    moves = {}
+    moves_by_pokemon = []
+    for poke in team_pokemon:
+        pokedex_id = poke['pokedex_id']
+        entry = refdata.pokemon(pokedex_id)
+
+        move_ids = refdata.learnset_ids(pokedex_id)
+        for move_id in move_ids:
+            if move_id not in moves:
+                moves[move_id] = refdata.move(move_id)
+
+        moves_by_pokemon.append({
+            'name': entry['name'] if entry else "Unknown Pokemon",
+            'pokedex_id': pokedex_id,
+            'move_ids': move_ids
+        })
+
+    return render_template('moves.html', moves_by_pokemon=moves_by_pokemon, moves=moves)
 
 
 @bp.route('/save_moves', methods=['POST'])
@@ -398,9 +405,13 @@ def save_moves():
     db_conn = getconn()
     try:
         with db_conn.cursor() as cursor:
-            # Get the team members in order with their user_team_member_id and pokedex_id
+            # Get the team members in order with their current moves
             get_team_members = """
-                SELECT user_team_member_id, pokedex_id
+                SELECT user_team_member_id, pokedex_id,
+                    move_1_id, move_1_current_pp,
+                    move_2_id, move_2_current_pp,
+                    move_3_id, move_3_current_pp,
+                    move_4_id, move_4_current_pp
                 FROM user_poke_team_members
                 WHERE user_team_id = %s
                 ORDER BY user_team_member_id ASC
@@ -408,6 +419,7 @@ def save_moves():
             cursor.execute(get_team_members, (user_team_id,))
             team_members = cursor.fetchall()
 
+            updates = []
             for member in team_members:
                 member_id = member['user_team_member_id']
                 pokedex_id = member['pokedex_id']
@@ -420,39 +432,49 @@ def save_moves():
                     # Error handling
                     return "Please select exactly 4 moves for each Pokémon.", 400
 
-                # For each move name, get move_id and initial current_pp from moves table
-                move_ids = []
-                move_pps = []
-
+                # Move ids and starting PP come from the cached moves table
+                new_values = []
                 for move_name in selected_moves:
-                    cursor.execute("SELECT move_id, pp FROM moves WHERE move_name = %s", (move_name,))
-                    move_row = cursor.fetchone()
+                    move_row = refdata.move_by_name(move_name)
                     if move_row:
-                        move_ids.append(move_row['move_id'])
-                        move_pps.append(move_row['pp'])
+                        new_values.extend([move_row['move_id'], move_row['pp']])
                     else:
                         # Move not found, handle error or skip
                         return f"Move '{move_name}' not found.", 400
 
-                # Update the user_poke_team_members row for this Pokemon with the chosen moves and their PP
-                update_moves_sql = """
-                    UPDATE user_poke_team_members
-                    SET move_1_id = %s, move_1_current_pp = %s,
-                        move_2_id = %s, move_2_current_pp = %s,
-                        move_3_id = %s, move_3_current_pp = %s,
-                        move_4_id = %s, move_4_current_pp = %s
-                    WHERE user_team_id = %s AND user_team_member_id = %s
+                # Skip members whose moves didn't change
+                old_values = []
+                for i in range(1, 5):
+                    old_values.extend([member[f'move_{i}_id'], member[f'move_{i}_current_pp']])
+                if new_values != old_values:
+                    updates.append((user_team_id, member_id, pokedex_id, *new_values))
+
+            # Write the members whose moves changed in one statement: a
+            # multi-row upsert on the (team, member) key, like update_team.
+            # Every row already exists, so each one takes the UPDATE branch.
+            if updates:
+                params = []
+                for row in updates:
+                    params.extend(row)
+                update_moves_sql = f"""
+                    INSERT INTO user_poke_team_members (
+                        user_team_id, user_team_member_id, pokedex_id,
+                        move_1_id, move_1_current_pp,
+                        move_2_id, move_2_current_pp,
+                        move_3_id, move_3_current_pp,
+                        move_4_id, move_4_current_pp
+                    )
+                    VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(updates))}
+                    ON DUPLICATE KEY UPDATE
+                        move_1_id = VALUES(move_1_id), move_1_current_pp = VALUES(move_1_current_pp),
+                        move_2_id = VALUES(move_2_id), move_2_current_pp = VALUES(move_2_current_pp),
+                        move_3_id = VALUES(move_3_id), move_3_current_pp = VALUES(move_3_current_pp),
+                        move_4_id = VALUES(move_4_id), move_4_current_pp = VALUES(move_4_current_pp);
                 """
-                cursor.execute(update_moves_sql, (
-                    move_ids[0], move_pps[0],
-                    move_ids[1], move_pps[1],
-                    move_ids[2], move_pps[2],
-                    move_ids[3], move_pps[3],
-                    user_team_id, member_id
-                ))
+                cursor.execute(update_moves_sql, params)
 
             db_conn.commit()
 
     finally:
         db_conn.close()
-    return redirect(url_for('home.load_teams'))
\ No newline at end of file
+    return redirect(url_for('home.load_teams'))
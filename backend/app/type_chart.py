@@ -0,0 +1,109 @@
+"""
+Precomputed type chart for scoring moves.
+
+type_matchups is loaded once into a dense (type x type) NumPy matrix of
+multipliers, and the moves table into arrays indexed by move_id, so the
+gym AI can score all of a Pokemon's moves in one vectorized operation
+without touching the database. The chart is rebuilt from the reference
+data cache (app/refdata.py) whenever it picks up a change to the tables.
+"""
+import threading
+
+import numpy as np
+
+from app.refdata import refdata
+
+
+class TypeChart:
+
+    def __init__(self, matchup_rows, move_rows, version=None):
+        self.version = version
+
+        type_names = set()
+        for row in matchup_rows:
+            type_names.add(row['attacking_type'])
+            type_names.add(row['defending_type'])
+        for row in move_rows:
+            if row['move_type'] is not None:
+                type_names.add(row['move_type'])
+        self.types = sorted(type_names)
+        self.type_index = {name: i for i, name in enumerate(self.types)}
+        # The last row/column stands for "unknown or no type" and is neutral
+        self.neutral = len(self.types)
+
+        self.matrix = np.ones((self.neutral + 1, self.neutral + 1), dtype=np.float64)
+        self.matchups = {}
+        for row in matchup_rows:
+            multiplier = float(row['multiplier'])
+            attacking = self.type_index[row['attacking_type']]
+            defending = self.type_index[row['defending_type']]
+            self.matrix[attacking, defending] = multiplier
+            self.matchups[(row['attacking_type'], row['defending_type'])] = multiplier
+
+        # Move attributes in arrays indexed by move_id (index 0 = no move)
+        max_id = max((row['move_id'] for row in move_rows), default=0)
+        self.move_power = np.zeros(max_id + 1, dtype=np.float64)
+        self.move_type = np.full(max_id + 1, self.neutral, dtype=np.intp)
+        for row in move_rows:
+            self.move_power[row['move_id']] = row['move_power'] or 0
+            self.move_type[row['move_id']] = self.type_index.get(row['move_type'], self.neutral)
+
+    def type_id(self, type_name):
+        return self.type_index.get(type_name, self.neutral)
+
+    def multiplier(self, move_type, defender_types):
+        attacking = self.type_id(move_type)
+        result = 1.0
+        for defending_type in defender_types:
+            if defending_type is not None:
+                result *= self.matrix[attacking, self.type_id(defending_type)]
+        return float(result)
+
+    def score_moves(self, move_ids, move_pps, defender_types):
+        """
+        power * type multiplier for every move slot at once. Slots that
+            are empty or out of PP score -1.
+        """
+        ids = np.array([move_id or 0 for move_id in move_ids], dtype=np.intp)
+        pps = np.array([pp or 0 for pp in move_pps], dtype=np.int64)
+        known = ids < len(self.move_power)
+        ids = np.where(known, ids, 0)
+
+        attacking = self.move_type[ids]
+        type_1 = self.type_id(defender_types[0]) if defender_types else self.neutral
+        type_2 = self.type_id(defender_types[1]) if len(defender_types) > 1 else self.neutral
+        multipliers = self.matrix[attacking, type_1] * self.matrix[attacking, type_2]
+
+        usable = (ids > 0) & known & (pps > 0)
+        return np.where(usable, self.move_power[ids] * multipliers, -1.0)
+
+    def best_slot(self, move_ids, move_pps, defender_types):
+        """
+        1-based slot of the highest scoring usable move, or 0 if no move
+            can be used. Ties go to the earlier slot.
+        """
+        scores = self.score_moves(move_ids, move_pps, defender_types)
+        best = int(np.argmax(scores))
+        if scores[best] < 0:
+            return 0
+        return best + 1
+
+
+_chart = None
+_chart_snapshot = None
+_chart_lock = threading.Lock()
+
+
+def get_type_chart():
+    """
+    The type chart for the current reference data snapshot.
+    """
+    global _chart, _chart_snapshot
+    snapshot = refdata.snapshot()
+    if _chart_snapshot is not snapshot:
+        with _chart_lock:
+            if _chart_snapshot is not snapshot:
+                _chart = TypeChart(snapshot.type_matchups, snapshot.moves_by_id.values(),
+                                   version=snapshot.version)
+                _chart_snapshot = snapshot
+    return _chart
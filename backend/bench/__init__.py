@@ -0,0 +1,16 @@
+"""
+Micro-benchmarks for the Python that runs on every request.
+
+Each benchmark (cases.py) times one piece of request handling on
+synthetic data at production sizes (fixtures.py), without a database.
+run.py reports per-call timings, writes them as JSON and compares them
+with a saved baseline, failing when a benchmark got slower than its
+regression threshold.
+"""
+import os
+
+# app.db reads its connection settings at import time. The benchmarks
+# never connect, so any placeholder will do when none are configured.
+for _name, _default in (('DB_HOST', '127.0.0.1'), ('DB_USER', 'bench'),
+                        ('DB_PASS', 'bench'), ('DB_NAME', 'bench')):
+    os.environ.setdefault(_name, _default)
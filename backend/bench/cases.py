@@ -0,0 +1,116 @@
+"""
+The benchmarks. Each one is a setup function registered with @benchmark
+that returns the zero-argument callable to time. threshold_pct is how
+much slower than the baseline (median per call) it may get before the
+run counts it as a regression; noisier, sub-microsecond cases get more
+room.
+"""
+from flask import render_template
+
+from app import create_app
+from app.battle import _battle_page, _move_list
+from app.battle_ai import choose_action
+from app.battle_engine import choose_greedy_move, load_battle_state
+from app.main import group_team_pokemon
+from app.refdata import refdata
+from app.type_chart import get_type_chart
+from bench import fixtures
+
+BENCHMARKS = {}
+
+
+def benchmark(name, threshold_pct=10.0):
+    def register(setup):
+        BENCHMARKS[name] = {'setup': setup, 'threshold_pct': threshold_pct}
+        return setup
+    return register
+
+
+class Context:
+    """
+    Inputs shared by every benchmark, built once per run.
+    """
+
+    def __init__(self, seed=0):
+        self.app = create_app(connect=False)
+        self.snapshot = fixtures.reference_snapshot(seed)
+        refdata.install(self.snapshot)
+        self.chart = get_type_chart()
+        self.battle_rows = fixtures.battle_rows(self.snapshot, seed)
+        self.team_rows = fixtures.team_rows(self.snapshot, seed)
+
+        # Templates need a request (url_for, session); keep one pushed
+        self.request_context = self.app.test_request_context('/')
+        self.request_context.push()
+
+    def battle_state(self):
+        return load_battle_state(fixtures.RowsCursor(self.battle_rows), 1, self.chart.matchups)
+
+    def close(self):
+        self.request_context.pop()
+
+
+@benchmark('ai.choose_greedy_move', threshold_pct=15.0)
+def ai_choose_greedy_move(ctx):
+    # process_ai_turn: score the gym Pokemon's four moves against the player's
+    state = ctx.battle_state()
+    return lambda: choose_greedy_move(state, 'GYM', 1, 1, ctx.chart)
+
+
+@benchmark('ai.search_normal', threshold_pct=15.0)
+def ai_search_normal(ctx):
+    # The normal tier's full two-round search, without the time budget so
+    # every run does the same work
+    state = ctx.battle_state()
+    return lambda: choose_action(state, 1, 1, ctx.chart, 'normal', budget_ms=None)
+
+
+@benchmark('battle.start_state')
+def battle_start_state(ctx):
+    # start_battle: build the battle from its rows, then the page's payload
+    # (both rosters included)
+    def start():
+        state = ctx.battle_state()
+        return _battle_page(state, state.next_alive('USER'), state.next_alive('GYM'))
+    return start
+
+
+@benchmark('main.group_team_pokemon')
+def main_group_team_pokemon(ctx):
+    # load_teams: group (team, pokemon) rows into the Teams page's teams_map
+    return lambda: group_team_pokemon(ctx.team_rows)
+
+
+@benchmark('battle.move_list', threshold_pct=20.0)
+def battle_move_list(ctx):
+    # get_moves: one member's moves as JSON-ready dicts
+    member = ctx.battle_state().get('USER', 1)
+    return lambda: _move_list(member)
+
+
+@benchmark('render.battle_html', threshold_pct=15.0)
+def render_battle_html(ctx):
+    state = ctx.battle_state()
+    page = _battle_page(state, state.next_alive('USER'), state.next_alive('GYM'))
+    return lambda: render_template('battle.html', **page)
+
+
+def _listing(snapshot, count):
+    columns = ('pokedex_id', 'name', 'pType_1', 'pType_2', 'hp', 'attack', 'defense')
+    return [{column: row[column] for column in columns} for row in snapshot.pokemon[:count]]
+
+
+@benchmark('render.pokedex_page', threshold_pct=15.0)
+def render_pokedex_page(ctx):
+    # One default-sized page of the keyset-paginated listing (fixed here,
+    # not POKEDEX_PAGE_SIZE, so runs stay comparable)
+    entries = _listing(ctx.snapshot, 50)
+    return lambda: render_template('pokedex.html', entries=entries, limit=50, after=0,
+                                   next_after=entries[-1]['pokedex_id'])
+
+
+@benchmark('render.pokedex_full', threshold_pct=15.0)
+def render_pokedex_full(ctx):
+    # The whole dex, as /pokedex?stream=1 sends it
+    entries = _listing(ctx.snapshot, len(ctx.snapshot.pokemon))
+    return lambda: render_template('pokedex.html', entries=entries, streaming=True)
@@ -0,0 +1,135 @@
+"""
+Synthetic data at production sizes, generated from a fixed seed so every
+run benchmarks exactly the same inputs.
+"""
+import random
+
+from app.refdata import ReferenceSnapshot
+
+TYPES = ['Normal', 'Fire', 'Water', 'Grass', 'Electric', 'Ice', 'Fighting', 'Poison', 'Ground',
+         'Flying', 'Psychic', 'Bug', 'Rock', 'Ghost', 'Dragon', 'Dark', 'Steel', 'Fairy']
+CATEGORIES = ['Physical', 'Special', 'Status']
+
+# Roughly the size of the full national dex
+POKEMON_COUNT = 1025
+MOVE_COUNT = 919
+LEARNSET_SIZE = (30, 90)
+GYM_COUNT = 8
+TEAM_SIZE = 6
+# Teams on the Teams page of a heavy user
+TEAMS_PER_USER = 25
+
+
+def reference_rows(seed=0):
+    rng = random.Random(seed)
+
+    pokemon_rows = []
+    for pokedex_id in range(1, POKEMON_COUNT + 1):
+        type_1 = rng.choice(TYPES)
+        type_2 = rng.choice([None, rng.choice(TYPES)])
+        pokemon_rows.append({
+            'pokedex_id': pokedex_id,
+            'name': f'Pokemon{pokedex_id:04d}',
+            'pType_1': type_1,
+            'pType_2': type_2 if type_2 != type_1 else None,
+            'hp': rng.randint(20, 255),
+            'attack': rng.randint(5, 190),
+            'defense': rng.randint(5, 230),
+            'image_url': f'https://example.com/sprites/{pokedex_id}.png',
+        })
+
+    move_rows = []
+    for move_id in range(1, MOVE_COUNT + 1):
+        category = rng.choice(CATEGORIES)
+        move_rows.append({
+            'move_id': move_id,
+            'move_name': f'Move{move_id:04d}',
+            'move_type': rng.choice(TYPES),
+            'category': category,
+            'move_power': None if category == 'Status' else rng.choice(range(10, 151, 5)),
+            'accuracy': rng.choice([None, 70, 85, 90, 95, 100, 100, 100]),
+            'pp': rng.choice([5, 10, 15, 20, 25, 30, 35, 40]),
+        })
+
+    learnset_rows = []
+    for row in pokemon_rows:
+        for move_id in rng.sample(range(1, MOVE_COUNT + 1), rng.randint(*LEARNSET_SIZE)):
+            learnset_rows.append({'pokedex_id': row['pokedex_id'], 'move_id': move_id})
+
+    matchup_rows = [
+        {'attacking_type': attacking, 'defending_type': defending,
+         'multiplier': rng.choice([0.0, 0.5, 1.0, 1.0, 1.0, 2.0])}
+        for attacking in TYPES for defending in TYPES
+    ]
+
+    gym_rows = [
+        {'gym_id': gym_id, 'gym_name': f'Gym {gym_id}', 'gym_leader': f'Leader {gym_id}',
+         'badge_title': f'Badge {gym_id}', 'badge_image': '/static/badge.png',
+         'gym_theme_img': '/static/gym_image.jpg'}
+        for gym_id in range(1, GYM_COUNT + 1)
+    ]
+    return pokemon_rows, move_rows, learnset_rows, matchup_rows, gym_rows
+
+
+def reference_snapshot(seed=0):
+    return ReferenceSnapshot(*reference_rows(seed), version=('bench', seed))
+
+
+def _member_moves(rng, snapshot, pokedex_id):
+    move_ids = rng.sample(snapshot.learnsets[pokedex_id], 4)
+    return [snapshot.moves_by_id[move_id] for move_id in move_ids]
+
+
+def battle_rows(snapshot, seed=0, battle_id=1):
+    """
+    The rows LOAD_BATTLE returns for a full six-on-six battle.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for party in ('USER', 'GYM'):
+        for member_id in range(1, TEAM_SIZE + 1):
+            pokemon = rng.choice(snapshot.pokemon)
+            row = {
+                'battle_id': battle_id, 'user_team_id': 1, 'gym_id': 1, 'end_time': None, 'user_id': 1,
+                'party': party, 'member_id': member_id, 'pokedex_id': pokemon['pokedex_id'],
+                'current_hp': pokemon['hp'], 'name': pokemon['name'], 'image_url': pokemon['image_url'],
+                'pType_1': pokemon['pType_1'], 'pType_2': pokemon['pType_2'],
+                'attack': pokemon['attack'], 'defense': pokemon['defense'], 'max_hp': pokemon['hp'],
+            }
+            for i, move in enumerate(_member_moves(rng, snapshot, pokemon['pokedex_id']), start=1):
+                row.update({
+                    f'move_{i}_id': move['move_id'], f'move_{i}_name': move['move_name'],
+                    f'move_{i}_type': move['move_type'], f'move_{i}_power': move['move_power'],
+                    f'move_{i}_accuracy': move['accuracy'], f'move_{i}_max_pp': move['pp'],
+                    f'move_{i}_current_pp': move['pp'],
+                })
+            rows.append(row)
+    return rows
+
+
+def team_rows(snapshot, seed=0):
+    """
+    The rows load_teams reads for a user with TEAMS_PER_USER full teams.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for team_id in range(1, TEAMS_PER_USER + 1):
+        for pokemon in rng.sample(snapshot.pokemon, TEAM_SIZE):
+            rows.append({'user_team_id': team_id, 'team_name': f'Team {team_id}',
+                         'pokedex_name': pokemon['name']})
+    return rows
+
+
+class RowsCursor:
+    """
+    Just enough of a DictCursor to feed load_battle_state fixed rows.
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def execute(self, query, args=None):
+        return len(self._rows)
+
+    def fetchall(self):
+        return self._rows
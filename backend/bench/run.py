@@ -0,0 +1,164 @@
+"""
+Run the micro-benchmarks:
+    python -m bench.run
+    python -m bench.run --save-baseline main
+    python -m bench.run --compare main
+
+Every run writes its results to bench/results/latest.json (--output to
+change). --save-baseline NAME also saves them as bench/baselines/NAME.json;
+--compare NAME exits non-zero when a benchmark's median got slower than
+that baseline by more than its threshold (see cases.py).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+import numpy as np
+
+from bench.cases import BENCHMARKS, Context
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'latest.json')
+
+
+def _baseline_path(name):
+    if name.endswith('.json') or os.sep in name:
+        return name
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(fn, repeat=7, min_time=0.2):
+    """
+    Time fn like timeit: pick a loop count that runs for at least
+        min_time seconds, then time that many calls repeat times.
+        Returns per-call timings in microseconds.
+    """
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2 if number < 1000 else 10
+    runs = [elapsed / number * 1e6 for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'median_us': round(statistics.median(runs), 3),
+        'min_us': round(min(runs), 3),
+        'stdev_us': round(statistics.stdev(runs), 3) if len(runs) > 1 else 0.0,
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(names, repeat, min_time, seed):
+    ctx = Context(seed=seed)
+    results = {}
+    try:
+        for name in names:
+            case = BENCHMARKS[name]
+            fn = case['setup'](ctx)
+            results[name] = measure(fn, repeat=repeat, min_time=min_time)
+            results[name]['threshold_pct'] = case['threshold_pct']
+            print(f"{name:<26} {results[name]['median_us']:>12.2f} us  "
+                  f"(min {results[name]['min_us']:.2f}, stdev {results[name]['stdev_us']:.2f})")
+    finally:
+        ctx.close()
+    return results
+
+
+def compare(results, baseline):
+    """
+    (report lines, regressions) of a run against a baseline. Each
+        benchmark uses its own threshold from this run.
+    """
+    lines = [f"{'benchmark':<26} {'baseline us':>12} {'now us':>12} {'change':>8} {'limit':>7}"]
+    regressions = []
+    for name, result in results.items():
+        old = baseline['benchmarks'].get(name)
+        if old is None:
+            lines.append(f"{name:<26} {'-':>12} {result['median_us']:>12.2f} {'new':>8}")
+            continue
+        change = (result['median_us'] - old['median_us']) / old['median_us'] * 100
+        flag = ''
+        if change > result['threshold_pct']:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        lines.append(f"{name:<26} {old['median_us']:>12.2f} {result['median_us']:>12.2f} "
+                     f"{change:>+7.1f}% {result['threshold_pct']:>6.0f}%{flag}")
+    return lines, regressions
+
+
+def _write(document, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(document, output, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the request-path micro-benchmarks.")
+    parser.add_argument('--filter', default='', help="Only run benchmarks whose name contains this.")
+    parser.add_argument('--repeat', type=int, default=7, help="Timed repeats per benchmark.")
+    parser.add_argument('--min-time', type=float, default=0.2, help="Minimum seconds per repeat.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="Where to write this run's results.")
+    parser.add_argument('--save-baseline', metavar='NAME', help="Also save the results as a baseline.")
+    parser.add_argument('--compare', metavar='NAME', help="Compare with a saved baseline.")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if not names:
+        parser.error(f"no benchmark matches {args.filter!r}")
+
+    results = run_benchmarks(names, args.repeat, args.min_time, args.seed)
+    document = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'git_commit': _git_commit(),
+        },
+        'seed': args.seed,
+        'benchmarks': results,
+    }
+    _write(document, args.output)
+
+    status = 0
+    if args.compare:
+        with open(_baseline_path(args.compare), encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"\nCompared with {args.compare} ({baseline['created_at']}, "
+              f"commit {baseline['environment'].get('git_commit') or '?'}):")
+        if baseline['environment'].get('machine') != document['environment']['machine'] or \
+                baseline['environment'].get('python') != document['environment']['python']:
+            print("Warning: the baseline was taken with a different Python or machine.")
+        lines, regressions = compare(results, baseline)
+        print('\n'.join(lines))
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}")
+            status = 1
+
+    if args.save_baseline:
+        path = _baseline_path(args.save_baseline)
+        _write(document, path)
+        print(f"\nSaved baseline to {path}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""
+Load tests against a running instance of the app.
+
+setup_db.py creates a local MySQL database with the schema, the stored
+procedures under sql/ and a small seeded Pokedex. run.py then drives the
+app with scripted user journeys (see journeys.py) from many threads and
+reports throughput and latency percentiles per endpoint, optionally saved
+as a baseline and compared against an earlier one.
+"""
@@ -0,0 +1,246 @@
+"""
+Fill a local database with synthetic players at scale:
+    python -m loadtest.generate --users 200000 --seed 1
+
+Generates users, user_teams, user_poke_team_members and battles (plus
+the user_stats/user_gym_clears rollups) for the profile, leaderboard and
+battle history paths. Every random choice comes from --seed, so the same
+arguments against the same seeded database produce the same rows. Rows
+are written with multi-row INSERTs in batches, one transaction per batch
+of users, with unique and foreign key checks off during the load.
+
+Run loadtest.setup_db first; teams are built from the Pokedex, learnsets
+and gyms already in the database.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+from app.stats import rebuild_user_stats
+from loadtest.setup_db import connect
+
+INSERT_USERS = """
+    INSERT INTO users (user_id, user_name, pwd, email, is_active, badge_level)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+INSERT_TEAMS = """
+    INSERT INTO user_teams (user_team_id, user_id, team_name, is_active)
+    VALUES (%s, %s, %s, %s)
+"""
+INSERT_MEMBERS = """
+    INSERT INTO user_poke_team_members (
+        user_team_id, user_team_member_id, pokedex_id,
+        move_1_id, move_2_id, move_3_id, move_4_id,
+        move_1_current_pp, move_2_current_pp, move_3_current_pp, move_4_current_pp
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+INSERT_BATTLES = """
+    INSERT INTO battles (battle_id, user_team_id, gym_id, start_time, end_time, win_loss_outcome)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+
+def int_range(text):
+    """
+    "3" or "1-5" -> (low, high), inclusive.
+    """
+    low, _, high = text.partition('-')
+    low, high = int(low), int(high or low)
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"bad range {text!r}")
+    return low, high
+
+
+def fraction(text):
+    value = float(text)
+    if not 0 <= value <= 1:
+        raise argparse.ArgumentTypeError(f"{text} is not between 0 and 1")
+    return value
+
+
+class ReferenceData:
+    """
+    The Pokedex ids, learnsets (with max PP) and gyms teams are built from.
+    """
+
+    def __init__(self, cursor):
+        cursor.execute("SELECT move_id, pp FROM moves ORDER BY move_id;")
+        max_pp = dict(cursor.fetchall())
+        cursor.execute("SELECT pokedex_id, move_id FROM pokemon_moves ORDER BY pokedex_id, move_id;")
+        learnsets = {}
+        for pokedex_id, move_id in cursor.fetchall():
+            learnsets.setdefault(pokedex_id, []).append((move_id, max_pp[move_id]))
+        # Only Pokemon that can fill all four move slots
+        self.learnsets = {pokedex_id: moves for pokedex_id, moves in learnsets.items() if len(moves) >= 4}
+        self.pokedex_ids = sorted(self.learnsets)
+        cursor.execute("SELECT gym_id FROM gym_leaders ORDER BY gym_id;")
+        self.gym_ids = [row[0] for row in cursor.fetchall()]
+        if not self.pokedex_ids or not self.gym_ids:
+            raise SystemExit("The database has no Pokedex or gyms; run python -m loadtest.setup_db first.")
+
+
+class Generator:
+    """
+    Produces the rows of consecutive users. Ids continue after the
+        largest ones already in the database.
+    """
+
+    def __init__(self, args, reference, next_ids):
+        self.args = args
+        self.reference = reference
+        self.rng = random.Random(args.seed)
+        self.next_user_id, self.next_team_id, self.next_battle_id = next_ids
+        self.start = datetime.datetime.combine(args.start, datetime.time())
+        self.span_seconds = int(args.days * 86400)
+        # Per-gym difficulty: later gyms are a bit harder to beat
+        count = len(reference.gym_ids)
+        self.gym_penalty = {
+            gym_id: args.gym_difficulty * i / max(count - 1, 1)
+            for i, gym_id in enumerate(reference.gym_ids)
+        }
+
+    def _skill(self):
+        # Each player's chance to win, spread around --win-rate
+        mean = min(max(self.args.win_rate, 0.01), 0.99)
+        concentration = 1 / max(self.args.win_rate_spread, 1e-3)
+        return self.rng.betavariate(mean * concentration, (1 - mean) * concentration)
+
+    def users(self, count):
+        """
+        Rows for the next count users: (users, teams, members, battles).
+        """
+        rng = self.rng
+        args = self.args
+        users, teams, members, battles = [], [], [], []
+
+        for _ in range(count):
+            user_id = self.next_user_id
+            self.next_user_id += 1
+            joined = rng.randrange(max(self.span_seconds, 1))
+            skill = self._skill()
+            users.append((user_id, f'{args.prefix}{user_id:09d}', 'password',
+                          f'{args.prefix}{user_id}@example.com', 1, None))
+
+            for team_number in range(rng.randint(*args.teams_per_user)):
+                team_id = self.next_team_id
+                self.next_team_id += 1
+                teams.append((team_id, user_id, f'Team {team_number + 1}', 1))
+
+                size = rng.randint(*args.team_size)
+                for member_id, pokedex_id in enumerate(rng.sample(self.reference.pokedex_ids, size), start=1):
+                    moves = rng.sample(self.reference.learnsets[pokedex_id], 4)
+                    members.append((team_id, member_id, pokedex_id,
+                                    *[move_id for move_id, _ in moves], *[pp for _, pp in moves]))
+
+                if size == 0:
+                    continue
+                for _ in range(rng.randint(*args.battles_per_team)):
+                    battles.append(self._battle(team_id, joined, skill))
+        return users, teams, members, battles
+
+    def _battle(self, team_id, joined, skill):
+        rng = self.rng
+        args = self.args
+        battle_id = self.next_battle_id
+        self.next_battle_id += 1
+
+        gym_id = rng.choice(self.reference.gym_ids)
+        offset = joined + rng.randrange(max(self.span_seconds - joined, 1))
+        start_time = self.start + datetime.timedelta(seconds=offset)
+        if rng.random() < args.unfinished:
+            # Still in progress (or abandoned)
+            return battle_id, team_id, gym_id, start_time, None, None
+        duration = rng.randint(*args.battle_seconds)
+        won = rng.random() < max(skill - self.gym_penalty[gym_id], 0.0)
+        return battle_id, team_id, gym_id, start_time, start_time + datetime.timedelta(seconds=duration), int(won)
+
+
+def _next_ids(cursor):
+    ids = []
+    for table, column in (('users', 'user_id'), ('user_teams', 'user_team_id'), ('battles', 'battle_id')):
+        cursor.execute(f"SELECT COALESCE(MAX({column}), 0) + 1 FROM {table};")
+        ids.append(cursor.fetchone()[0])
+    return ids
+
+
+def _insert(cursor, statement, rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        # pymysql turns executemany of an INSERT ... VALUES into multi-row INSERTs
+        cursor.executemany(statement, rows[i:i + batch_size])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic players, teams and battles.")
+    parser.add_argument('--database', default=os.environ.get('DB_NAME', 'pokemon_battle_db'),
+                        help="Database to fill (default: DB_NAME).")
+    parser.add_argument('--users', type=int, default=100000, help="Players to create.")
+    parser.add_argument('--teams-per-user', type=int_range, default=(1, 4), help="e.g. 1-4")
+    parser.add_argument('--team-size', type=int_range, default=(6, 6), help="Pokemon per team, e.g. 3-6")
+    parser.add_argument('--battles-per-team', type=int_range, default=(0, 30), help="e.g. 0-30")
+    parser.add_argument('--win-rate', type=fraction, default=0.5, help="Average chance to win a battle.")
+    parser.add_argument('--win-rate-spread', type=fraction, default=0.2,
+                        help="How much players' skill varies (0 = everyone plays at --win-rate).")
+    parser.add_argument('--gym-difficulty', type=fraction, default=0.2,
+                        help="How much less likely a win is against the last gym than the first.")
+    parser.add_argument('--battle-seconds', type=int_range, default=(60, 900), help="Battle lengths, e.g. 60-900")
+    parser.add_argument('--unfinished', type=fraction, default=0.02, help="Share of battles never finished.")
+    parser.add_argument('--start', type=datetime.date.fromisoformat,
+                        default=datetime.date(2025, 1, 1), help="First day of battle history (YYYY-MM-DD).")
+    parser.add_argument('--days', type=float, default=365, help="Length of the battle history in days.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--prefix', default='gen', help="Start of every generated user name.")
+    parser.add_argument('--users-per-transaction', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=5000, help="Rows per INSERT batch.")
+    parser.add_argument('--skip-stats', action='store_true', help="Don't rebuild user_stats afterwards.")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.database)
+    conn.autocommit(False)
+
+    totals = {'users': 0, 'user_teams': 0, 'user_poke_team_members': 0, 'battles': 0}
+    started = time.monotonic()
+    try:
+        with conn.cursor() as cursor:
+            reference = ReferenceData(cursor)
+            generator = Generator(args, reference, _next_ids(cursor))
+            cursor.execute("SET unique_checks = 0, foreign_key_checks = 0;")
+
+            remaining = args.users
+            while remaining > 0:
+                count = min(remaining, args.users_per_transaction)
+                users, teams, members, battles = generator.users(count)
+                _insert(cursor, INSERT_USERS, users, args.batch_size)
+                _insert(cursor, INSERT_TEAMS, teams, args.batch_size)
+                _insert(cursor, INSERT_MEMBERS, members, args.batch_size)
+                _insert(cursor, INSERT_BATTLES, battles, args.batch_size)
+                conn.commit()
+                remaining -= count
+
+                totals['users'] += len(users)
+                totals['user_teams'] += len(teams)
+                totals['user_poke_team_members'] += len(members)
+                totals['battles'] += len(battles)
+                elapsed = time.monotonic() - started
+                rows = sum(totals.values())
+                print(f"{totals['users']}/{args.users} users, {rows} rows "
+                      f"({rows / elapsed:,.0f} rows/s)", flush=True)
+
+            cursor.execute("SET unique_checks = 1, foreign_key_checks = 1;")
+            if not args.skip_stats:
+                print("Rebuilding user_stats and user_gym_clears...", flush=True)
+                rebuild_user_stats(cursor)
+                conn.commit()
+    finally:
+        conn.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Done in {elapsed:.1f}s: " + ', '.join(f"{count} {table}" for table, count in totals.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Scripted user journeys.
+
+A journey plays one new player through the game the way the pages do:
+sign up, log back in, browse the Pokedex, build a team of six, choose four
+moves for each member, battle a gym leader until one side has no Pokemon
+left, then look at the profile, badges and leaderboard. Every request is
+timed under a stable endpoint name (e.g. "battle.round"). Redirects aren't
+followed, so each timing covers exactly one request to the app.
+"""
+import html
+import json
+import re
+import string
+import time
+
+import requests
+
+CHECKBOX = re.compile(r'name="moves_(\d+)" value="([^"]*)"')
+ADD_POKEMON = re.compile(r'name="add_pokemon" value="([^"]*)"')
+BATTLE_DATA = re.compile(r'data-(battle-id|player-member-id|opponent-member-id)="(\d+)"')
+ROSTER = re.compile(r'<script id="battle-roster" type="application/json">(.*?)</script>', re.S)
+
+# Letters players start searching with; every seeded name contains several
+SEARCH_LETTERS = 'abcdeghilmnoprstuvy'
+
+
+class JourneyError(Exception):
+    """
+    A step got an unexpected response; the rest of the journey is skipped.
+    """
+
+    def __init__(self, step, message):
+        super().__init__(f"{step}: {message}")
+        self.step = step
+
+
+def _usable(member):
+    """
+    Move slots with PP left, as the battle page shows them.
+    """
+    return [slot for slot, move in enumerate(member['moves'], start=1)
+            if move['move_name'] is not None and (move['current_pp'] or 0) > 0]
+
+
+class Journey:
+
+    def __init__(self, base_url, recorder, rng, user_name, gym_ids, team_size=6, max_rounds=300,
+                 timeout=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.rng = rng
+        self.user_name = user_name
+        self.password = f'pw-{user_name}'
+        self.gym_ids = gym_ids
+        self.team_size = team_size
+        self.max_rounds = max_rounds
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _call(self, step, method, path, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(step, time.perf_counter() - start, 'error', ok=False)
+            raise JourneyError(step, str(e))
+        elapsed = time.perf_counter() - start
+
+        ok = response.status_code in expect
+        self.recorder.record(step, elapsed, response.status_code, ok)
+        if not ok:
+            raise JourneyError(step, f"HTTP {response.status_code}")
+        return response
+
+    def _json(self, step, response):
+        try:
+            return response.json()
+        except ValueError:
+            raise JourneyError(step, "response is not JSON")
+
+    # ---- steps ----
+
+    def sign_up(self):
+        self._call('auth.signup', 'POST', '/auth/', expect=(302,), data={
+            'form_type': 'signup', 'user_id': self.user_name,
+            'pwd': self.password, 'email': f'{self.user_name}@example.com',
+        })
+
+    def log_in(self):
+        # Start from a fresh session, like a returning player
+        self.session.cookies.clear()
+        self._call('auth.login_page', 'GET', '/auth/')
+        self._call('auth.login', 'POST', '/auth/', expect=(302,), data={
+            'form_type': 'login', 'user_id': self.user_name,
+            'pwd': self.password, 'email': f'{self.user_name}@example.com',
+        })
+        self._call('home.homepage', 'GET', '/home')
+
+    def browse_pokedex(self):
+        self._call('pokedex.listing', 'GET', '/pokedex/')
+
+    def build_team(self):
+        self._call('teams.new', 'GET', '/teams/new', expect=(302,))
+        self._call('teams.create_page', 'GET', '/teams/create')
+        self._call('teams.save_name', 'POST', '/teams/save-name', expect=(302,),
+                   data={'team_name': f'{self.user_name} team'})
+
+        team = []
+        for attempt in range(self.team_size * 5):
+            if len(team) == self.team_size:
+                break
+            letter = self.rng.choice(SEARCH_LETTERS)
+            page = self._call('teams.search', 'POST', '/teams/create', data={'pokemon_search': letter}).text
+            candidates = [html.unescape(name) for name in ADD_POKEMON.findall(page)]
+            candidates = [name for name in candidates if name not in team]
+            if not candidates:
+                continue
+            name = self.rng.choice(candidates)
+            self._call('teams.add', 'POST', '/teams/add', expect=(302,), data={'add_pokemon': name})
+            team.append(name)
+        if not team:
+            raise JourneyError('teams.search', "no Pokemon found")
+
+        self._call('teams.update', 'POST', '/teams/update', expect=(302,),
+                   data={f'pokemon{i}': name for i, name in enumerate(team)})
+        return team
+
+    def choose_moves(self):
+        page = self._call('teams.choose_moves', 'GET', '/teams/choose_moves').text
+
+        learnsets = {}
+        for pokedex_id, move_name in CHECKBOX.findall(page):
+            learnsets.setdefault(pokedex_id, []).append(html.unescape(move_name))
+
+        form = []
+        for pokedex_id, move_names in learnsets.items():
+            if len(move_names) < 4:
+                raise JourneyError('teams.choose_moves', f"Pokemon {pokedex_id} knows fewer than 4 moves")
+            for move_name in self.rng.sample(move_names, 4):
+                form.append((f'moves_{pokedex_id}', move_name))
+        self._call('teams.save_moves', 'POST', '/teams/save_moves', expect=(302,), data=form)
+        self._call('home.teams', 'GET', '/teams')
+
+    def battle(self):
+        """
+        Play one battle to the end. Returns ('won' | 'lost' | 'stalled', rounds).
+        """
+        self._call('home.battle_select', 'GET', '/battle')
+        gym_id = self.rng.choice(self.gym_ids)
+        page = self._call('battle.start', 'GET', f'/battle/start/{gym_id}').text
+        data = dict(BATTLE_DATA.findall(page))
+        roster = ROSTER.search(page)
+        if len(data) != 3 or roster is None:
+            raise JourneyError('battle.start', "battle page is missing its battle data")
+
+        battle_id = int(data['battle-id'])
+        player_id = int(data['player-member-id'])
+        opponent_id = int(data['opponent-member-id'])
+        # The player's team as the page keeps it: HP and PP of every member,
+        # updated from round results instead of asking the server again
+        team = {member['member_id']: member for member in json.loads(roster.group(1))['player_team']}
+        usable = _usable(team[player_id])
+
+        for rounds in range(1, self.max_rounds + 1):
+            if not usable:
+                return 'stalled', rounds - 1
+
+            response = self._call('battle.round', 'POST', '/battle/api/round', json={
+                'battle_id': battle_id, 'action': 'move', 'move_slot': self.rng.choice(usable),
+                'player_member_id': player_id, 'opponent_member_id': opponent_id,
+            })
+            result = self._json('battle.round', response)
+            if not result.get('success'):
+                raise JourneyError('battle.round', result.get('message', 'round failed'))
+
+            player_turn = result['player_turn']
+            pps = player_turn.get('player_move_pps') or {}
+            for slot, move in enumerate(team[player_id]['moves'], start=1):
+                if move['move_name'] is not None:
+                    move['current_pp'] = pps.get(f'move_{slot}_current_pp') or 0
+            usable = _usable(team[player_id])
+
+            ai_switch = player_turn.get('ai_switch_info') or {}
+            if ai_switch.get('game_over'):
+                return 'won', rounds
+            if 'gym_team_member_id' in ai_switch:
+                opponent_id = ai_switch['gym_team_member_id']
+
+            ai_turn = result.get('ai_turn') or {}
+            if ai_turn.get('game_over') or result.get('game_over'):
+                return 'lost', rounds
+            team[player_id]['current_hp'] = ai_turn.get('player_hp', player_turn['player_hp'])
+            if ai_turn.get('opponent_switch'):
+                opponent_id = ai_turn['opponent_switch']['gym_team_member_id']
+            forced = ai_turn.get('force_player_switch')
+            if forced:
+                player_id, opponent_id = self._switch(battle_id, team, player_id, opponent_id,
+                                                      forced['user_team_member_id'])
+                usable = _usable(team[player_id]) if player_id is not None else []
+                if player_id is None:
+                    return 'lost', rounds
+
+        return 'stalled', self.max_rounds
+
+    def _switch(self, battle_id, team, fainted_id, opponent_id, suggested_id):
+        """
+        Send out another Pokemon after one fainted, like the team menu
+            does: pick from the team the page already has, then play the
+            switch as a round (the gym leader replies to it). Returns
+            (member in play, opponent in play).
+        """
+        alive = [member_id for member_id, member in team.items() if member['current_hp'] > 0]
+        if not alive:
+            return None, opponent_id
+        member_id = suggested_id if suggested_id in alive else alive[0]
+
+        result = self._json('battle.round', self._call('battle.round', 'POST', '/battle/api/round', json={
+            'battle_id': battle_id, 'action': 'switch', 'switch_to_member_id': member_id,
+            'player_member_id': fainted_id, 'opponent_member_id': opponent_id,
+        }))
+        if not result.get('success'):
+            raise JourneyError('battle.round', result.get('message', 'switch failed'))
+        ai_turn = result.get('ai_turn') or {}
+        if ai_turn.get('game_over'):
+            return None, opponent_id
+        if 'player_hp' in ai_turn:
+            team[member_id]['current_hp'] = ai_turn['player_hp']
+        if ai_turn.get('opponent_switch'):
+            opponent_id = ai_turn['opponent_switch']['gym_team_member_id']
+        if ai_turn.get('force_player_switch'):
+            # The new Pokemon fainted straight away
+            return self._switch(battle_id, team, member_id, opponent_id,
+                                ai_turn['force_player_switch']['user_team_member_id'])
+        return member_id, opponent_id
+
+    def view_progress(self):
+        self._call('home.profile', 'GET', '/profile')
+        self._call('home.badges', 'GET', '/badges')
+        self._call('leaderboard.page', 'GET', '/leaderboard/')
+
+    def run(self):
+        """
+        The whole journey. Returns (outcome, rounds); failures are
+            reported as 'failed: <step>'.
+        """
+        try:
+            self.sign_up()
+            self.log_in()
+            self.browse_pokedex()
+            self.build_team()
+            self.choose_moves()
+            outcome, rounds = self.battle()
+            self.view_progress()
+            return outcome, rounds
+        except JourneyError as e:
+            return f'failed: {e.step}', None
+        finally:
+            self.session.close()
+
+
+def user_name_for(run_id, number):
+    """
+    A unique player name. Fixed width, so no name is a substring of
+        another (login matches names with LIKE '%name%').
+    """
+    return f'lt{run_id}u{number:07d}'
+
+
+def new_run_id(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(6))
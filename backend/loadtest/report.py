@@ -0,0 +1,181 @@
+"""
+Latency samples, per-endpoint percentiles and saved baselines.
+"""
+import json
+import math
+import os
+import threading
+import time
+
+
+class Recorder:
+    """
+    Collects one (latency, ok) sample per request, grouped by endpoint
+        name. Shared by every virtual user thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # endpoint -> {'latencies': [seconds], 'errors': int, 'statuses': {status: count}}
+        self._endpoints = {}
+        # outcome -> count ('won', 'lost', 'stalled', 'failed: <step>', ...)
+        self._journeys = {}
+        self._rounds = []
+
+    def record(self, endpoint, elapsed, status, ok):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {'latencies': [], 'errors': 0, 'statuses': {}})
+            entry['latencies'].append(elapsed)
+            if not ok:
+                entry['errors'] += 1
+            key = str(status)
+            entry['statuses'][key] = entry['statuses'].get(key, 0) + 1
+
+    def journey_finished(self, outcome, rounds=None):
+        with self._lock:
+            self._journeys[outcome] = self._journeys.get(outcome, 0) + 1
+            if rounds is not None:
+                self._rounds.append(rounds)
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {
+                name: {'latencies': list(entry['latencies']), 'errors': entry['errors'],
+                       'statuses': dict(entry['statuses'])}
+                for name, entry in self._endpoints.items()
+            }
+            return endpoints, dict(self._journeys), list(self._rounds)
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def _latency_stats(latencies, errors, wall_seconds):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'count': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'rps': round(count / wall_seconds, 2) if wall_seconds else 0.0,
+        'mean_ms': round(sum(latencies) / count * 1000, 2) if count else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if count else 0.0,
+    }
+
+
+def summarize(recorder, wall_seconds, config=None):
+    """
+    Everything a run reports, in the shape saved as a baseline.
+    """
+    endpoints, journeys, rounds = recorder.snapshot()
+
+    summary = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'config': config or {},
+        'wall_seconds': round(wall_seconds, 3),
+        'endpoints': {},
+        'journeys': {
+            'outcomes': journeys,
+            'completed': sum(count for outcome, count in journeys.items() if not outcome.startswith('failed')),
+            'per_second': round(sum(journeys.values()) / wall_seconds, 3) if wall_seconds else 0.0,
+            'mean_rounds': round(sum(rounds) / len(rounds), 1) if rounds else 0.0,
+        },
+    }
+
+    all_latencies = []
+    all_errors = 0
+    for name in sorted(endpoints):
+        entry = endpoints[name]
+        summary['endpoints'][name] = _latency_stats(entry['latencies'], entry['errors'], wall_seconds)
+        summary['endpoints'][name]['statuses'] = entry['statuses']
+        all_latencies.extend(entry['latencies'])
+        all_errors += entry['errors']
+    summary['total'] = _latency_stats(all_latencies, all_errors, wall_seconds)
+    return summary
+
+
+def format_summary(summary):
+    lines = [
+        f"{'endpoint':<24} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'p99 ms':>9} {'max ms':>9}"
+    ]
+    rows = list(summary['endpoints'].items()) + [('TOTAL', summary['total'])]
+    for name, stats in rows:
+        lines.append(
+            f"{name:<24} {stats['count']:>7} {stats['errors']:>5} {stats['rps']:>8.2f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.2f}"
+        )
+
+    journeys = summary['journeys']
+    outcomes = ', '.join(f"{outcome}: {count}" for outcome, count in sorted(journeys['outcomes'].items()))
+    lines.append("")
+    lines.append(f"{summary['wall_seconds']:.1f}s, {journeys['completed']} journeys completed "
+                 f"({journeys['per_second']:.2f}/s, {journeys['mean_rounds']} rounds per battle)")
+    lines.append(f"outcomes: {outcomes or '-'}")
+    return '\n'.join(lines)
+
+
+def save_baseline(summary, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(summary, baseline_file, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+
+def _change(new, old):
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(summary, baseline, max_regression_pct=20.0, min_samples=20):
+    """
+    Compare a run's p50/p95/p99 and throughput with a saved baseline.
+        Returns (report lines, regressions), where a regression is an
+        endpoint whose p95 grew by more than max_regression_pct. Endpoints
+        with fewer than min_samples requests in either run are shown but
+        never count as regressions.
+    """
+    lines = [
+        f"{'endpoint':<24} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'req/s':>15}"
+    ]
+    regressions = []
+
+    def cell(new, old, width):
+        change = _change(new, old)
+        text = f"{new:.1f}" if change is None else f"{new:.1f} ({change:+.0f}%)"
+        return f"{text:>{width}}"
+
+    names = sorted(set(summary['endpoints']) | set(baseline['endpoints']))
+    for name in names + ['TOTAL']:
+        new = summary['total'] if name == 'TOTAL' else summary['endpoints'].get(name)
+        old = baseline['total'] if name == 'TOTAL' else baseline['endpoints'].get(name)
+        if new is None or old is None:
+            lines.append(f"{name:<24} {'only in ' + ('baseline' if new is None else 'this run'):>17}")
+            continue
+
+        lines.append(
+            f"{name:<24} {cell(new['p50_ms'], old['p50_ms'], 17)} {cell(new['p95_ms'], old['p95_ms'], 17)} "
+            f"{cell(new['p99_ms'], old['p99_ms'], 17)} {cell(new['rps'], old['rps'], 15)}"
+        )
+
+        change = _change(new['p95_ms'], old['p95_ms'])
+        enough = new['count'] >= min_samples and old['count'] >= min_samples
+        if name != 'TOTAL' and enough and change is not None and change > max_regression_pct:
+            regressions.append({'endpoint': name, 'baseline_p95_ms': old['p95_ms'],
+                                'p95_ms': new['p95_ms'], 'change_pct': round(change, 1)})
+    return lines, regressions
@@ -0,0 +1,141 @@
+"""
+Run the load test against a running app:
+    python -m loadtest.run --base-url http://127.0.0.1:5000 --users 20 --duration 120
+
+Each virtual user is a thread that plays journeys (journeys.py) back to
+back, each one as a new player, until the duration is up or it has
+played --journeys of them. Prints throughput and p50/p95/p99 per endpoint.
+--save-baseline NAME writes the results to loadtest/baselines/NAME.json;
+--compare NAME diffs this run against that file and exits non-zero when
+an endpoint's p95 regressed by more than --max-regression percent.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loadtest.journeys import Journey, new_run_id, user_name_for
+from loadtest.report import Recorder, compare, format_summary, load_baseline, save_baseline, summarize
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def _baseline_path(name):
+    if name.endswith('.json') or os.sep in name:
+        return name
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load(args, recorder):
+    """
+    Start every virtual user (spread over --ramp-up seconds) and wait
+        for them to finish.
+    """
+    # Fresh player names every run, so runs can share a database
+    run_id = new_run_id(random.Random())
+    deadline = time.monotonic() + args.duration if args.duration else None
+    counter = iter(range(1, sys.maxsize))
+    counter_lock = threading.Lock()
+
+    def virtual_user(number):
+        # Per-user RNG: the same seed replays the same choices per user
+        rng = random.Random(f'{args.seed}-{number}')
+        if args.ramp_up:
+            time.sleep(args.ramp_up * number / args.users)
+        played = 0
+        while (args.journeys is None or played < args.journeys) and \
+                (deadline is None or time.monotonic() < deadline):
+            with counter_lock:
+                user_number = next(counter)
+            journey = Journey(args.base_url, recorder, rng, user_name_for(run_id, user_number),
+                              args.gym_ids, team_size=args.team_size, max_rounds=args.max_rounds,
+                              timeout=args.timeout)
+            outcome, rounds = journey.run()
+            recorder.journey_finished(outcome, rounds)
+            played += 1
+
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for future in [pool.submit(virtual_user, number) for number in range(args.users)]:
+            future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the app with scripted user journeys.")
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000', help="Where the app is running.")
+    parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users.")
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help="Seconds to keep starting journeys (0 = no limit, needs --journeys).")
+    parser.add_argument('--journeys', type=int, default=None, help="Journeys per virtual user.")
+    parser.add_argument('--ramp-up', type=float, default=5.0, help="Seconds over which users start.")
+    parser.add_argument('--gym-ids', type=lambda text: [int(gym_id) for gym_id in text.split(',')],
+                        default=[1, 2, 3, 4], help="Comma-separated gyms to battle.")
+    parser.add_argument('--team-size', type=int, default=6)
+    parser.add_argument('--max-rounds', type=int, default=300, help="Give up on a battle after this many rounds.")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout in seconds.")
+    parser.add_argument('--seed', default='0', help="Seed for every player's choices.")
+    parser.add_argument('--save-baseline', metavar='NAME', help="Save the results as a baseline.")
+    parser.add_argument('--compare', metavar='NAME', help="Compare the results with a saved baseline.")
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help="Allowed p95 increase over the baseline, in percent.")
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help="Fail the run above this share of failed requests.")
+    args = parser.parse_args(argv)
+
+    if not args.duration and args.journeys is None:
+        parser.error("--duration 0 needs --journeys")
+
+    recorder = Recorder()
+    start = time.monotonic()
+    try:
+        run_load(args, recorder)
+    except KeyboardInterrupt:
+        print("Interrupted; reporting what ran so far.", file=sys.stderr)
+    wall_seconds = time.monotonic() - start
+
+    config = {
+        'base_url': args.base_url, 'users': args.users, 'duration': args.duration,
+        'journeys': args.journeys, 'gym_ids': args.gym_ids, 'seed': args.seed,
+        'git_commit': _git_commit(),
+    }
+    summary = summarize(recorder, wall_seconds, config)
+    print(format_summary(summary))
+
+    status = 0
+    if summary['total']['error_rate'] > args.max_error_rate:
+        print(f"\nError rate {summary['total']['error_rate']:.2%} is above {args.max_error_rate:.2%}")
+        status = 1
+
+    if args.compare:
+        baseline = load_baseline(_baseline_path(args.compare))
+        lines, regressions = compare(summary, baseline, max_regression_pct=args.max_regression)
+        print(f"\nCompared with {args.compare} ({baseline['created_at']}, "
+              f"commit {baseline['config'].get('git_commit') or '?'}):")
+        print('\n'.join(lines))
+        for regression in regressions:
+            print(f"p95 of {regression['endpoint']} went from {regression['baseline_p95_ms']} ms "
+                  f"to {regression['p95_ms']} ms ({regression['change_pct']:+}%)")
+        if regressions:
+            status = 1
+
+    if args.save_baseline:
+        path = _baseline_path(args.save_baseline)
+        save_baseline(summary, path)
+        print(f"\nSaved baseline to {path}")
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+-- Base tables for a local load-test database
+--
+-- The same tables (and columns) the app reads and writes on Cloud SQL.
+-- setup_db.py applies this file first, then sql/battle_instances.sql,
+-- sql/user_stats.sql, sql/leaderboard.sql and finally seed.sql.
+
+CREATE TABLE IF NOT EXISTS pokedex_entries (
+    pokedex_id INT NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    pType_1 VARCHAR(20) NOT NULL,
+    pType_2 VARCHAR(20) NULL,
+    hp INT NOT NULL,
+    attack INT NOT NULL,
+    defense INT NOT NULL,
+    image_url VARCHAR(255) NULL,
+    PRIMARY KEY (pokedex_id),
+    UNIQUE KEY (name)
+);
+
+CREATE TABLE IF NOT EXISTS moves (
+    move_id INT NOT NULL,
+    move_name VARCHAR(100) NOT NULL,
+    move_type VARCHAR(20) NOT NULL,
+    category VARCHAR(20) NOT NULL,
+    move_power INT NULL,
+    accuracy INT NULL,
+    pp INT NOT NULL,
+    PRIMARY KEY (move_id),
+    UNIQUE KEY (move_name)
+);
+
+CREATE TABLE IF NOT EXISTS pokemon_moves (
+    pokedex_id INT NOT NULL,
+    move_id INT NOT NULL,
+    PRIMARY KEY (pokedex_id, move_id),
+    FOREIGN KEY (pokedex_id) REFERENCES pokedex_entries (pokedex_id),
+    FOREIGN KEY (move_id) REFERENCES moves (move_id)
+);
+
+CREATE TABLE IF NOT EXISTS type_matchups (
+    attacking_type VARCHAR(20) NOT NULL,
+    defending_type VARCHAR(20) NOT NULL,
+    multiplier DECIMAL(3, 1) NOT NULL,
+    PRIMARY KEY (attacking_type, defending_type)
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INT NOT NULL AUTO_INCREMENT,
+    user_name VARCHAR(100) NOT NULL,
+    pwd VARCHAR(255) NOT NULL,
+    email VARCHAR(255) NULL,
+    is_active TINYINT NOT NULL DEFAULT 1,
+    badge_level VARCHAR(20) NULL,
+    PRIMARY KEY (user_id),
+    UNIQUE KEY (user_name)
+);
+
+CREATE TABLE IF NOT EXISTS user_teams (
+    user_team_id INT NOT NULL AUTO_INCREMENT,
+    user_id INT NOT NULL,
+    team_name VARCHAR(100) NOT NULL,
+    is_active TINYINT NOT NULL DEFAULT 1,
+    PRIMARY KEY (user_team_id),
+    KEY (user_id),
+    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS user_poke_team_members (
+    user_team_id INT NOT NULL,
+    user_team_member_id INT NOT NULL,
+    pokedex_id INT NOT NULL,
+    move_1_id INT NULL,
+    move_2_id INT NULL,
+    move_3_id INT NULL,
+    move_4_id INT NULL,
+    move_1_current_pp INT NULL,
+    move_2_current_pp INT NULL,
+    move_3_current_pp INT NULL,
+    move_4_current_pp INT NULL,
+    PRIMARY KEY (user_team_id, user_team_member_id),
+    FOREIGN KEY (user_team_id) REFERENCES user_teams (user_team_id) ON DELETE CASCADE,
+    FOREIGN KEY (pokedex_id) REFERENCES pokedex_entries (pokedex_id)
+);
+
+CREATE TABLE IF NOT EXISTS gym_leaders (
+    gym_id INT NOT NULL,
+    gym_name VARCHAR(100) NOT NULL,
+    gym_leader VARCHAR(100) NOT NULL,
+    badge_title VARCHAR(100) NOT NULL,
+    badge_image VARCHAR(255) NULL,
+    gym_theme_img VARCHAR(255) NULL,
+    PRIMARY KEY (gym_id)
+);
+
+CREATE TABLE IF NOT EXISTS gym_leader_team_members (
+    gym_id INT NOT NULL,
+    gym_team_member_id INT NOT NULL,
+    pokedex_id INT NOT NULL,
+    move_1_id INT NULL,
+    move_2_id INT NULL,
+    move_3_id INT NULL,
+    move_4_id INT NULL,
+    PRIMARY KEY (gym_id, gym_team_member_id),
+    FOREIGN KEY (gym_id) REFERENCES gym_leaders (gym_id),
+    FOREIGN KEY (pokedex_id) REFERENCES pokedex_entries (pokedex_id)
+);
+
+CREATE TABLE IF NOT EXISTS battles (
+    battle_id INT NOT NULL AUTO_INCREMENT,
+    user_team_id INT NOT NULL,
+    gym_id INT NOT NULL,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NOT NULL,
+    win_loss_outcome TINYINT NOT NULL,
+    PRIMARY KEY (battle_id),
+    KEY (user_team_id),
+    FOREIGN KEY (user_team_id) REFERENCES user_teams (user_team_id) ON DELETE CASCADE,
+    FOREIGN KEY (gym_id) REFERENCES gym_leaders (gym_id)
+);
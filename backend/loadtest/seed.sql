@@ -0,0 +1,133 @@
+-- Reference data for a local load-test database
+--
+-- A small Kanto Pokedex, its moves and learnsets, the type chart and four
+-- gym leaders with their teams. Enough for every page and a full battle;
+-- users, teams and battles are created by the load test itself.
+
+INSERT INTO pokedex_entries (pokedex_id, name, pType_1, pType_2, hp, attack, defense, image_url) VALUES
+    (1, 'Bulbasaur', 'Grass', 'Poison', 45, 49, 49, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/1.png'),
+    (3, 'Venusaur', 'Grass', 'Poison', 80, 82, 83, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/3.png'),
+    (4, 'Charmander', 'Fire', NULL, 39, 52, 43, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/4.png'),
+    (6, 'Charizard', 'Fire', 'Flying', 78, 84, 78, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/6.png'),
+    (7, 'Squirtle', 'Water', NULL, 44, 48, 65, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/7.png'),
+    (9, 'Blastoise', 'Water', NULL, 79, 83, 100, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/9.png'),
+    (16, 'Pidgey', 'Normal', 'Flying', 40, 45, 40, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/16.png'),
+    (18, 'Pidgeot', 'Normal', 'Flying', 83, 80, 75, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/18.png'),
+    (25, 'Pikachu', 'Electric', NULL, 35, 55, 40, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/25.png'),
+    (26, 'Raichu', 'Electric', NULL, 60, 90, 55, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/26.png'),
+    (27, 'Sandshrew', 'Ground', NULL, 50, 75, 85, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/27.png'),
+    (43, 'Oddish', 'Grass', 'Poison', 45, 50, 55, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/43.png'),
+    (45, 'Vileplume', 'Grass', 'Poison', 75, 80, 85, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/45.png'),
+    (50, 'Diglett', 'Ground', NULL, 10, 55, 25, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/50.png'),
+    (52, 'Meowth', 'Normal', NULL, 40, 45, 35, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/52.png'),
+    (54, 'Psyduck', 'Water', NULL, 50, 52, 48, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/54.png'),
+    (63, 'Abra', 'Psychic', NULL, 25, 20, 15, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/63.png'),
+    (65, 'Alakazam', 'Psychic', NULL, 55, 50, 45, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/65.png'),
+    (66, 'Machop', 'Fighting', NULL, 70, 80, 50, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/66.png'),
+    (71, 'Victreebel', 'Grass', 'Poison', 80, 105, 65, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/71.png'),
+    (74, 'Geodude', 'Rock', 'Ground', 40, 80, 100, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/74.png'),
+    (95, 'Onix', 'Rock', 'Ground', 35, 45, 160, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/95.png'),
+    (100, 'Voltorb', 'Electric', NULL, 40, 30, 50, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/100.png'),
+    (114, 'Tangela', 'Grass', NULL, 65, 55, 115, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/114.png'),
+    (120, 'Staryu', 'Water', NULL, 30, 45, 55, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/120.png'),
+    (121, 'Starmie', 'Water', 'Psychic', 60, 75, 85, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/121.png'),
+    (123, 'Scyther', 'Bug', 'Flying', 70, 110, 80, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/123.png'),
+    (131, 'Lapras', 'Water', 'Ice', 130, 85, 80, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/131.png'),
+    (143, 'Snorlax', 'Normal', NULL, 160, 110, 65, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/143.png'),
+    (149, 'Dragonite', 'Dragon', 'Flying', 91, 134, 95, 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/149.png');
+
+INSERT INTO moves (move_id, move_name, move_type, category, move_power, accuracy, pp) VALUES
+    (1, 'Tackle', 'Normal', 'Physical', 40, 100, 35),
+    (2, 'Scratch', 'Normal', 'Physical', 40, 100, 35),
+    (3, 'Quick Attack', 'Normal', 'Physical', 40, 100, 30),
+    (4, 'Body Slam', 'Normal', 'Physical', 85, 100, 15),
+    (5, 'Hyper Beam', 'Normal', 'Special', 150, 90, 5),
+    (6, 'Headbutt', 'Normal', 'Physical', 70, 100, 15),
+    (7, 'Ember', 'Fire', 'Special', 40, 100, 25),
+    (8, 'Flamethrower', 'Fire', 'Special', 90, 100, 15),
+    (9, 'Fire Blast', 'Fire', 'Special', 110, 85, 5),
+    (10, 'Water Gun', 'Water', 'Special', 40, 100, 25),
+    (11, 'Surf', 'Water', 'Special', 90, 100, 15),
+    (12, 'Hydro Pump', 'Water', 'Special', 110, 80, 5),
+    (13, 'Bubble Beam', 'Water', 'Special', 65, 100, 20),
+    (14, 'Vine Whip', 'Grass', 'Physical', 45, 100, 25),
+    (15, 'Razor Leaf', 'Grass', 'Physical', 55, 95, 25),
+    (16, 'Solar Beam', 'Grass', 'Special', 120, 100, 10),
+    (17, 'Mega Drain', 'Grass', 'Special', 40, 100, 15),
+    (18, 'Thunder Shock', 'Electric', 'Special', 40, 100, 30),
+    (19, 'Thunderbolt', 'Electric', 'Special', 90, 100, 15),
+    (20, 'Thunder', 'Electric', 'Special', 110, 70, 10),
+    (21, 'Rock Throw', 'Rock', 'Physical', 50, 90, 15),
+    (22, 'Rock Slide', 'Rock', 'Physical', 75, 90, 10),
+    (23, 'Mud-Slap', 'Ground', 'Special', 20, 100, 10),
+    (24, 'Earthquake', 'Ground', 'Physical', 100, 100, 10),
+    (25, 'Dig', 'Ground', 'Physical', 80, 100, 10),
+    (26, 'Gust', 'Flying', 'Special', 40, 100, 35),
+    (27, 'Wing Attack', 'Flying', 'Physical', 60, 100, 35),
+    (28, 'Drill Peck', 'Flying', 'Physical', 80, 100, 20),
+    (29, 'Confusion', 'Psychic', 'Special', 50, 100, 25),
+    (30, 'Psychic', 'Psychic', 'Special', 90, 100, 10),
+    (31, 'Psybeam', 'Psychic', 'Special', 65, 100, 20),
+    (32, 'Poison Sting', 'Poison', 'Physical', 15, 100, 35),
+    (33, 'Sludge Bomb', 'Poison', 'Special', 90, 100, 10),
+    (34, 'Ice Beam', 'Ice', 'Special', 90, 100, 10),
+    (35, 'Ice Punch', 'Ice', 'Physical', 75, 100, 15),
+    (36, 'Karate Chop', 'Fighting', 'Physical', 50, 100, 25),
+    (37, 'Low Kick', 'Fighting', 'Physical', 65, 100, 20),
+    (38, 'Bug Bite', 'Bug', 'Physical', 60, 100, 20),
+    (39, 'Growl', 'Normal', 'Status', NULL, 100, 40);
+
+-- Every Pokemon learns the moves of its own types plus the Normal moves
+INSERT INTO pokemon_moves (pokedex_id, move_id)
+SELECT p.pokedex_id, m.move_id
+FROM pokedex_entries p
+JOIN moves m ON m.move_type IN (p.pType_1, COALESCE(p.pType_2, p.pType_1), 'Normal');
+
+-- Non-neutral entries only; missing pairs count as 1.0
+INSERT INTO type_matchups (attacking_type, defending_type, multiplier) VALUES
+    ('Normal', 'Rock', 0.5), ('Normal', 'Ghost', 0.0),
+    ('Fire', 'Fire', 0.5), ('Fire', 'Water', 0.5), ('Fire', 'Grass', 2.0), ('Fire', 'Ice', 2.0),
+    ('Fire', 'Bug', 2.0), ('Fire', 'Rock', 0.5), ('Fire', 'Dragon', 0.5),
+    ('Water', 'Fire', 2.0), ('Water', 'Water', 0.5), ('Water', 'Grass', 0.5), ('Water', 'Ground', 2.0),
+    ('Water', 'Rock', 2.0), ('Water', 'Dragon', 0.5),
+    ('Grass', 'Fire', 0.5), ('Grass', 'Water', 2.0), ('Grass', 'Grass', 0.5), ('Grass', 'Poison', 0.5),
+    ('Grass', 'Ground', 2.0), ('Grass', 'Flying', 0.5), ('Grass', 'Bug', 0.5), ('Grass', 'Rock', 2.0),
+    ('Grass', 'Dragon', 0.5),
+    ('Electric', 'Water', 2.0), ('Electric', 'Grass', 0.5), ('Electric', 'Electric', 0.5),
+    ('Electric', 'Ground', 0.0), ('Electric', 'Flying', 2.0), ('Electric', 'Dragon', 0.5),
+    ('Ice', 'Water', 0.5), ('Ice', 'Grass', 2.0), ('Ice', 'Ice', 0.5), ('Ice', 'Ground', 2.0),
+    ('Ice', 'Flying', 2.0), ('Ice', 'Dragon', 2.0),
+    ('Fighting', 'Normal', 2.0), ('Fighting', 'Ice', 2.0), ('Fighting', 'Poison', 0.5),
+    ('Fighting', 'Flying', 0.5), ('Fighting', 'Psychic', 0.5), ('Fighting', 'Bug', 0.5),
+    ('Fighting', 'Rock', 2.0), ('Fighting', 'Ghost', 0.0),
+    ('Poison', 'Grass', 2.0), ('Poison', 'Poison', 0.5), ('Poison', 'Ground', 0.5), ('Poison', 'Bug', 2.0),
+    ('Poison', 'Rock', 0.5), ('Poison', 'Ghost', 0.5),
+    ('Ground', 'Fire', 2.0), ('Ground', 'Grass', 0.5), ('Ground', 'Electric', 2.0), ('Ground', 'Poison', 2.0),
+    ('Ground', 'Flying', 0.0), ('Ground', 'Bug', 0.5), ('Ground', 'Rock', 2.0),
+    ('Flying', 'Grass', 2.0), ('Flying', 'Electric', 0.5), ('Flying', 'Fighting', 2.0),
+    ('Flying', 'Bug', 2.0), ('Flying', 'Rock', 0.5),
+    ('Psychic', 'Fighting', 2.0), ('Psychic', 'Poison', 2.0), ('Psychic', 'Psychic', 0.5),
+    ('Bug', 'Fire', 0.5), ('Bug', 'Grass', 2.0), ('Bug', 'Fighting', 0.5), ('Bug', 'Poison', 2.0),
+    ('Bug', 'Flying', 0.5), ('Bug', 'Psychic', 2.0), ('Bug', 'Ghost', 0.5),
+    ('Rock', 'Fire', 2.0), ('Rock', 'Ice', 2.0), ('Rock', 'Fighting', 0.5), ('Rock', 'Ground', 0.5),
+    ('Rock', 'Flying', 2.0), ('Rock', 'Bug', 2.0),
+    ('Ghost', 'Normal', 0.0), ('Ghost', 'Psychic', 0.0), ('Ghost', 'Ghost', 2.0),
+    ('Dragon', 'Dragon', 2.0);
+
+INSERT INTO gym_leaders (gym_id, gym_name, gym_leader, badge_title, badge_image, gym_theme_img) VALUES
+    (1, 'Pewter City Gym', 'Brock', 'Boulder Badge', '/static/badge.png', '/static/gym_image.jpg'),
+    (2, 'Cerulean City Gym', 'Misty', 'Cascade Badge', '/static/badge.png', '/static/gym_image.jpg'),
+    (3, 'Vermilion City Gym', 'Lt. Surge', 'Thunder Badge', '/static/badge.png', '/static/gym_image.jpg'),
+    (4, 'Celadon City Gym', 'Erika', 'Rainbow Badge', '/static/badge.png', '/static/gym_image.jpg');
+
+INSERT INTO gym_leader_team_members (gym_id, gym_team_member_id, pokedex_id, move_1_id, move_2_id, move_3_id, move_4_id) VALUES
+    (1, 1, 74, 21, 22, 1, 23),
+    (1, 2, 95, 22, 24, 1, 6),
+    (2, 1, 120, 10, 13, 1, 3),
+    (2, 2, 121, 11, 29, 13, 3),
+    (3, 1, 100, 18, 1, 6, 19),
+    (3, 2, 25, 18, 3, 19, 39),
+    (3, 3, 26, 19, 20, 4, 3),
+    (4, 1, 71, 15, 14, 33, 4),
+    (4, 2, 114, 14, 17, 6, 1),
+    (4, 3, 45, 16, 33, 15, 17);
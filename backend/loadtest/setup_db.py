@@ -0,0 +1,100 @@
+"""
+Create a local load-test database:
+    python -m loadtest.setup_db --reset
+
+Uses the same DB_HOST, DB_PORT, DB_USER, DB_PASS and DB_NAME variables as
+the app (app/db.py). Applies loadtest/schema.sql, the migrations under
+sql/ and loadtest/seed.sql.
+"""
+import argparse
+import os
+import sys
+
+import pymysql
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SQL_DIR = os.path.join(os.path.dirname(LOADTEST_DIR), 'sql')
+
+# Applied in this order
+SCRIPTS = [
+    os.path.join(LOADTEST_DIR, 'schema.sql'),
+    os.path.join(SQL_DIR, 'battle_instances.sql'),
+    os.path.join(SQL_DIR, 'user_stats.sql'),
+    os.path.join(SQL_DIR, 'leaderboard.sql'),
+    os.path.join(LOADTEST_DIR, 'seed.sql'),
+]
+
+
+def split_statements(text):
+    """
+    Split a SQL script into statements the way the mysql client does,
+        including DELIMITER changes around stored procedures. Comment
+        lines are dropped.
+    """
+    delimiter = ';'
+    statements = []
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not stripped or stripped.startswith('--'):
+            continue
+        lines.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(lines).rstrip()[:-len(delimiter)].strip()
+            if statement:
+                statements.append(statement)
+            lines = []
+    if lines:
+        statements.append('\n'.join(lines).strip())
+    return statements
+
+
+def connect(database=None):
+    return pymysql.connect(
+        host=os.environ.get('DB_HOST', '127.0.0.1'),
+        port=int(os.environ.get('DB_PORT', '3306')),
+        user=os.environ['DB_USER'],
+        password=os.environ.get('DB_PASS', ''),
+        db=database,
+        charset='utf8mb4',
+        autocommit=True
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create and seed a local load-test database.")
+    parser.add_argument('--database', default=os.environ.get('DB_NAME', 'pokemon_battle_db'),
+                        help="Database to create (default: DB_NAME).")
+    parser.add_argument('--reset', action='store_true', help="Drop the database first if it exists.")
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            if args.reset:
+                cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`;")
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`;")
+            cursor.execute(f"USE `{args.database}`;")
+
+            # The migrations under sql/ aren't idempotent
+            cursor.execute("SHOW TABLES LIKE 'pokedex_entries';")
+            if cursor.fetchone():
+                print(f"{args.database} is already set up; pass --reset to recreate it.", file=sys.stderr)
+                return 1
+
+            for path in SCRIPTS:
+                with open(path, encoding='utf-8') as script:
+                    statements = split_statements(script.read())
+                for statement in statements:
+                    cursor.execute(statement)
+                print(f"Applied {os.path.relpath(path)} ({len(statements)} statements)")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+-- Per-battle combatant state
+--
+-- Every battle gets its own copy of both teams' HP and PP, keyed by
+-- battle_id. Turns only ever touch the rows of their own battle, so two
+-- players fighting the same gym leader at the same time no longer share
+-- (or lock) the gym_leader_team_members rows.
+--
+-- Run once against the database:
+--   mysql pokemon_battle_db < sql/battle_instances.sql
+
+-- In-progress battles have no end time or outcome yet
+ALTER TABLE battles
+    MODIFY end_time DATETIME NULL,
+    MODIFY win_loss_outcome TINYINT NULL;
+
+CREATE TABLE IF NOT EXISTS battle_combatants (
+    battle_id INT NOT NULL,
+    party ENUM('USER', 'GYM') NOT NULL,
+    member_id INT NOT NULL,
+    pokedex_id INT NOT NULL,
+    current_hp INT NOT NULL,
+    move_1_id INT NULL,
+    move_2_id INT NULL,
+    move_3_id INT NULL,
+    move_4_id INT NULL,
+    move_1_current_pp INT NULL,
+    move_2_current_pp INT NULL,
+    move_3_current_pp INT NULL,
+    move_4_current_pp INT NULL,
+    PRIMARY KEY (battle_id, party, member_id),
+    FOREIGN KEY (battle_id) REFERENCES battles (battle_id) ON DELETE CASCADE,
+    FOREIGN KEY (pokedex_id) REFERENCES pokedex_entries (pokedex_id)
+);
+
+
+-- Turns are resolved in app/battle_engine.py. The stored procedure that
+-- used to repeat its rules over these rows is dropped, so there is only
+-- one copy of the damage formula.
+DROP PROCEDURE IF EXISTS process_battle_instance_turn;
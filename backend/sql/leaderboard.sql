@@ -0,0 +1,21 @@
+-- Fastest clear per (user, gym) for the leaderboard
+--
+-- Kept up to date by app/stats.py when a battle is won. Run once after
+-- sql/user_stats.sql, then refill the rollups from the battle history:
+--   mysql pokemon_battle_db < sql/leaderboard.sql
+--   flask --app run rebuild-user-stats
+
+ALTER TABLE user_gym_clears
+    ADD COLUMN best_clear_seconds INT NULL;
+
+-- Each worker polls for rows changed since its last read instead of
+-- re-reading both tables (app/leaderboard.py)
+ALTER TABLE user_stats
+    ADD COLUMN updated_at TIMESTAMP(3) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+    ADD INDEX idx_user_stats_updated_at (updated_at);
+
+ALTER TABLE user_gym_clears
+    ADD COLUMN updated_at TIMESTAMP(3) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+    ADD INDEX idx_user_gym_clears_updated_at (updated_at);
@@ -0,0 +1,33 @@
+-- Per-user battle statistics
+--
+-- The profile page used to aggregate user_teams NATURAL JOIN battles on
+-- every view. These rollups are kept up to date by the app when a battle
+-- finishes (app/stats.py), so the profile is a single primary key lookup.
+--
+-- Run once against the database, then fill the tables from the existing
+-- battle history:
+--   mysql pokemon_battle_db < sql/user_stats.sql
+--   flask --app run rebuild-user-stats
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INT NOT NULL,
+    wins INT NOT NULL DEFAULT 0,
+    losses INT NOT NULL DEFAULT 0,
+    -- Sum of (end_time - start_time) over every finished battle
+    total_battle_seconds BIGINT NOT NULL DEFAULT 0,
+    -- Distinct gyms beaten, i.e. badges earned
+    gyms_beaten INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id),
+    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+);
+
+-- One row per (user, gym) the user has beaten at least once. Lets a win
+-- tell whether it earned a new badge without counting past battles.
+CREATE TABLE IF NOT EXISTS user_gym_clears (
+    user_id INT NOT NULL,
+    gym_id INT NOT NULL,
+    first_cleared_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, gym_id),
+    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE,
+    FOREIGN KEY (gym_id) REFERENCES gym_leaders (gym_id)
+);
@@ -0,0 +1,7 @@
+import os
+
+# app.db reads its connection settings at import time. The tests never
+# connect, so any placeholder will do when none are configured.
+for _name, _default in (('DB_HOST', '127.0.0.1'), ('DB_USER', 'test'),
+                        ('DB_PASS', 'test'), ('DB_NAME', 'test')):
+    os.environ.setdefault(_name, _default)
@@ -0,0 +1,266 @@
+import random
+
+import pytest
+
+from app.battle_ai import (
+    DIFFICULTIES, GYM, USER, WIN, CompactBattle, Difficulty, _player_weights, choose_action, decide,
+)
+from app.battle_engine import BattleState, Combatant, MoveSlot, choose_greedy_move
+from app.type_chart import TypeChart
+
+
+TYPES = ('Fire', 'Water', 'Grass', 'Normal', 'Ghost')
+MATCHUPS = {
+    ('Fire', 'Grass'): 2.0, ('Fire', 'Water'): 0.5, ('Fire', 'Fire'): 0.5,
+    ('Water', 'Fire'): 2.0, ('Water', 'Grass'): 0.5, ('Water', 'Water'): 0.5,
+    ('Grass', 'Water'): 2.0, ('Grass', 'Fire'): 0.5, ('Grass', 'Grass'): 0.5,
+    ('Normal', 'Ghost'): 0.0, ('Ghost', 'Normal'): 0.0,
+}
+
+
+def _chart(moves):
+    matchup_rows = [{'attacking_type': attacking, 'defending_type': defending, 'multiplier': multiplier}
+                    for (attacking, defending), multiplier in MATCHUPS.items()]
+    move_rows = [{'move_id': move.move_id, 'move_type': move.move_type, 'move_power': move.power}
+                 for move in moves]
+    return TypeChart(matchup_rows, move_rows)
+
+
+def _state(user_team, gym_team):
+    combatants = {(c.party, c.member_id): c for c in user_team + gym_team}
+    return BattleState(battle_id=1, user_id=1, user_team_id=1, gym_id=1, ended=False,
+                       combatants=combatants, matchups=MATCHUPS)
+
+
+def _combatant(party, member_id, types, moves, hp=100, current_hp=None, attack=50, defense=50):
+    return Combatant(party=party, member_id=member_id, pokedex_id=member_id, name=f'{party}{member_id}',
+                     image_url='', types=types, attack=attack, defense=defense, max_hp=hp,
+                     current_hp=hp if current_hp is None else current_hp,
+                     moves=list(moves) + [None] * (4 - len(moves)))
+
+
+def _random_battle(rng, members=2, moves=2):
+    """
+    A small random battle, its type chart and the two Pokemon in play.
+    """
+    all_moves = []
+
+    def team(party):
+        result = []
+        for member_id in range(1, members + 1):
+            slots = []
+            for _ in range(moves):
+                pp = rng.randint(0, 3)
+                move = MoveSlot(move_id=len(all_moves) + 1, name=f'Move{len(all_moves) + 1}',
+                                move_type=rng.choice(TYPES), power=rng.choice([0, 20, 40, 60, 90]),
+                                accuracy=rng.choice([50, 70, 90, 100, 100]), max_pp=3, current_pp=pp)
+                all_moves.append(move)
+                slots.append(move)
+            types = (rng.choice(TYPES), rng.choice((None,) + TYPES))
+            hp = rng.randint(30, 120)
+            result.append(_combatant(party, member_id, types, slots, hp=hp,
+                                     current_hp=rng.randint(0, hp) if rng.random() < 0.4 else hp,
+                                     attack=rng.randint(30, 90), defense=rng.randint(30, 90)))
+        return result
+
+    state = _state(team('USER'), team('GYM'))
+    return state, _chart(all_moves), state.next_alive('USER'), state.next_alive('GYM')
+
+
+class Reference:
+    """
+    The search's game model as plain expectimax: no bounds, no memo, no
+        move ordering beyond what the player model needs.
+    """
+
+    def __init__(self, battle, switching):
+        self.battle = battle
+        self.switching = switching
+
+    def _outcomes(self, s, side, slot):
+        p = self.battle.hit_chance[side][s[2][side]][slot]
+        if p > 0:
+            yield (p, *self.battle.attack(s, side, slot, True))
+        if p < 1:
+            yield (1 - p, *self.battle.attack(s, side, slot, False))
+
+    def actions(self, s):
+        actions = [('move', slot) for slot in self.battle.usable_slots(s, GYM)]
+        if self.switching:
+            hp, _, active = s
+            actions += [('switch', i) for i, value in enumerate(hp[GYM]) if value > 0 and i != active[GYM]]
+        return actions or [('pass', None)]
+
+    def gym(self, s, depth):
+        if depth == 0 or min(s[2]) < 0:
+            return self.battle.evaluate(s)
+        return max(self.action(s, action, depth) for action in self.actions(s))
+
+    def action(self, s, action, depth):
+        kind, arg = action
+        hp, pp, active = s
+        if kind == 'switch':
+            return self.player((hp, pp, (active[USER], arg)), depth)
+        if kind == 'pass':
+            return self.player(s, depth)
+        return sum(chance * (self.gym(after, depth - 1) if fainted else self.player(after, depth))
+                   for chance, after, fainted in self._outcomes(s, GYM, arg))
+
+    def player(self, s, depth):
+        if depth == 0 or min(s[2]) < 0:
+            return self.battle.evaluate(s)
+        slots = self.battle.by_damage(s, USER, self.battle.usable_slots(s, USER))
+        if not slots:
+            return self.gym(s, depth - 1)
+        total = 0.0
+        for slot, weight in zip(slots, _player_weights(len(slots))):
+            for chance, after, fainted in self._outcomes(s, USER, slot):
+                total += weight * chance * (self.player(after, depth - 1) if fainted else self.gym(after, depth - 1))
+        return total
+
+
+def _chosen(battle, action):
+    if action.switch_to is not None:
+        return ('switch', battle.index(GYM, action.switch_to))
+    if action.move_slot:
+        return ('move', action.move_slot - 1)
+    return ('pass', None)
+
+
+def _assert_legal(state, gym_member_id, action):
+    gym = state.get('GYM', gym_member_id)
+    if action.switch_to is not None:
+        target = state.get('GYM', action.switch_to)
+        assert target is not None and not target.fainted and target is not gym
+    elif action.move_slot:
+        move = gym.moves[action.move_slot - 1]
+        assert move is not None and move.current_pp > 0
+    else:
+        assert all(move is None or move.current_pp == 0 for move in gym.moves)
+
+
+# ---- search against the unpruned reference ----
+
+# Three-member teams with switching are where the same position comes up
+# again within a search, so the memo's bounds get exercised
+@pytest.mark.parametrize('switching, depth, members, moves', [
+    (False, 2, 2, 3), (False, 3, 2, 2), (True, 2, 2, 2), (True, 3, 3, 2),
+])
+def test_pruned_search_picks_a_best_action(switching, depth, members, moves):
+    rng = random.Random(depth * 10 + members)
+    checked = 0
+    for _ in range(100):
+        state, chart, user, gym = _random_battle(rng, members=members, moves=moves)
+        if user is None or gym is None:
+            continue
+        battle = CompactBattle(state, chart)
+        root = battle.initial(user.member_id, gym.member_id)
+        reference = Reference(battle, switching)
+
+        action = decide(battle, root, Difficulty('test', depth, switching), budget_ms=None)
+
+        values = {choice: reference.action(root, choice, depth) for choice in reference.actions(root)}
+        assert values[_chosen(battle, action)] >= max(values.values()) - 1e-9
+        checked += 1
+    assert checked >= 50
+
+
+# ---- difficulties ----
+
+def test_easy_matches_the_greedy_rule():
+    rng = random.Random(7)
+    for _ in range(50):
+        state, chart, user, gym = _random_battle(rng, members=1, moves=4)
+        if user is None or gym is None:
+            continue
+
+        action = choose_action(state, gym.member_id, user.member_id, chart, 'easy')
+
+        assert action.move_slot == choose_greedy_move(state, 'GYM', gym.member_id, user.member_id, chart)
+        assert action.depth == 0 and action.switch_to is None
+
+
+def _matchup():
+    """
+    A Grass gym Pokemon facing a Fire one that outdamages it, with a
+        healthy Water Pokemon on the gym's bench. Both sides have too much
+        HP for the battle to be decided within the search.
+    """
+    flamethrower = MoveSlot(move_id=1, name='Flamethrower', move_type='Fire', power=90, accuracy=100,
+                     max_pp=15, current_pp=15)
+    vine_whip = MoveSlot(move_id=2, name='Vine Whip', move_type='Grass', power=40, accuracy=100,
+                         max_pp=25, current_pp=25)
+    water_gun = MoveSlot(move_id=3, name='Water Gun', move_type='Water', power=60, accuracy=100,
+                         max_pp=25, current_pp=25)
+    state = _state(
+        [_combatant('USER', 1, ('Fire', None), [flamethrower], hp=1000)],
+        [_combatant('GYM', 1, ('Grass', None), [vine_whip], hp=120),
+         _combatant('GYM', 2, ('Water', None), [water_gun], hp=500)],
+    )
+    return state, _chart([flamethrower, vine_whip, water_gun])
+
+
+def test_hard_switches_away_from_a_losing_matchup():
+    state, chart = _matchup()
+
+    action = choose_action(state, 1, 1, chart, 'hard', budget_ms=None, max_nodes=200000)
+
+    assert action.switch_to == 2
+    assert action.depth >= 1
+
+
+def test_normal_never_switches():
+    state, chart = _matchup()
+
+    action = choose_action(state, 1, 1, chart, 'normal', budget_ms=None)
+
+    assert action.switch_to is None
+    assert action.move_slot == 1
+
+
+# ---- budget ----
+
+def test_search_that_runs_out_at_depth_one_falls_back_to_greedy():
+    state, chart = _matchup()
+
+    action = choose_action(state, 1, 1, chart, 'hard', budget_ms=None, max_nodes=1)
+
+    assert action.depth == 0
+    assert action.move_slot == choose_greedy_move(state, 'GYM', 1, 1, chart)
+    _assert_legal(state, 1, action)
+
+
+def test_budget_keeps_the_deepest_finished_round():
+    state, chart = _matchup()
+    battle = CompactBattle(state, chart)
+    root = battle.initial(1, 1)
+    one_round = decide(battle, root, Difficulty('test', 1, True), budget_ms=None)
+
+    action = decide(battle, root, DIFFICULTIES['hard'], budget_ms=None, max_nodes=one_round.nodes)
+
+    assert action.depth == 1
+    assert _chosen(battle, action) == _chosen(battle, one_round)
+    _assert_legal(state, 1, action)
+
+
+def test_zero_time_budget_still_returns_a_legal_move():
+    rng = random.Random(11)
+    for _ in range(20):
+        state, chart, user, gym = _random_battle(rng, members=3, moves=4)
+        if user is None or gym is None:
+            continue
+
+        action = choose_action(state, gym.member_id, user.member_id, chart, 'hard', budget_ms=0)
+
+        _assert_legal(state, gym.member_id, action)
+
+
+def test_decided_battle_stops_deepening():
+    state, chart = _matchup()
+    state.get('USER', 1).current_hp = 1
+    battle = CompactBattle(state, chart)
+
+    action = decide(battle, battle.initial(1, 1), DIFFICULTIES['hard'], budget_ms=None)
+
+    assert action.depth == 1
+    assert action.move_slot == 1
@@ -0,0 +1,203 @@
+import pytest
+
+from app.battle_engine import (
+    BattleState, Combatant, MoveSlot, calculate_damage, resolve_turn, save_battle_state, type_multiplier,
+)
+
+
+MATCHUPS = {
+    ('Fire', 'Grass'): 2.0,
+    ('Fire', 'Water'): 0.5,
+    ('Water', 'Fire'): 2.0,
+    ('Normal', 'Ghost'): 0.0,
+}
+
+
+class FixedRng:
+    """
+    rng.random() always returns the same value: 0.0 always hits, 0.99
+        misses any move with less than 100 accuracy.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def random(self):
+        return self.value
+
+
+class RecordingCursor:
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, args=None):
+        self.executed.append((query, args))
+
+
+def _move(move_id, name, move_type, power=40, accuracy=100, pp=10):
+    return MoveSlot(move_id=move_id, name=name, move_type=move_type, power=power,
+                    accuracy=accuracy, max_pp=pp, current_pp=pp)
+
+
+def _combatant(party, member_id, name, types, hp=100, attack=50, defense=50, moves=None):
+    moves = list(moves or [])
+    return Combatant(party=party, member_id=member_id, pokedex_id=member_id, name=name,
+                     image_url='', types=types, attack=attack, defense=defense,
+                     max_hp=hp, current_hp=hp, moves=moves + [None] * (4 - len(moves)))
+
+
+@pytest.fixture
+def state():
+    combatants = [
+        _combatant('USER', 1, 'Charmander', ('Fire', None), moves=[
+            _move(1, 'Ember', 'Fire'),
+            _move(2, 'Tackle', 'Normal'),
+            _move(3, 'Fire Blast', 'Fire', power=110, accuracy=85, pp=1),
+        ]),
+        _combatant('USER', 2, 'Squirtle', ('Water', None), moves=[_move(4, 'Water Gun', 'Water')]),
+        _combatant('GYM', 1, 'Bulbasaur', ('Grass', 'Poison'), moves=[_move(5, 'Vine Whip', 'Grass')]),
+        _combatant('GYM', 2, 'Gastly', ('Ghost', 'Poison'), moves=[_move(6, 'Lick', 'Ghost')]),
+    ]
+    return BattleState(battle_id=7, user_id=1, user_team_id=1, gym_id=1, ended=False,
+                       combatants={(c.party, c.member_id): c for c in combatants}, matchups=MATCHUPS)
+
+
+# ---- damage and type multipliers ----
+
+def test_type_multiplier_multiplies_both_types():
+    assert type_multiplier(MATCHUPS, 'Fire', ('Grass', 'Water')) == 1.0
+    assert type_multiplier(MATCHUPS, 'Fire', ('Grass', None)) == 2.0
+    assert type_multiplier(MATCHUPS, 'Normal', ('Ghost', 'Poison')) == 0.0
+
+
+def test_type_multiplier_missing_pairs_are_neutral():
+    assert type_multiplier(MATCHUPS, 'Electric', ('Rock', None)) == 1.0
+
+
+def test_calculate_damage():
+    # (22 * 40 * 50) // (50 * 50) + 2 = 19
+    assert calculate_damage(40, 50, 50, 1.0) == 19
+    assert calculate_damage(40, 50, 50, 2.0) == 38
+    assert calculate_damage(40, 50, 50, 0.5) == 9
+    assert calculate_damage(40, 50, 50, 0.0) == 0
+
+
+def test_calculate_damage_without_power_or_defense():
+    assert calculate_damage(0, 50, 50, 1.0) == 0
+    assert calculate_damage(None, 50, 50, 1.0) == 0
+    # A defense of 0 counts as 1 instead of dividing by zero
+    assert calculate_damage(40, 50, 0, 1.0) == 22 * 40 * 50 // 50 + 2
+
+
+def test_super_effective_hit(state):
+    turn = resolve_turn(state, 'USER', 1, 1, 1, rng=FixedRng(0.0))
+
+    assert turn.damage == 38
+    assert turn.multiplier == 2.0
+    assert not turn.missed and not turn.fainted
+    assert "super effective" in turn.message
+    assert state.get('GYM', 1).current_hp == 62
+
+
+def test_immune_defender_takes_no_damage(state):
+    turn = resolve_turn(state, 'USER', 1, 2, 2, rng=FixedRng(0.0))
+
+    assert turn.damage == 0
+    assert "doesn't affect Gastly" in turn.message
+    assert state.get('GYM', 2).current_hp == 100
+
+
+# ---- misses and PP ----
+
+def test_hit_spends_one_pp(state):
+    resolve_turn(state, 'USER', 1, 1, 1, rng=FixedRng(0.0))
+
+    assert state.get('USER', 1).moves[0].current_pp == 9
+    assert state.dirty == {('USER', 1), ('GYM', 1)}
+
+
+def test_miss_spends_pp_but_deals_no_damage(state):
+    turn = resolve_turn(state, 'USER', 1, 1, 3, rng=FixedRng(0.99))
+
+    assert turn.missed
+    assert turn.damage == 0
+    assert "missed" in turn.message
+    assert state.get('USER', 1).moves[2].current_pp == 0
+    assert state.get('GYM', 1).current_hp == 100
+    assert state.dirty == {('USER', 1)}
+
+
+def test_move_without_pp_does_nothing(state):
+    state.get('USER', 1).moves[0].current_pp = 0
+
+    turn = resolve_turn(state, 'USER', 1, 1, 1, rng=FixedRng(0.0))
+
+    assert "no PP left" in turn.message
+    assert state.get('GYM', 1).current_hp == 100
+    assert not state.dirty
+
+
+@pytest.mark.parametrize('slot', [0, 4, 5, None])
+def test_empty_or_invalid_slot_does_nothing(state, slot):
+    turn = resolve_turn(state, 'USER', 1, 1, slot, rng=FixedRng(0.0))
+
+    assert "no PP left" in turn.message
+    assert not state.dirty
+
+
+# ---- fainting and next_alive ----
+
+def test_knockout_faints_the_defender(state):
+    state.get('GYM', 1).current_hp = 10
+
+    turn = resolve_turn(state, 'USER', 1, 1, 1, rng=FixedRng(0.0))
+
+    assert turn.fainted
+    assert "Bulbasaur fainted!" in turn.message
+    assert state.get('GYM', 1).current_hp == 0
+    assert state.get('GYM', 1).fainted
+
+
+def test_next_alive_skips_fainted_members(state):
+    assert state.next_alive('GYM').member_id == 1
+    state.get('GYM', 1).current_hp = 0
+    assert state.next_alive('GYM').member_id == 2
+    assert state.winner() is None
+
+    state.get('GYM', 2).current_hp = 0
+    assert state.next_alive('GYM') is None
+    assert state.winner() == 'USER'
+
+
+# ---- errors ----
+
+def test_unknown_combatant_raises(state):
+    with pytest.raises(ValueError):
+        resolve_turn(state, 'USER', 1, 99, 1)
+    with pytest.raises(ValueError):
+        resolve_turn(state, 'GYM', 99, 1, 1)
+
+
+# ---- saving ----
+
+def test_save_writes_only_changed_combatants_once(state):
+    resolve_turn(state, 'USER', 1, 1, 1, rng=FixedRng(0.0))
+    cursor = RecordingCursor()
+
+    save_battle_state(cursor, state)
+
+    assert len(cursor.executed) == 1
+    query, params = cursor.executed[0]
+    assert "ON DUPLICATE KEY UPDATE" in query
+    assert params == [7, 'GYM', 1, 1, 62, 10, None, None, None,
+                      7, 'USER', 1, 1, 100, 9, 10, 1, None]
+    assert not state.dirty
+
+
+def test_save_without_changes_runs_nothing(state):
+    cursor = RecordingCursor()
+
+    save_battle_state(cursor, state)
+
+    assert cursor.executed == []
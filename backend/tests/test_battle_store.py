@@ -0,0 +1,242 @@
+import threading
+import time
+
+import pytest
+
+from app.battle_engine import BattleState, Combatant
+from app.battle_store import MemoryBattleStore
+
+
+def _state(battle_id):
+    return BattleState(battle_id=battle_id, user_id=1, user_team_id=1, gym_id=1, ended=False,
+                       combatants={}, matchups={})
+
+
+def _state_with_hp(battle_id, hp):
+    combatant = Combatant(party='GYM', member_id=1, pokedex_id=1, name='Bulbasaur', image_url='',
+                          types=('Grass', 'Poison'), attack=50, defense=50, max_hp=hp, current_hp=hp,
+                          moves=[None] * 4)
+    state = _state(battle_id)
+    state.combatants[('GYM', 1)] = combatant
+    return state
+
+
+def _store(ttl=60.0, max_battles=10):
+    written = []
+    store = MemoryBattleStore(ttl=ttl, max_battles=max_battles, on_evict=written.append)
+    return store, written
+
+
+def _not_loaded():
+    raise AssertionError("the battle should have been cached")
+
+
+def test_checkout_serves_the_cached_state():
+    store, written = _store()
+    state = _state(1)
+    store.put(state)
+
+    with store.checkout(1, _not_loaded) as checked_out:
+        assert checked_out is state
+
+    assert store.stats()['hits'] == 1
+    assert written == []
+
+
+def test_checkout_loads_and_caches_a_missing_battle():
+    store, _ = _store()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return _state(1)
+
+    with store.checkout(1, load) as first:
+        pass
+    with store.checkout(1, load) as second:
+        pass
+
+    assert first is second
+    assert len(loads) == 1
+    stats = store.stats()
+    assert stats['misses'] == 1 and stats['hits'] == 1
+
+
+def test_checkout_of_an_unknown_battle_yields_none():
+    store, _ = _store()
+
+    with store.checkout(1, lambda: None) as state:
+        assert state is None
+    assert store.stats()['active_battles'] == 0
+
+
+def test_least_recently_used_battle_is_written_back_first():
+    store, written = _store(max_battles=2)
+    store.put(_state(1))
+    store.put(_state(2))
+    # Touch 1, so 2 is now the least recently used
+    with store.checkout(1, _not_loaded):
+        pass
+
+    store.put(_state(3))
+
+    assert [state.battle_id for state in written] == [2]
+    stats = store.stats()
+    assert stats['active_battles'] == 2
+    assert stats['evictions'] == 1
+
+
+def test_idle_battles_are_written_back_after_the_ttl():
+    store, written = _store(ttl=0.05)
+    store.put(_state(1))
+    time.sleep(0.1)
+
+    store.put(_state(2))
+
+    assert [state.battle_id for state in written] == [1]
+    assert store.stats()['active_battles'] == 1
+
+
+def test_checkout_renews_the_ttl():
+    store, written = _store(ttl=0.2)
+    store.put(_state(1))
+    time.sleep(0.12)
+    with store.checkout(1, _not_loaded):
+        pass
+    time.sleep(0.12)
+
+    store.put(_state(2))
+
+    assert written == []
+
+
+def test_discard_drops_without_writing_back():
+    store, written = _store()
+    store.put(_state(1))
+
+    store.discard(1)
+    store.flush()
+
+    assert written == []
+    assert store.stats()['active_battles'] == 0
+
+
+def test_flush_writes_back_every_battle():
+    store, written = _store()
+    store.put(_state(1))
+    store.put(_state(2))
+
+    store.flush()
+
+    assert sorted(state.battle_id for state in written) == [1, 2]
+    assert store.stats()['active_battles'] == 0
+
+
+def test_failed_write_back_does_not_break_the_store():
+    def broken(state):
+        raise ConnectionError("database is down")
+
+    store = MemoryBattleStore(ttl=60.0, max_battles=1, on_evict=broken)
+    store.put(_state(1))
+    store.put(_state(2))
+
+    assert store.stats()['active_battles'] == 1
+
+
+def test_checkouts_of_one_battle_take_turns():
+    store, _ = _store()
+    store.put(_state(1))
+    inside = []
+    overlaps = []
+
+    def play():
+        with store.checkout(1, _not_loaded):
+            if inside:
+                overlaps.append(1)
+            inside.append(1)
+            time.sleep(0.01)
+            inside.pop()
+
+    threads = [threading.Thread(target=play) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == []
+
+
+def test_concurrent_misses_load_the_battle_once():
+    store, _ = _store()
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.05)
+        return _state_with_hp(1, 100)
+
+    def hit(damage):
+        with store.checkout(1, load) as state:
+            state.get('GYM', 1).current_hp -= damage
+
+    threads = [threading.Thread(target=hit, args=(damage,)) for damage in (10, 20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    with store.checkout(1, _not_loaded) as state:
+        assert state.get('GYM', 1).current_hp == 70
+
+
+def test_checkout_waits_for_the_write_back_of_an_evicted_battle():
+    written = []
+
+    def slow_write_back(state):
+        time.sleep(0.1)
+        written.append(state.battle_id)
+
+    store = MemoryBattleStore(ttl=60.0, max_battles=1, on_evict=slow_write_back)
+    store.put(_state(1))
+    # Pushing out battle 1 writes it back on this thread
+    evicting = threading.Thread(target=store.put, args=(_state(2),))
+    evicting.start()
+    time.sleep(0.02)
+    seen_at_load = []
+
+    def load():
+        seen_at_load.append(list(written))
+        return _state(1)
+
+    with store.checkout(1, load):
+        pass
+    evicting.join()
+
+    assert seen_at_load == [[1]]
+
+
+def test_failed_load_is_retried_by_the_next_checkout():
+    store, _ = _store()
+
+    def broken():
+        raise ConnectionError("database is down")
+
+    with pytest.raises(ConnectionError):
+        with store.checkout(1, broken):
+            pass
+    with store.checkout(1, lambda: _state(1)) as state:
+        assert state.battle_id == 1
+
+    assert store.stats()['misses'] == 2
+
+
+def test_battle_over_the_limit_is_written_back_after_the_request():
+    store, written = _store(max_battles=0)
+
+    with store.checkout(1, lambda: _state(1)) as state:
+        state.dirty.add(('GYM', 1))
+        assert written == []
+
+    assert [state.battle_id for state in written] == [1]
+    assert store.stats()['active_battles'] == 0
@@ -0,0 +1,181 @@
+import threading
+
+import pytest
+
+from app.db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.rollbacks = 0
+        self.pings = 0
+        self.healthy = True
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.healthy:
+            raise ConnectionError("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFactory:
+    """
+    Connect function for the pool that hands out numbered fake connections.
+    """
+
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = FakeConnection(len(self.opened) + 1)
+        self.opened.append(conn)
+        return conn
+
+
+@pytest.fixture
+def factory():
+    return FakeFactory()
+
+
+def _pool(factory, **kwargs):
+    options = dict(min_size=0, max_size=2, max_lifetime=1800.0, timeout=0.05, health_check_after=5.0)
+    options.update(kwargs)
+    return ConnectionPool(factory, **options)
+
+
+def test_returned_connection_is_reused(factory):
+    pool = _pool(factory)
+
+    conn = pool.acquire()
+    conn.close()
+    again = pool.acquire()
+
+    assert again._raw is factory.opened[0]
+    assert len(factory.opened) == 1
+    # The request's transaction is rolled back on the way back in
+    assert factory.opened[0].rollbacks == 1
+    stats = pool.stats()
+    assert stats['checkouts'] == 2
+    assert stats['size'] == 1 and stats['in_use'] == 1
+
+
+def test_fill_opens_min_size(factory):
+    pool = _pool(factory, min_size=2)
+
+    pool.fill()
+
+    assert len(factory.opened) == 2
+    assert pool.stats()['idle'] == 2
+
+
+def test_exhausted_pool_times_out(factory):
+    pool = _pool(factory, max_size=1)
+    pool.acquire()
+
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waits'] >= 1
+    assert len(factory.opened) == 1
+
+
+def test_waiter_gets_the_released_connection(factory):
+    pool = _pool(factory, max_size=1, timeout=2.0)
+    conn = pool.acquire()
+    got = []
+
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    conn.close()
+    waiter.join(2.0)
+
+    assert got and got[0]._raw is factory.opened[0]
+    assert len(factory.opened) == 1
+
+
+def test_expired_connection_is_recycled_on_release(factory):
+    pool = _pool(factory, max_lifetime=60.0)
+    conn = pool.acquire()
+    conn.created_at -= 120
+
+    conn.close()
+
+    assert factory.opened[0].closed
+    assert pool.stats()['size'] == 0
+    assert pool.acquire()._raw is factory.opened[1]
+
+
+def test_expired_idle_connection_is_recycled_on_checkout(factory):
+    pool = _pool(factory, max_lifetime=60.0)
+    conn = pool.acquire()
+    conn.close()
+    conn.created_at -= 120
+
+    again = pool.acquire()
+
+    assert factory.opened[0].closed
+    assert again._raw is factory.opened[1]
+    assert pool.stats()['connections_closed'] == 1
+
+
+def test_failed_health_check_replaces_the_connection(factory):
+    pool = _pool(factory, health_check_after=0.0)
+    conn = pool.acquire()
+    conn.close()
+    factory.opened[0].healthy = False
+
+    again = pool.acquire()
+
+    assert factory.opened[0].pings == 1
+    assert factory.opened[0].closed
+    assert again._raw is factory.opened[1]
+    stats = pool.stats()
+    assert stats['failed_health_checks'] == 1
+    assert stats['size'] == 1
+
+
+def test_recently_used_connection_is_not_pinged(factory):
+    pool = _pool(factory, health_check_after=60.0)
+    pool.acquire().close()
+
+    pool.acquire()
+
+    assert factory.opened[0].pings == 0
+
+
+def test_double_close_is_harmless(factory):
+    pool = _pool(factory)
+    conn = pool.acquire()
+
+    conn.close()
+    conn.close()
+
+    stats = pool.stats()
+    assert stats['idle'] == 1
+    assert stats['size'] == 1
+    assert factory.opened[0].rollbacks == 1
+    # The one idle connection can't be handed out twice
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first._raw is not second._raw
+
+
+def test_failed_connect_frees_the_slot():
+    def broken():
+        raise ConnectionError("refused")
+
+    pool = _pool(broken, max_size=1)
+
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.stats()['size'] == 0
@@ -0,0 +1,140 @@
+from datetime import datetime
+
+import pytest
+
+from app.leaderboard import Leaderboard, load_rollups
+
+
+def _entry(user_id, wins, losses, gyms_beaten=0):
+    return {'user_id': user_id, 'user_name': f'player{user_id}', 'wins': wins, 'losses': losses,
+            'gyms_beaten': gyms_beaten}
+
+
+def _clear(user_id, gym_id, seconds):
+    return {'user_id': user_id, 'gym_id': gym_id, 'best_clear_seconds': seconds}
+
+
+def _ids(rows):
+    return [row['user_id'] for row in rows]
+
+
+class RowsCursor:
+    """
+    Answers each execute() with the next list of rows.
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+
+    def execute(self, query, args=None):
+        self.executed.append((query, args))
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def board():
+    board = Leaderboard()
+    board.load(
+        [_entry(1, 3, 1, gyms_beaten=2), _entry(2, 6, 2, gyms_beaten=1), _entry(3, 1, 0, gyms_beaten=1),
+         _entry(4, 0, 5), _entry(5, 0, 0)],
+        [_clear(1, 1, 300), _clear(2, 1, 120), _clear(3, 2, 90)],
+    )
+    return board
+
+
+def test_win_rate_ties_go_to_more_wins_then_lower_user_id(board):
+    # 1 and 2 both win 75%: 2 has more wins
+    assert _ids(board.top('win_rate')) == [3, 2, 1, 4]
+
+    board.update(_entry(6, 3, 1))
+
+    assert _ids(board.top('win_rate')) == [3, 2, 1, 6, 4]
+
+
+def test_badge_ties_go_to_more_wins(board):
+    assert _ids(board.top('badges')) == [1, 2, 3, 4]
+
+
+def test_players_without_battles_are_not_ranked(board):
+    assert board.rank('win_rate', 5) is None
+    assert board.size('win_rate') == 4
+
+
+def test_update_re_ranks_the_player(board):
+    board.update(_entry(4, 10, 5, gyms_beaten=3))
+
+    assert _ids(board.top('badges')) == [4, 1, 2, 3]
+    assert board.rank('win_rate', 4)['rank'] == 4
+    assert board.size('badges') == 4
+
+
+def test_rank_matches_the_players_row_in_top(board):
+    top = board.top('win_rate', k=10)
+
+    for row in top:
+        assert board.rank('win_rate', row['user_id']) == row
+    assert board.top('win_rate', k=2) == top[:2]
+    assert top[1] == {'rank': 2, 'user_id': 2, 'user_name': 'player2', 'wins': 6, 'battles': 8,
+                      'win_percentage': 75.0, 'gyms_beaten': 1}
+
+
+def test_fastest_is_one_board_per_gym(board):
+    assert [(row['user_id'], row['best_clear_seconds']) for row in board.top('fastest', gym_id=1)] == [
+        (2, 120), (1, 300)]
+    assert _ids(board.top('fastest', gym_id=2)) == [3]
+    assert board.top('fastest', gym_id=99) == []
+    assert board.rank('fastest', 3, gym_id=1) is None
+
+
+def test_faster_clear_moves_up_its_gym_board(board):
+    board.update(_entry(1, 4, 1, gyms_beaten=2), gym_id=1, best_clear_seconds=100)
+
+    assert _ids(board.top('fastest', gym_id=1)) == [1, 2]
+    assert board.size('fastest', gym_id=1) == 2
+    assert _ids(board.top('fastest', gym_id=2)) == [3]
+
+
+def test_unknown_board_raises(board):
+    with pytest.raises(ValueError):
+        board.top('most_fainted')
+
+
+def test_update_during_a_reload_survives_the_swap(board):
+    board.begin_load()
+    # Rows read by the reload before player 4's battle committed...
+    stale = [_entry(1, 3, 1), _entry(4, 0, 5)]
+    board.update(_entry(4, 9, 5), gym_id=2, best_clear_seconds=30)
+
+    board.load(stale, [])
+
+    assert board.rank('win_rate', 4)['wins'] == 9
+    assert _ids(board.top('fastest', gym_id=2)) == [4]
+
+
+def test_load_replaces_every_ranking(board):
+    board.load([_entry(7, 1, 1)], [])
+
+    assert _ids(board.top('win_rate')) == [7]
+    assert board.top('fastest', gym_id=1) == []
+
+
+def test_apply_adds_changed_rows_in_place(board):
+    board.apply([_entry(3, 1, 3)], [_clear(3, 1, 60)])
+
+    assert _ids(board.top('win_rate')) == [2, 1, 3, 4]
+    assert _ids(board.top('fastest', gym_id=1)) == [3, 2, 1]
+
+
+def test_load_rollups_reads_only_changed_rows_when_polling():
+    since = datetime(2025, 7, 1, 12, 0, 0)
+    cursor = RowsCursor([_entry(1, 1, 0)], [_clear(1, 1, 60)])
+
+    entries, clears = load_rollups(cursor, since=since)
+
+    assert entries == [_entry(1, 1, 0)] and clears == [_clear(1, 1, 60)]
+    for query, args in cursor.executed:
+        assert "updated_at >= %s" in query
+        assert args == (since,)
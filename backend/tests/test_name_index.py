@@ -0,0 +1,60 @@
+import pytest
+
+from app.name_index import NameIndex
+
+
+NAMES = ['Pikachu', 'Raichu', 'Pichu', 'Mew', 'Mewtwo', 'Smeargle', 'Charmander', 'Charmeleon',
+         'Charizard', 'Chansey', 'Porygon', 'Porygon2', 'Porygon-Z']
+
+
+@pytest.fixture
+def index():
+    return NameIndex({'pokedex_id': number, 'name': name} for number, name in enumerate(NAMES, 1))
+
+
+def _names(rows):
+    return [row['name'] for row in rows]
+
+
+def test_exact_match_comes_first(index):
+    assert _names(index.search('mew')) == ['Mew', 'Mewtwo']
+
+
+def test_prefix_matches_are_shortest_then_alphabetical(index):
+    assert _names(index.search('char')) == ['Charizard', 'Charmander', 'Charmeleon']
+
+
+def test_prefix_matches_come_before_substring_matches(index):
+    assert _names(index.search('pi')) == ['Pichu', 'Pikachu']
+    assert _names(index.search('chu')) == ['Pichu', 'Raichu', 'Pikachu']
+
+
+def test_substring_matches_rank_by_position_then_length(index):
+    # 'ichu' starts at 1 in Pichu, 2 in Raichu
+    assert _names(index.search('ichu')) == ['Pichu', 'Raichu']
+
+
+def test_long_query_intersects_grams_and_verifies(index):
+    assert _names(index.search('rygon')) == ['Porygon', 'Porygon2', 'Porygon-Z']
+    # Every 3-gram of 'mewle' is indexed, but no name contains it
+    assert index.search('mewle') == []
+
+
+def test_search_ignores_case_and_whitespace(index):
+    assert _names(index.search('  PIKA ')) == ['Pikachu']
+
+
+def test_limit_cuts_the_ranked_list(index):
+    assert _names(index.search('chu', limit=2)) == ['Pichu', 'Raichu']
+    assert _names(index.search('porygon', limit=1)) == ['Porygon']
+
+
+@pytest.mark.parametrize('query, limit', [('', 10), (None, 10), ('   ', 10), ('mew', 0), ('xyz', 10)])
+def test_nothing_to_find(index, query, limit):
+    assert index.search(query, limit=limit) == []
+
+
+def test_best_match(index):
+    assert index.best_match('porygon')['name'] == 'Porygon'
+    assert index.best_match('ZARD')['name'] == 'Charizard'
+    assert index.best_match('nothing') is None
@@ -0,0 +1,169 @@
+import pytest
+
+from app import refdata as refdata_module
+from app.refdata import ReferenceCache, ReferenceSnapshot
+
+
+POKEMON = [
+    {'pokedex_id': 4, 'name': 'Charmander', 'pType_1': 'Fire', 'pType_2': None},
+    {'pokedex_id': 1, 'name': 'Bulbasaur', 'pType_1': 'Grass', 'pType_2': 'Poison'},
+]
+MOVES = [
+    {'move_id': 10, 'move_name': 'Scratch', 'move_type': 'Normal'},
+    {'move_id': 11, 'move_name': 'Ember', 'move_type': 'Fire'},
+    {'move_id': 12, 'move_name': 'Growl', 'move_type': 'Normal'},
+]
+LEARNSETS = [{'pokedex_id': 4, 'move_id': 10}, {'pokedex_id': 4, 'move_id': 11}, {'pokedex_id': 4, 'move_id': 12}]
+MATCHUPS = [{'attacking_type': 'Fire', 'defending_type': 'Grass', 'multiplier': 2.0}]
+GYMS = [{'gym_id': 2, 'gym_name': 'Cerulean'}, {'gym_id': 1, 'gym_name': 'Pewter'}]
+
+
+class FakeConnection:
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+
+class FakeTables:
+    """
+    Stands in for the database: a checksum to compare, and a count of
+        full loads.
+    """
+
+    def __init__(self):
+        self.version = (1,)
+        self.loads = 0
+        self.broken = False
+
+    def version_check(self, cursor):
+        if self.broken:
+            raise ConnectionError("database is down")
+        return self.version
+
+    def loader(self, cursor, version=None):
+        self.loads += 1
+        return ReferenceSnapshot(POKEMON, MOVES, LEARNSETS, MATCHUPS, GYMS, version=version)
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    monkeypatch.setattr(refdata_module, 'getconn', FakeConnection)
+    return FakeTables()
+
+
+@pytest.fixture
+def cache(tables):
+    return ReferenceCache(loader=tables.loader, version_check=tables.version_check)
+
+
+# ---- lookups ----
+
+def test_first_lookup_loads_the_snapshot_once(cache, tables):
+    cache.pokemon(4)
+    cache.move(10)
+
+    assert tables.loads == 1
+    assert cache.stats()['reloads'] == 1
+
+
+def test_lookups_by_id_and_name(cache):
+    assert cache.pokemon(1)['name'] == 'Bulbasaur'
+    assert cache.pokemon_by_name('  charmANDER ')['pokedex_id'] == 4
+    assert cache.move_by_name('Ember')['move_id'] == 11
+    assert cache.gym_leader(2)['gym_name'] == 'Cerulean'
+    assert [row['pokedex_id'] for row in cache.all_pokemon()] == [1, 4]
+    assert [row['gym_id'] for row in cache.gym_leaders()] == [1, 2]
+
+
+def test_learnset_is_ordered_by_move_name(cache):
+    assert cache.learnset_ids(4) == [11, 12, 10]
+    assert [row['move_name'] for row in cache.learnset(4)] == ['Ember', 'Growl', 'Scratch']
+    assert cache.learnset(1) == [] and cache.learnset_ids(1) == []
+
+
+def test_stats_count_found_and_not_found(cache):
+    cache.pokemon(4)
+    cache.move(11)
+    cache.pokemon(999)
+    cache.pokemon_by_name(None)
+
+    stats = cache.stats()
+    assert stats['found'] == 2
+    assert stats['not_found'] == 2
+
+
+# ---- refreshing ----
+
+def test_refresh_keeps_the_snapshot_while_the_checksums_match(cache, tables):
+    snapshot = cache.snapshot()
+
+    assert cache.refresh() is False
+
+    assert cache.snapshot() is snapshot
+    assert tables.loads == 1
+    assert cache.stats()['unchanged_checks'] == 1
+
+
+def test_refresh_reloads_when_a_table_changes(cache, tables):
+    old = cache.snapshot()
+    seen = []
+    cache.on_reload(seen.append)
+    tables.version = (2,)
+
+    assert cache.refresh() is True
+
+    assert cache.snapshot() is not old
+    assert cache.snapshot().version == (2,)
+    assert seen == [cache.snapshot()]
+    assert cache.stats()['reloads'] == 2
+
+
+def test_refresh_reloads_an_expired_snapshot(cache, tables, monkeypatch):
+    monkeypatch.setattr(refdata_module, 'max_age', 60.0)
+    cache.snapshot().loaded_at -= 120
+
+    assert cache.refresh() is True
+
+    assert tables.loads == 2
+
+
+def test_warm_reloads_even_if_nothing_changed(cache, tables):
+    cache.snapshot()
+
+    cache.warm()
+
+    assert tables.loads == 2
+
+
+def test_failing_listener_does_not_stop_the_swap(cache, tables):
+    def broken(snapshot):
+        raise RuntimeError("listener failed")
+
+    seen = []
+    cache.on_reload(broken)
+    cache.on_reload(seen.append)
+
+    cache.warm()
+
+    assert len(seen) == 1
+    assert cache.snapshot() is seen[0]
+
+
+def test_failed_refresh_keeps_the_old_snapshot(cache, tables):
+    snapshot = cache.snapshot()
+    tables.broken = True
+
+    with pytest.raises(ConnectionError):
+        cache.refresh()
+
+    assert cache.snapshot() is snapshot
+    assert tables.loads == 1
@@ -0,0 +1,77 @@
+import pytest
+
+from app.type_chart import TypeChart
+
+
+MATCHUPS = [
+    ('Fire', 'Grass', 2.0), ('Fire', 'Bug', 2.0), ('Fire', 'Water', 0.5),
+    ('Water', 'Fire', 2.0), ('Normal', 'Ghost', 0.0), ('Electric', 'Ground', 0.0),
+]
+MOVES = [
+    (1, 'Ember', 'Fire', 40),
+    (2, 'Tackle', 'Normal', 40),
+    (3, 'Water Gun', 'Water', 40),
+    (4, 'Thunderbolt', 'Electric', 90),
+    (5, 'Growl', 'Normal', None),
+    (6, 'Scratch', 'Normal', 40),
+]
+
+
+@pytest.fixture
+def chart():
+    matchup_rows = [{'attacking_type': attacking, 'defending_type': defending, 'multiplier': multiplier}
+                    for attacking, defending, multiplier in MATCHUPS]
+    move_rows = [{'move_id': move_id, 'move_name': name, 'move_type': move_type, 'move_power': power}
+                 for move_id, name, move_type, power in MOVES]
+    return TypeChart(matchup_rows, move_rows, version='test')
+
+
+def test_multiplier_of_dual_types_is_the_product(chart):
+    assert chart.multiplier('Fire', ('Grass', 'Bug')) == 4.0
+    assert chart.multiplier('Fire', ('Grass', 'Water')) == 1.0
+    assert chart.multiplier('Fire', ('Grass', None)) == 2.0
+    # Types missing from the chart are neutral
+    assert chart.multiplier('Fire', ('Dragon', None)) == 1.0
+    assert chart.multiplier('Shadow', ('Grass', None)) == 1.0
+
+
+def test_score_is_power_times_dual_type_multiplier(chart):
+    scores = chart.score_moves([1, 2, 3, 4], [5, 5, 5, 5], ('Grass', 'Bug'))
+
+    assert scores.tolist() == [160.0, 40.0, 40.0, 90.0]
+
+
+def test_immune_defender_scores_zero(chart):
+    scores = chart.score_moves([2, 4, 1], [5, 5, 5], ('Ghost', 'Ground'))
+
+    assert scores.tolist() == [0.0, 0.0, 40.0]
+
+
+def test_empty_slots_and_slots_without_pp_score_minus_one(chart):
+    scores = chart.score_moves([1, None, 3, 99], [0, 0, None, 5], ('Grass', None))
+
+    # No PP, no move, PP unknown, move not in the chart
+    assert scores.tolist() == [-1.0, -1.0, -1.0, -1.0]
+
+
+def test_best_slot_is_one_based(chart):
+    assert chart.best_slot([2, 3, 1, None], [5, 5, 5, 0], ('Grass', None)) == 3
+
+
+def test_best_slot_skips_slots_without_pp(chart):
+    assert chart.best_slot([1, 2, None, None], [0, 5, 0, 0], ('Grass', None)) == 2
+
+
+def test_best_slot_ties_go_to_the_earlier_slot(chart):
+    assert chart.best_slot([6, 2, 3, None], [5, 5, 5, 0], ('Grass', None)) == 1
+    assert chart.best_slot([3, 6, 2, None], [5, 5, 5, 0], ('Grass', None)) == 1
+
+
+def test_best_slot_still_uses_a_move_that_does_nothing(chart):
+    # Better than having no move at all
+    assert chart.best_slot([2, 5, None, None], [5, 5, 0, 0], ('Ghost', None)) == 1
+
+
+def test_best_slot_without_a_usable_move_is_zero(chart):
+    assert chart.best_slot([1, 2, None, None], [0, 0, 0, 0], ('Grass', None)) == 0
+    assert chart.best_slot([None] * 4, [0] * 4, ('Grass', None)) == 0